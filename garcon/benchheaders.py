@@ -0,0 +1,103 @@
+import os
+import os.path
+import time
+import shutil
+import argparse
+import tempfile
+
+
+def load_texts(site_dir):
+    posts_dir = os.path.join(site_dir, 'posts')
+    texts = []
+    for name in sorted(os.listdir(posts_dir)):
+        with open(os.path.join(posts_dir, name), 'r', encoding='utf8') as fp:
+            texts.append(fp.read())
+    return texts
+
+
+def run(texts, repeat=3):
+    import yaml
+    from piecrust.configuration import (
+        ConfigurationLoader, header_regex, parse_config_header,
+        parse_flat_yaml)
+
+    headers = []
+    for t in texts:
+        m = header_regex.match(t)
+        if m is not None:
+            headers.append(str(m.group('header')))
+    flat_count = len([h for h in headers if parse_flat_yaml(h) is not None])
+    print("Parsing %d page headers, %d of which are flat." %
+          (len(headers), flat_count))
+    print("LibYAML is %savailable." %
+          ('' if yaml.__with_libyaml__ else 'NOT '))
+
+    def _yaml_only():
+        for h in headers:
+            yaml.load(h, Loader=ConfigurationLoader)
+
+    def _parse_headers():
+        for t in texts:
+            parse_config_header(t)
+
+    for name, func in [('YAML loader', _yaml_only),
+                       ('parse_config_header', _parse_headers)]:
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            times.append(time.perf_counter() - start)
+        best = min(times)
+        print("%-20s best of %d: %8.3fs (%.1fus per page)" %
+              (name, repeat, best, best * 1000000 / max(1, len(texts))))
+
+
+def benchmark(site_dir=None, post_count=50000, repeat=3):
+    tmp_dir = None
+    if site_dir is None:
+        from garcon.benchsite import generate
+        tmp_dir = tempfile.mkdtemp(prefix='piecrust-benchheaders-')
+        site_dir = tmp_dir
+        generate('piecrust', site_dir, post_count=post_count)
+
+    try:
+        run(load_texts(site_dir), repeat=repeat)
+    finally:
+        if tmp_dir is not None:
+            shutil.rmtree(tmp_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+            prog='benchheaders',
+            description=("Benchmarks parsing the configuration headers "
+                         "of the posts in a benchmark website."))
+    parser.add_argument(
+            'site_dir',
+            nargs='?',
+            help=("The benchmark website, as created by `benchsite`. "
+                  "A temporary one is generated if not specified."))
+    parser.add_argument(
+            '-c', '--post-count',
+            help="The number of posts to create for a temporary website.",
+            type=int,
+            default=50000)
+    parser.add_argument(
+            '-r', '--repeat',
+            help="The number of times to run each benchmark.",
+            type=int,
+            default=3)
+
+    result = parser.parse_args()
+    benchmark(result.site_dir, post_count=result.post_count,
+              repeat=result.repeat)
+
+
+if __name__ == '__main__':
+    main()
+else:
+    from invoke import task
+
+    @task
+    def benchheaders(ctx, site_dir=None, post_count=50000, repeat=3):
+        benchmark(site_dir, post_count=int(post_count), repeat=int(repeat))
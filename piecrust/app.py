@@ -14,7 +14,7 @@ from piecrust.configuration import ConfigurationError
 from piecrust.environment import StandardEnvironment
 from piecrust.page import Page
 from piecrust.plugins.base import PluginLoader
-from piecrust.routing import Route
+from piecrust.routing import Route, RouteMatcher
 from piecrust.sources.base import REALM_THEME
 from piecrust.uriutil import multi_replace
 
@@ -51,8 +51,13 @@ class PieCrust(object):
         stats.registerTimer("PageRenderLayout")
         stats.registerTimer("PageSerialize")
         stats.registerCounter('PageLoads')
+        stats.registerCounter('PageStoreHits')
         stats.registerCounter('PageRenderSegments')
         stats.registerCounter('PageRenderLayout')
+        stats.registerCounter('FormatCacheHits')
+        stats.registerCounter('FormatCacheMisses')
+        stats.registerCounter('SourceScanIndexHits')
+        stats.registerCounter('SourceScanIndexMisses')
 
     @cached_property
     def config(self):
@@ -167,6 +172,10 @@ class PieCrust(object):
         routes = sorted(routes, key=lambda r: r.pass_num)
         return routes
 
+    @cached_property
+    def route_matcher(self):
+        return RouteMatcher(self.routes)
+
     @cached_property
     def publishers(self):
         defs_by_name = {}
@@ -230,6 +239,25 @@ class PieCrust(object):
             cache_key,
             lambda: Page(source, content_item))
 
+    def invalidateCaches(self, changed_paths):
+        """ Forgets what's cached in memory about the given files, so that
+            this app can still be used after they were added, modified, or
+            deleted.
+        """
+        for source in self.sources:
+            source.invalidateCache()
+
+        # Pages remember whether they were modified when they were loaded,
+        # and rendered segments are cached by URI, so we can't keep any of
+        # them. The file-system caches will still be used for everything
+        # that didn't change.
+        self.env.page_repository.clear()
+        self.env.rendered_segments_repository.clear()
+        self.env.page_stores.clear()
+
+        for engine in self.plugin_loader.getTemplateEngines():
+            engine.invalidateCache(changed_paths)
+
     def resolvePath(self, path):
         path = multi_replace(path, {'%theme_dir%': self.theme_dir})
         return os.path.join(self.root_dir, path)
@@ -124,6 +124,24 @@ class PieCrustConfiguration(Configuration):
             logger.debug("Outdated cache key '%s' (expected '%s')." % (
                 actual_cache_key, cache_key))
 
+        # Remember what the cached version was built from, in case we only
+        # check file contents instead of file times.
+        prev_cache_key = None
+        prev_cache_digest = None
+        if self._cache.has('config.json'):
+            try:
+                prev_values = json.loads(self._cache.read('config.json'))
+                prev_cache_key = prev_values.get('__cache_key')
+                prev_cache_digest = prev_values.get('__cache_digest')
+            except ValueError:
+                pass
+
+        cache_digest_hash = hashlib.md5()
+        for p in paths:
+            with open(p, 'rb') as fp:
+                cache_digest_hash.update(fp.read())
+        cache_digest = cache_digest_hash.hexdigest()
+
         # Nope, load from the paths.
         try:
             # Theme values.
@@ -155,10 +173,18 @@ class PieCrustConfiguration(Configuration):
 
         logger.debug("Caching configuration...")
         self._values['__cache_key'] = cache_key
+        self._values['__cache_digest'] = cache_digest
         config_text = json.dumps(self._values)
         self._cache.write('config.json', config_text)
 
-        self._values['__cache_valid'] = False
+        # If the configuration files were only touched (like after a fresh
+        # checkout), the cache is still valid when we compare contents.
+        change_detection = self._values.get('baker', {}).get(
+            'change_detection')
+        self._values['__cache_valid'] = (
+            change_detection == 'digest' and
+            prev_cache_key == cache_key and
+            prev_cache_digest == cache_digest)
 
     def _loadFrom(self, path):
         logger.debug("Loading configuration from: %s" % path)
@@ -33,13 +33,20 @@ default_configuration = collections.OrderedDict({
     'baker': collections.OrderedDict({
         'no_bake_setting': 'draft',
         'workers': None,
-        'batch_size': None
+        'batch_size': None,
+        'scheduler': 'queue',
+        'change_detection': 'mtime',
+        'writer_threads': 1,
+        'writer_queue_size': 64,
+        'precompress': False,
+        'precompress_threads': None
     }),
     'server': collections.OrderedDict({
         'enable_gzip': True,
         'cache_time': 28800,
         'enable_debug_info': True,
-        'show_debug_info': False
+        'show_debug_info': False,
+        'response_cache_size': 256
     }),
     'pipelines': collections.OrderedDict({
         'asset': collections.OrderedDict({
@@ -2,6 +2,8 @@ import time
 import os.path
 import hashlib
 import logging
+from piecrust.baking.precompress import (
+    OutputPrecompressor, get_precompress_encodings)
 from piecrust.chefutil import (
     format_timed_scope, format_timed)
 from piecrust.environment import ExecutionStats
@@ -31,7 +33,9 @@ class Baker(object):
                  forbidden_pipelines=None,
                  allowed_sources=None,
                  rotate_bake_records=True,
-                 keep_unused_records=False):
+                 keep_unused_records=False,
+                 worker_pool=None,
+                 changed_paths=None):
         self.appfactory = appfactory
         self.app = app
         self.out_dir = out_dir
@@ -41,9 +45,13 @@ class Baker(object):
         self.allowed_sources = allowed_sources
         self.rotate_bake_records = rotate_bake_records
         self.keep_unused_records = keep_unused_records
+        self.worker_pool = worker_pool
+        self.changed_paths = changed_paths or []
+        self._changed_templates = None
 
     def bake(self):
         start_time = time.perf_counter()
+        start_wall_time = time.time()
 
         # Setup baker.
         logger.debug("  Bake Output: %s" % self.out_dir)
@@ -57,6 +65,10 @@ class Baker(object):
         stats.registerTimer('LoadSourceContents', raise_if_registered=False)
         stats.registerTimer('CacheTemplates', raise_if_registered=False)
 
+        # If the app was used before, forget about what changed since.
+        if self.changed_paths:
+            self.app.invalidateCaches(self.changed_paths)
+
         # Make sure the output directory exists.
         if not os.path.isdir(self.out_dir):
             os.makedirs(self.out_dir, 0o755)
@@ -85,7 +97,8 @@ class Baker(object):
             previous_records, current_records)
 
         # Pre-create all caches.
-        for cache_name in ['app', 'baker', 'pages', 'renders']:
+        for cache_name in ['app', 'baker', 'pages', 'renders', 'formats',
+                           'sources']:
             self.app.cache.getCache(cache_name)
 
         # Create the pipelines.
@@ -111,10 +124,23 @@ class Baker(object):
         ppmngr.deleteStaleOutputs()
         ppmngr.collapseRecords(self.keep_unused_records)
 
-        # All done with the workers. Close the pool and get reports.
-        pool_stats = pool.close()
+        # All done with the workers. Close the pool and get reports, unless
+        # we want to keep the workers around for next time. Either way, the
+        # workers are done writing their outputs after this.
+        if self.worker_pool is not None:
+            pool_stats = pool.getReports()
+        else:
+            pool_stats = pool.close()
+        self._handleWriteErrors(current_records, pool_stats)
+
+        # Write compressed versions of the outputs, if needed.
+        self._precompressOutputs(current_records, start_wall_time)
+
         current_records.stats = _merge_execution_stats(stats, *pool_stats)
 
+        # Forget about the formatted texts that weren't used in a while.
+        self._pruneFormatCache()
+
         # Shutdown the pipelines.
         ppmngr.shutdownPipelines()
 
@@ -133,6 +159,13 @@ class Baker(object):
     def _handleCacheValidity(self, previous_records, current_records):
         start_time = time.perf_counter()
 
+        # Remember the state of all templates, so that we can figure out
+        # which ones changed on the next bake.
+        use_digests = (
+            self.app.config.get('baker/change_detection') == 'digest')
+        current_records.templates_state = _get_templates_state(
+            self.app.templates_dirs, use_digests)
+
         reason = None
         if self.force:
             reason = "ordered to"
@@ -143,22 +176,25 @@ class Baker(object):
         elif previous_records.invalidated:
             # We have no valid previous bake records.
             reason = "need bake records regeneration"
+        elif previous_records.templates_state is None:
+            # We don't know what templates we had last time.
+            reason = "unknown templates state"
         else:
-            # Check if any template has changed since the last bake. Since
-            # there could be some advanced conditional logic going on, we'd
-            # better just force a bake from scratch if that's the case.
-            max_time = 0
-            for d in self.app.templates_dirs:
-                for dpath, _, filenames in os.walk(d):
-                    for fn in filenames:
-                        full_fn = os.path.join(dpath, fn)
-                        max_time = max(max_time, os.path.getmtime(full_fn))
-            if max_time >= previous_records.bake_time:
-                reason = "templates modified"
+            # Check if any template has changed since the last bake. We
+            # only need to re-bake the pages that used those, which the
+            # page pipelines will figure out.
+            changed = _get_changed_templates(
+                previous_records.templates_state,
+                current_records.templates_state)
+            if changed:
+                logger.debug("Templates modified: %s" %
+                             ', '.join(sorted(changed)))
+                self._changed_templates = changed
 
         if reason is not None:
             # We have to bake everything from scratch.
-            self.app.cache.clearCaches(except_names=['app', 'baker'])
+            self.app.cache.clearCaches(
+                except_names=['app', 'baker', 'publish'])
             self.force = True
             current_records.incremental_count = 0
             previous_records = MultiRecord()
@@ -172,6 +208,74 @@ class Baker(object):
                 start_time, "cache is assumed valid", colored=False))
             return True
 
+    def _handleWriteErrors(self, records, pool_stats):
+        # Workers write pages in the background, so they only tell us
+        # about the pages they failed to write in their reports.
+        failed_paths = {}
+        for ps in pool_stats:
+            if ps is not None:
+                for out_path, msg in ps.manifests.get('PageWriteErrors', []):
+                    failed_paths[out_path] = msg
+        if not failed_paths:
+            return
+
+        for rec in records.records:
+            for entry in rec.getEntries():
+                for out_path in (entry.getAllOutputPaths() or []):
+                    msg = failed_paths.pop(out_path, None)
+                    if msg is not None:
+                        self._logErrors(entry.item_spec, [msg])
+                        entry.errors.append(msg)
+                        _fail_sub_entry(entry, out_path, msg)
+                        rec.success = False
+                        records.success = False
+
+        # Fail the bake even if we didn't find who wrote those outputs.
+        if failed_paths:
+            records.success = False
+
+    def _pruneFormatCache(self):
+        from piecrust.rendering import prune_format_cache
+
+        start_time = time.perf_counter()
+        count = prune_format_cache(self.app)
+        if count > 0:
+            logger.debug(format_timed(
+                start_time, "removed %d old formatted texts" % count,
+                colored=False))
+
+    def _precompressOutputs(self, records, start_wall_time):
+        encodings = get_precompress_encodings(self.app)
+        if not encodings:
+            return
+
+        out_paths = []
+        deleted_out_paths = []
+        for rec in records.records:
+            deleted_out_paths += rec.deleted_out_paths
+            for entry in rec.getEntries():
+                paths = entry.getAllOutputPaths()
+                if paths:
+                    out_paths += paths
+
+        stats = self.app.env.stats
+        stats.registerCounter('PrecompressedOutputs',
+                              raise_if_registered=False)
+        stats.registerTimer('PrecompressOutputs', raise_if_registered=False)
+
+        start_time = time.perf_counter()
+        precompressor = OutputPrecompressor(
+            encodings,
+            thread_count=self.app.config.get('baker/precompress_threads'),
+            since=start_wall_time)
+        precompressor.removeVariants(deleted_out_paths)
+        num_written = precompressor.precompress(out_paths)
+        stats.stepCounter('PrecompressedOutputs', num_written)
+        stats.stepTimerSince('PrecompressOutputs', start_time)
+        logger.info(format_timed(
+            start_time, "precompressed %d output(s) [%s]" %
+            (num_written, ', '.join(encodings))))
+
     def _createPipelineManager(self, record_histories):
         # Gather all sources by realm -- we're going to bake each realm
         # separately so we can handle "overriding" (i.e. one realm overrides
@@ -182,7 +286,8 @@ class Baker(object):
         has_any_pp = False
         ppmngr = PipelineManager(
             self.app, self.out_dir,
-            record_histories=record_histories)
+            record_histories=record_histories,
+            changed_templates=self._changed_templates)
         ok_pp = self.allowed_pipelines
         nok_pp = self.forbidden_pipelines
         ok_src = self.allowed_sources
@@ -237,6 +342,7 @@ class Baker(object):
 
         job_count = 0
         job_descs = {}
+        costed_jobs = []
         realm_name = REALM_NAMES[realm].lower()
         pool.userdata.cur_pass = pp_pass_num
 
@@ -250,7 +356,7 @@ class Baker(object):
             if jobs is not None:
                 new_job_count = len(jobs)
                 job_count += new_job_count
-                pool.queueJobs(jobs)
+                costed_jobs += [(pp.getJobCost(j, jcctx), j) for j in jobs]
                 if job_desc:
                     job_descs.setdefault(job_desc, []).append(src.name)
             else:
@@ -261,6 +367,11 @@ class Baker(object):
                 "(%s)." %
                 (new_job_count, src.name, pp.PIPELINE_NAME, realm_name))
 
+        # Queue the jobs that are expected to take the longest first, so
+        # that they don't end up being the last ones to finish.
+        costed_jobs.sort(key=lambda cj: cj[0], reverse=True)
+        pool.queueJobs([j for _, j in costed_jobs])
+
         if job_count == 0:
             logger.debug("No jobs queued! Bailing out of this bake pass.")
             return
@@ -290,6 +401,7 @@ class Baker(object):
 
         worker_count = self.app.config.get('baker/workers')
         batch_size = self.app.config.get('baker/batch_size')
+        scheduler = self.app.config.get('baker/scheduler')
 
         ctx = BakeWorkerContext(
             self.appfactory,
@@ -298,14 +410,36 @@ class Baker(object):
             previous_records_path=previous_records_path,
             allowed_pipelines=self.allowed_pipelines,
             forbidden_pipelines=self.forbidden_pipelines)
+
+        persistent_pool = self.worker_pool
+        pool_key = (worker_count, batch_size, scheduler)
+        if persistent_pool is not None:
+            pool = persistent_pool.getPool(pool_key)
+            if pool is not None:
+                pool.setCallbacks(self._handleWorkerResult,
+                                  self._handleWorkerError,
+                                  pool_userdata)
+                try:
+                    with format_timed_scope(logger, "updated workers",
+                                            level=logging.DEBUG,
+                                            colored=False):
+                        pool.updateWorkers((ctx, self.changed_paths))
+                    return pool
+                except Exception as ex:
+                    logger.warning("Can't re-use worker pool: %s" % ex)
+                    persistent_pool.terminate()
+
         pool = WorkerPool(
             worker_count=worker_count,
             batch_size=batch_size,
+            scheduler=scheduler,
             worker_class=BakeWorker,
             initargs=(ctx,),
             callback=self._handleWorkerResult,
             error_callback=self._handleWorkerError,
             userdata=pool_userdata)
+        if persistent_pool is not None:
+            persistent_pool.setPool(pool, pool_key)
         return pool
 
     def _handleWorkerResult(self, job, res, userdata):
@@ -319,8 +453,11 @@ class Baker(object):
         ppmrctx = PipelineJobResultHandleContext(record, job, cur_pass)
         pipeline.handleJobResult(res, ppmrctx)
 
-        # Set the overall success flags if there was an error.
+        # Remember how long this job took for next time.
         record_entry = ppmrctx.record_entry
+        record_entry.job_times[cur_pass] = res.get('job_time', 0)
+
+        # Set the overall success flags if there was an error.
         if not record_entry.success:
             record.success = False
             userdata.records.success = False
@@ -349,6 +486,54 @@ class Baker(object):
             logger.error(exc_data['traceback'])
 
 
+class PersistentWorkerPool:
+    """ Keeps the bake worker processes alive between bakes, when given to
+        successive `Baker` instances. Workers then keep their app instance
+        and all its caches, and are only told about the files that changed
+        since the previous bake.
+    """
+    def __init__(self):
+        self._pool = None
+        self._pool_key = None
+
+    @property
+    def is_running(self):
+        return self._pool is not None
+
+    def getPool(self, pool_key):
+        pool = self._pool
+        if pool is None:
+            return None
+        if pool_key != self._pool_key or not pool.is_reusable:
+            logger.debug("Can't re-use worker pool, creating a new one.")
+            self.close()
+            return None
+        return pool
+
+    def setPool(self, pool, pool_key):
+        if self._pool is not None:
+            raise Exception("A worker pool is already running.")
+        self._pool = pool
+        self._pool_key = pool_key
+
+    def close(self):
+        pool = self._pool
+        if pool is None:
+            return
+        if pool.is_reusable:
+            pool.close()
+            self._pool = None
+        else:
+            self.terminate()
+
+    def terminate(self):
+        pool = self._pool
+        if pool is None:
+            return
+        pool.terminate()
+        self._pool = None
+
+
 class _PoolUserData:
     def __init__(self, baker, ppmngr):
         self.baker = baker
@@ -379,6 +564,16 @@ def _add_pipeline_info_to_pass_and_realm_dict(pp_pass_num, pp_info,
     pplist.append(pp_info)
 
 
+def _fail_sub_entry(entry, out_path, msg):
+    # Mark the sub-page as failed, and forget what it was baked from, so
+    # that the next bake writes it again.
+    for sub in getattr(entry, 'subs', []):
+        if sub['out_path'] == out_path:
+            sub['errors'].append(msg)
+            sub['digest'] = None
+            sub['source_mtime'] = None
+
+
 def _merge_execution_stats(base_stats, *other_stats):
     total_stats = ExecutionStats()
     total_stats.mergeStats(base_stats)
@@ -388,6 +583,41 @@ def _merge_execution_stats(base_stats, *other_stats):
     return total_stats
 
 
+def _get_templates_state(dirs, use_digests):
+    """ Returns the state of all the templates found in the given
+        directories, keyed by template name. Only the first template found
+        for a given name is considered, since that's what template engines
+        will load. The state is based on either the file's modification
+        time, or on its contents.
+    """
+    state = {}
+    for i, d in enumerate(dirs):
+        for dpath, _, filenames in os.walk(d):
+            for fn in filenames:
+                full_fn = os.path.join(dpath, fn)
+                name = os.path.relpath(full_fn, d).replace(os.sep, '/')
+                if name in state:
+                    continue
+                if use_digests:
+                    with open(full_fn, 'rb') as fp:
+                        token = hashlib.md5(fp.read()).hexdigest()
+                else:
+                    token = os.path.getmtime(full_fn)
+                state[name] = '%d:%s' % (i, token)
+    return state
+
+
+def _get_changed_templates(prev_state, cur_state):
+    """ Returns the names of the templates that were added, removed, or
+        modified between the given templates states.
+    """
+    changed = set()
+    for name in set(prev_state.keys()) | set(cur_state.keys()):
+        if prev_state.get(name) != cur_state.get(name):
+            changed.add(name)
+    return changed
+
+
 def _save_bake_records(records, records_path, *, rotate_previous):
     if rotate_previous:
         records_dir, records_fn = os.path.split(records_path)
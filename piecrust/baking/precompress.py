@@ -0,0 +1,200 @@
+import io
+import os
+import os.path
+import gzip
+import queue
+import logging
+import threading
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+logger = logging.getLogger(__name__)
+
+
+# The extensions of the output files to precompress.
+PRECOMPRESSED_EXTENSIONS = ['.html', '.css', '.js', '.xml', '.json']
+
+# Files smaller than this aren't worth compressing.
+PRECOMPRESS_MIN_SIZE = 256
+
+# The supported encodings, and the extensions of the files they produce.
+# The encoding names are the same as in the `Accept-Encoding` header.
+PRECOMPRESS_ENCODINGS = {
+    'gzip': '.gz',
+    'br': '.br'}
+
+
+def get_precompress_encodings(app):
+    """ Returns the encodings to precompress bake outputs with, as
+        specified by the `baker/precompress` setting.
+    """
+    setting = app.config.get('baker/precompress')
+    if not setting:
+        return []
+
+    if setting is True:
+        encodings = ['gzip']
+        if brotli is not None:
+            encodings.append('br')
+        return encodings
+
+    if isinstance(setting, str):
+        setting = [setting]
+
+    encodings = []
+    for e in setting:
+        if e not in PRECOMPRESS_ENCODINGS:
+            raise Exception("Unknown precompression encoding: %s" % e)
+        if e == 'br' and brotli is None:
+            logger.warning("Can't precompress outputs with Brotli, the "
+                           "`brotli` package is not installed.")
+            continue
+        encodings.append(e)
+    return encodings
+
+
+def is_precompressable_path(path):
+    _, ext = os.path.splitext(path)
+    return ext.lower() in PRECOMPRESSED_EXTENSIONS
+
+
+def get_precompressed_path(path, encoding):
+    return path + PRECOMPRESS_ENCODINGS[encoding]
+
+
+def is_precompressed_path_valid(path, encoding, mtime_ns):
+    """ Returns whether the given file has an up-to-date precompressed
+        variant for the given encoding.
+    """
+    try:
+        st = os.stat(get_precompressed_path(path, encoding))
+    except OSError:
+        return False
+    return st.st_mtime_ns == mtime_ns
+
+
+class OutputPrecompressor:
+    """ Writes compressed variants of bake outputs next to them, e.g.
+        `foo.html.gz` and `foo.html.br` next to `foo.html`, so that web
+        servers can send them as they are.
+
+        Variants get the same modification time as their output file,
+        which is how we know they're up-to-date. This means that outputs
+        that were left untouched by the bake are skipped. Outputs that
+        were written after `since` (a timestamp) are always compressed
+        again, in case the file-system's timestamps are too coarse to
+        tell that they changed.
+    """
+    def __init__(self, encodings, thread_count=None, since=None):
+        self.encodings = encodings
+        self.thread_count = thread_count or os.cpu_count() or 1
+        self.num_written = 0
+        self._since_ns = None
+        if since is not None:
+            # Round down to the second, for file-systems that do too.
+            self._since_ns = int(since) * 1000000000
+        self._lock = threading.Lock()
+
+    def precompress(self, paths):
+        """ Writes the compressed variants of the given output files that
+            are missing or out of date, from a pool of threads.
+        """
+        paths = [p for p in paths if is_precompressable_path(p)]
+        if not paths:
+            return 0
+
+        self.num_written = 0
+        q = queue.Queue()
+        for p in paths:
+            q.put(p)
+
+        thread_count = min(self.thread_count, len(paths))
+        threads = [
+            threading.Thread(name='Precompressor-%d' % i,
+                             daemon=True,
+                             target=self._run,
+                             args=(q,))
+            for i in range(thread_count)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return self.num_written
+
+    def removeVariants(self, paths):
+        """ Deletes the compressed variants of the given output files.
+        """
+        for p in paths:
+            for e in PRECOMPRESS_ENCODINGS:
+                try:
+                    os.remove(get_precompressed_path(p, e))
+                except OSError:
+                    pass
+
+    def _run(self, q):
+        num_written = 0
+        while True:
+            try:
+                path = q.get_nowait()
+            except queue.Empty:
+                break
+
+            try:
+                num_written += self._precompressFile(path)
+            except Exception as ex:
+                logger.error("Error precompressing '%s'." % path)
+                logger.exception(ex)
+
+        with self._lock:
+            self.num_written += num_written
+
+    def _precompressFile(self, path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return 0
+
+        if st.st_size < PRECOMPRESS_MIN_SIZE:
+            self.removeVariants([path])
+            return 0
+
+        if (self._since_ns is not None and
+                st.st_mtime_ns >= self._since_ns):
+            encodings = list(self.encodings)
+        else:
+            encodings = [
+                e for e in self.encodings
+                if not is_precompressed_path_valid(path, e, st.st_mtime_ns)]
+        if not encodings:
+            return 0
+
+        with open(path, 'rb') as fp:
+            data = fp.read()
+
+        for e in encodings:
+            var_path = get_precompressed_path(path, e)
+            logger.debug("Precompressing '%s' [%s]" % (path, e))
+            tmp_path = '%s.%d.tmp' % (var_path, threading.get_ident())
+            with open(tmp_path, 'wb') as fp:
+                fp.write(_compress(data, e))
+            os.utime(tmp_path, ns=(st.st_atime_ns, st.st_mtime_ns))
+            os.replace(tmp_path, var_path)
+        return len(encodings)
+
+
+def _compress(data, encoding):
+    if encoding == 'gzip':
+        # Don't store the current time in the file, so that it only
+        # changes when the output changes.
+        buf = io.BytesIO()
+        with gzip.GzipFile(fileobj=buf, mode='wb', compresslevel=9,
+                           mtime=0) as gzfp:
+            gzfp.write(data)
+        return buf.getvalue()
+    if encoding == 'br':
+        return brotli.compress(data)
+    raise Exception("Unknown precompression encoding: %s" % encoding)
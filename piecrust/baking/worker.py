@@ -1,5 +1,7 @@
 import time
+import os.path
 import logging
+from piecrust import CONFIG_PATH, THEME_CONFIG_PATH
 from piecrust.pipelines.base import (
     PipelineManager, PipelineJobRunContext,
     get_pipeline_name_for_source)
@@ -29,9 +31,10 @@ class BakeWorker(IWorker):
         self.app = None
         self.stats = None
         self.previous_records = None
+        self.ppmngr = None
+        self._pipelines_shut_down = False
+        self._cur_pass = 0
         self._work_start_time = time.perf_counter()
-        self._sources = {}
-        self._ppctx = None
 
     def initialize(self):
         # Create the app local to this worker.
@@ -49,17 +52,73 @@ class BakeWorker(IWorker):
         self.app = app
         self.stats = stats
 
-        # Load previous record
+        self._loadPreviousRecords()
+        self._createPipelines()
+
+        stats.stepTimerSince(
+            "Worker_%d_Init" % self.wid, self._work_start_time)
+
+    def update(self, data):
+        ctx, changed_paths = data
+        self.ctx = ctx
+        self._cur_pass = 0
+        self._work_start_time = time.perf_counter()
+        self._shutdownPipelines()
+
+        if self._needsReinitialize(changed_paths):
+            # Things like the site configuration changed, so we need a
+            # brand new app.
+            logger.debug("Worker %d re-initializing." % self.wid)
+            self.initialize()
+            return
+
+        # Keep the same app, but forget about anything that changed.
+        stats = self.stats
+        stats.clear()
+        stats.registerTimer("Worker_%d_Update" % self.wid,
+                            raise_if_registered=False)
+
+        app = self.app
+        app.invalidateCaches(changed_paths)
+        if ctx.force:
+            # The baker cleared the caches, maybe because templates changed.
+            for engine in app.plugin_loader.getTemplateEngines():
+                engine.invalidateCache()
+
+        self._loadPreviousRecords()
+        self._createPipelines()
+
+        stats.stepTimerSince(
+            "Worker_%d_Update" % self.wid, self._work_start_time)
+
+    def _needsReinitialize(self, changed_paths):
+        app = self.app
+        cfg_paths = [os.path.join(app.root_dir, CONFIG_PATH),
+                     os.path.join(app.root_dir, THEME_CONFIG_PATH)]
+        if app.theme_dir:
+            cfg_paths.append(os.path.join(app.theme_dir, THEME_CONFIG_PATH))
+        plugins_dirs = app.plugins_dirs
+        for path in changed_paths:
+            if path in cfg_paths:
+                return True
+            for d in plugins_dirs:
+                if path.startswith(d):
+                    return True
+        return False
+
+    def _loadPreviousRecords(self):
         if self.ctx.previous_records_path:
             previous_records = load_records(self.ctx.previous_records_path)
         else:
             previous_records = MultiRecord()
         self.previous_records = previous_records
 
-        # Create the pipelines.
+    def _createPipelines(self):
+        app = self.app
         self.ppmngr = PipelineManager(
             app, self.ctx.out_dir,
             worker_id=self.wid, force=self.ctx.force)
+        self._pipelines_shut_down = False
         ok_pp = self.ctx.allowed_pipelines
         nok_pp = self.ctx.forbidden_pipelines
         for src in app.sources:
@@ -71,16 +130,20 @@ class BakeWorker(IWorker):
 
             self.ppmngr.createPipeline(src)
 
-            stats.registerTimer("PipelineJobs_%s" % pname,
-                                raise_if_registered=False)
-
-        stats.stepTimerSince(
-            "Worker_%d_Init" % self.wid, self._work_start_time)
+            self.stats.registerTimer("PipelineJobs_%s" % pname,
+                                     raise_if_registered=False)
 
     def process(self, job):
         source_name, item_spec = job['job_spec']
         logger.debug("Received job: %s@%s" % (source_name, item_spec))
 
+        # The page stores are written again by the main process between
+        # passes, so re-open them when a new pass starts.
+        pass_num = job.get('pass_num', 0)
+        if pass_num != self._cur_pass:
+            self._cur_pass = pass_num
+            self.app.env.page_stores.clear()
+
         # Run the job!
         job_start = time.perf_counter()
         pp = self.ppmngr.getPipeline(source_name)
@@ -91,12 +154,19 @@ class BakeWorker(IWorker):
         }
         pp.run(job, runctx, ppres)
 
-        # Log time spent in this pipeline.
-        self.stats.stepTimerSince("PipelineJobs_%s" % pp.PIPELINE_NAME,
-                                  job_start)
+        # Log time spent in this pipeline, and send it back so it can be
+        # stored in the records.
+        job_time = time.perf_counter() - job_start
+        self.stats.stepTimer("PipelineJobs_%s" % pp.PIPELINE_NAME, job_time)
+        ppres['job_time'] = job_time
 
         return ppres
 
+    def flush(self):
+        # Shutting down the pipelines waits for them to be done writing
+        # their outputs.
+        self._shutdownPipelines()
+
     def getStats(self):
         stats = self.app.env.stats
         stats.stepTimerSince("Worker_%d_Total" % self.wid,
@@ -104,6 +174,14 @@ class BakeWorker(IWorker):
         return stats
 
     def shutdown(self):
-        for src, pp in self._sources.values():
-            pp.shutdown(self._ppctx)
+        self._shutdownPipelines()
+
+    def _shutdownPipelines(self):
+        # The pipelines get shut down when the worker reports, gets
+        # updated, and exits. Only do it once per bake, since it runs
+        # things like the asset processors' end hooks.
+        if self.ppmngr is None or self._pipelines_shut_down:
+            return
+        self._pipelines_shut_down = True
+        self.ppmngr.shutdownPipelines()
 
@@ -180,6 +180,14 @@ class MemCache(object):
             fs_key = _make_fs_cache_key(key)
             self._invalidated_fs_items.add(fs_key)
 
+    def clear(self):
+        """ Forgets all items kept in memory. Items in the file-system cache
+            are left alone, and are used again if they're still valid.
+        """
+        logger.debug("Clearing memory cache.")
+        self.cache.clear()
+        self._invalidated_fs_items = set()
+
     def put(self, key, item, save_to_fs=True):
         self.cache.put(key, item)
         if self.fs_cache and save_to_fs:
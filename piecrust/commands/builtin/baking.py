@@ -40,6 +40,11 @@ class BakeCommand(ChefCommand):
             '--batch-size',
             help="The number of jobs per batch.",
             type=int, default=-1)
+        parser.add_argument(
+            '--scheduler',
+            help="The scheduler to use for dispatching jobs to the "
+            "worker processes.",
+            choices=['queue', 'stealing'])
         parser.add_argument(
             '--assets-only',
             help="Only bake the assets (don't bake the web pages).",
@@ -117,6 +122,8 @@ class BakeCommand(ChefCommand):
             ctx.app.config.set('baker/workers', ctx.args.workers)
         if ctx.args.batch_size > 0:
             ctx.app.config.set('baker/batch_size', ctx.args.batch_size)
+        if ctx.args.scheduler:
+            ctx.app.config.set('baker/scheduler', ctx.args.scheduler)
 
         allowed_pipelines = None
         forbidden_pipelines = None
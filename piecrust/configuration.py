@@ -3,7 +3,8 @@ import logging
 import collections
 import collections.abc
 import yaml
-from yaml.constructor import ConstructorError
+from yaml.constructor import ConstructorError, SafeConstructor
+from yaml.nodes import ScalarNode
 try:
     from yaml import CSafeLoader as SafeLoader
 except ImportError:
@@ -231,7 +232,9 @@ def parse_config_header(text):
     m = header_regex.match(text)
     if m is not None:
         header = str(m.group('header'))
-        config = yaml.load(header, Loader=ConfigurationLoader)
+        config = parse_flat_yaml(header)
+        if config is None:
+            config = yaml.load(header, Loader=ConfigurationLoader)
         offset = m.end()
     else:
         config = {}
@@ -314,6 +317,136 @@ for ch in list('0123456789'):
     ch_resolvers.insert(0, ch_resolvers.pop())
 
 
+class _FlatScalarConstructor(SafeConstructor):
+    time_regexp = ConfigurationLoader.time_regexp
+    construct_yaml_time = ConfigurationLoader.construct_yaml_time
+
+
+_flat_scalar_constructor = _FlatScalarConstructor()
+_flat_scalar_construct_funcs = {
+    'tag:yaml.org,2002:null': SafeConstructor.construct_yaml_null,
+    'tag:yaml.org,2002:bool': SafeConstructor.construct_yaml_bool,
+    'tag:yaml.org,2002:int': SafeConstructor.construct_yaml_int,
+    'tag:yaml.org,2002:float': SafeConstructor.construct_yaml_float,
+    'tag:yaml.org,2002:timestamp': SafeConstructor.construct_yaml_timestamp,
+    'tag:yaml.org,2002:sexagesimal': _FlatScalarConstructor.construct_yaml_time
+}
+
+flat_yaml_line_regex = re.compile(r'^([^\s:]+):(?:[ \t]+(.*))?$')
+flat_yaml_plain_scalar_stop = re.compile(r':[ \t]|[ \t]#')
+# Line breaks other than `\n`, byte order marks, and characters that
+# aren't allowed in YAML.
+flat_yaml_unsupported_chars = re.compile(
+    '[^\x09\x0A\x20-\x7E\xA0-\u2027\u202A-\uD7FF\uE000-\uFEFE'
+    '\uFF00-\uFFFD\U00010000-\U0010FFFF]')
+
+_NOT_CONSTRUCTED = object()
+
+
+def parse_flat_yaml(text):
+    """ Parses YAML markup that only has top-level `key: value` lines,
+        where each value is a plain scalar or a list of plain scalars
+        (like `[foo, bar]`). This is a lot faster than going through the
+        YAML parser for the common case of simple page headers.
+
+        Returns `None` if the markup isn't this simple, or doesn't have
+        anything in it. The YAML parser should be used instead then.
+        Otherwise, returns the same thing as `ConfigurationLoader` would.
+    """
+    text = text.replace('\r\n', '\n')
+    if flat_yaml_unsupported_chars.search(text):
+        return None
+
+    config = collections.OrderedDict()
+    for line in text.split('\n'):
+        if not line.strip(' ') or line[0] == '#':
+            continue
+
+        m = flat_yaml_line_regex.match(line)
+        if m is None:
+            return None
+
+        key, value = m.group(1, 2)
+        if not _is_flat_plain_scalar(key, False):
+            return None
+        key = _construct_flat_scalar(key)
+        if key is _NOT_CONSTRUCTED:
+            return None
+
+        value = value.rstrip(' \t') if value else ''
+        if value[:1] == '[' and value[-1:] == ']':
+            items = value[1:-1]
+            value = []
+            if items.strip():
+                for i in items.split(','):
+                    i = i.strip()
+                    if not _is_flat_plain_scalar(i, True):
+                        return None
+                    item = _construct_flat_scalar(i)
+                    if item is _NOT_CONSTRUCTED:
+                        return None
+                    value.append(item)
+        elif _is_flat_plain_scalar(value, False):
+            value = _construct_flat_scalar(value)
+            if value is _NOT_CONSTRUCTED:
+                return None
+        else:
+            return None
+
+        config[key] = value
+
+    if not config:
+        return None
+    return config
+
+
+def _is_flat_plain_scalar(value, in_flow):
+    if not value:
+        return not in_flow
+
+    c = value[0]
+    if c in '?:,[]{}#&*!|>\'"%@`':
+        return False
+    if c == '-' and (len(value) == 1 or value[1] in ' \t'):
+        return False
+    if value[-1] == ':' or flat_yaml_plain_scalar_stop.search(value):
+        return False
+    if in_flow:
+        for c in ',:[]{}':
+            if c in value:
+                return False
+    return True
+
+
+def _construct_flat_scalar(value):
+    tag = _resolve_flat_scalar(value)
+    if tag == 'tag:yaml.org,2002:str':
+        return value
+    func = _flat_scalar_construct_funcs.get(tag)
+    if func is None:
+        return _NOT_CONSTRUCTED
+    node = ScalarNode(tag, value)
+    try:
+        return func(_flat_scalar_constructor, node)
+    except ValueError:
+        # Let the YAML parser report the error.
+        return _NOT_CONSTRUCTED
+
+
+def _resolve_flat_scalar(value):
+    # This is how PyYAML resolves the implicit tag of plain scalars.
+    resolvers = ConfigurationLoader.yaml_implicit_resolvers
+    if value == '':
+        candidates = resolvers.get('', [])
+    else:
+        candidates = resolvers.get(value[0], [])
+    candidates = candidates + resolvers.get(None, [])
+    for tag, regexp in candidates:
+        if regexp.match(value):
+            return tag
+    return 'tag:yaml.org,2002:str'
+
+
 class ConfigurationDumper(yaml.SafeDumper):
     def represent_ordered_dict(self, data):
         # Not a typo: we're using `map` and not `omap` because we don't want
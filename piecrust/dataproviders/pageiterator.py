@@ -83,7 +83,11 @@ class PageIteratorDataProvider(DataProvider):
         if not self._iterated:
             rcs = self._app.env.render_ctx_stack
             if rcs.current_ctx is not None:
-                rcs.current_ctx.addUsedSource(it._source)
+                # The combined source doesn't have a name anymore once
+                # it's been iterated, so use the actual sources.
+                item_specs = it._getConsumedItemSpecs()
+                for source in self._sources:
+                    rcs.current_ctx.addUsedSource(source, item_specs)
             self._iterated = True
 
     def _addSource(self, source):
@@ -297,6 +301,15 @@ class PageIterator:
 
         self._load_event.fire(self)
 
+    def _getConsumedItemSpecs(self):
+        # Returns the specs of the content items that someone could
+        # have looked at through this iterator, or `None` if we don't
+        # know what they are.
+        if not self._is_content_source or self._cache is None:
+            return None
+        items = self._cache + [self._prev_page, self._next_page]
+        return [i._page.content_spec for i in items if i is not None]
+
     def _debugRenderDoc(self):
         return "Contains %d items" % len(self)
 
@@ -49,6 +49,14 @@ class ExecutionStats:
     def addManifestEntry(self, name, entry):
         self.manifests[name].append(entry)
 
+    def clear(self):
+        for oc in self.timers:
+            self.timers[oc] = 0
+        for oc in self.counters:
+            self.counters[oc] = 0
+        for oc in self.manifests:
+            self.manifests[oc] = []
+
     def mergeStats(self, other):
         for oc, ov in other.timers.items():
             v = self.timers.setdefault(oc, 0)
@@ -75,6 +83,7 @@ class ExecutionStats:
 class Environment:
     def __init__(self):
         from piecrust.cache import MemCache
+        from piecrust.pagestore import PageStoreRepository
         from piecrust.rendering import RenderingContextStack
 
         self.app = None
@@ -82,6 +91,7 @@ class Environment:
         self.was_cache_cleaned = False
         self.page_repository = MemCache()
         self.rendered_segments_repository = MemCache()
+        self.page_stores = PageStoreRepository()
         self.render_ctx_stack = RenderingContextStack()
         self.fs_cache_only_for_main_page = False
         self.abort_source_use = False
@@ -97,6 +107,8 @@ class Environment:
 
         self.rendered_segments_repository.fs_cache = \
             app.cache.getCache('renders')
+        if app.cache.enabled:
+            self.page_stores.cache = app.cache.getCache('pages')
 
     def _mergeCacheStats(self):
         repos = [
@@ -15,6 +15,13 @@ class Formatter(object):
     def initialize(self, app):
         self.app = app
 
+    def getCacheKey(self):
+        """ Returns a string that identifies this formatter, along with
+            any settings that change what it renders, so that its output
+            can be cached.
+        """
+        return self.__class__.__name__
+
     def render(self, format_name, txt):
         raise NotImplementedError()
 
@@ -8,26 +8,38 @@ class MarkdownFormatter(Formatter):
     def __init__(self):
         super(MarkdownFormatter, self).__init__()
         self._formatter = None
+        self._cache_key = None
+
+    def getCacheKey(self):
+        if self._cache_key is None:
+            self._cache_key = '%s:%r' % (self.__class__.__name__,
+                                         self._getConfig())
+        return self._cache_key
 
     def render(self, format_name, txt):
         assert format_name in self.FORMAT_NAMES
         self._ensureInitialized()
         return self._formatter.reset().convert(txt)
 
-    def _ensureInitialized(self):
-        if self._formatter is not None:
-            return
-
+    def _getConfig(self):
         config = self.app.config.get('markdown')
         if config is None:
             config = {}
         elif not isinstance(config, dict):
             raise Exception("The `markdown` configuration setting must be "
                             "a dictionary.")
+        return config
+
+    def _ensureInitialized(self):
+        if self._formatter is not None:
+            return
 
+        config = self._getConfig()
         extensions = config.get('extensions', [])
         if isinstance(extensions, str):
             extensions = [e.strip() for e in extensions.split(',')]
+        else:
+            extensions = list(extensions)
         # Compatibility with PieCrust 1.x
         if config.get('use_markdown_extra'):
             extensions.append('extra')
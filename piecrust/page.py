@@ -46,6 +46,7 @@ class Page:
         self.content_item = content_item
         self._config = None
         self._segments = None
+        self._digest = None
         self._flags = FLAG_NONE
         self._datetime = None
 
@@ -69,6 +70,11 @@ class Page:
     def content_mtime(self):
         return self.source.getItemMtime(self.content_item)
 
+    @property
+    def content_digest(self):
+        self._load()
+        return self._digest
+
     @property
     def flags(self):
         return self._flags
@@ -120,7 +126,7 @@ class Page:
         if self._config is not None:
             return
 
-        config, content, was_cache_valid = load_page(
+        config, content, was_cache_valid, digest = load_page(
             self.source, self.content_item)
 
         extra_config = self.source_metadata.get('config')
@@ -133,6 +139,7 @@ class Page:
 
         self._config = config
         self._segments = content
+        self._digest = digest
         if was_cache_valid:
             self._flags |= FLAG_RAW_CACHE_VALID
 
@@ -266,9 +273,26 @@ def _do_load_page(source, content_item):
     # Check the cache first.
     app = source.app
     cache = app.cache.getCache('pages')
-    cache_token = "%s@%s" % (source.name, content_item.spec)
-    cache_path = hashlib.md5(cache_token.encode('utf8')).hexdigest() + '.json'
+    cache_token = get_page_cache_token(source.name, content_item.spec)
+    cache_path = get_page_cache_path(cache_token)
     page_time = source.getItemMtime(content_item)
+
+    # Look in the source's page store, if any, which saves us from reading
+    # the cache file.
+    store = app.env.page_stores.getStore(source.name)
+    if store is not None:
+        cache_text = store.get(cache_token, page_time)
+        if cache_text is not None:
+            app.env.stats.stepCounter('PageStoreHits')
+            cache_data = json.loads(
+                cache_text,
+                object_pairs_hook=collections.OrderedDict)
+            config = PageConfiguration(
+                values=cache_data['config'],
+                validate=False)
+            content = json_load_segments(cache_data['content'])
+            return config, content, True, cache_data.get('digest')
+
     if cache.isValid(cache_path, page_time):
         cache_data = json.loads(
             cache.read(cache_path),
@@ -277,12 +301,31 @@ def _do_load_page(source, content_item):
             values=cache_data['config'],
             validate=False)
         content = json_load_segments(cache_data['content'])
-        return config, content, True
+        return config, content, True, cache_data.get('digest')
 
     # Nope, load the page from the source file.
     logger.debug("Loading page configuration from: %s" % content_item.spec)
     with source.openItem(content_item, 'r', encoding='utf-8') as fp:
         raw = fp.read()
+    digest = hashlib.md5(raw.encode('utf8')).hexdigest()
+
+    # When using content digests, the cache is still valid if the file was
+    # only touched, like after a fresh checkout.
+    if (app.config.get('baker/change_detection') == 'digest' and
+            cache.has(cache_path)):
+        cache_text = cache.read(cache_path)
+        cache_data = json.loads(
+            cache_text,
+            object_pairs_hook=collections.OrderedDict)
+        if cache_data.get('digest') == digest:
+            # Write it back so the cache is newer than the file again.
+            cache.write(cache_path, cache_text)
+            config = PageConfiguration(
+                values=cache_data['config'],
+                validate=False)
+            content = json_load_segments(cache_data['content'])
+            return config, content, True, digest
+
     header, offset = parse_config_header(raw)
 
     config = PageConfiguration(header)
@@ -292,12 +335,21 @@ def _do_load_page(source, content_item):
     # Save to the cache.
     cache_data = {
         'config': config.getAll(),
-        'content': json_save_segments(content)}
+        'content': json_save_segments(content),
+        'digest': digest}
     cache.write(cache_path, json.dumps(cache_data))
 
     app.env.stats.stepCounter('PageLoads')
 
-    return config, content, False
+    return config, content, False, digest
+
+
+def get_page_cache_token(source_name, item_spec):
+    return "%s@%s" % (source_name, item_spec)
+
+
+def get_page_cache_path(cache_token):
+    return hashlib.md5(cache_token.encode('utf8')).hexdigest() + '.json'
 
 
 segment_pattern = re.compile(
@@ -0,0 +1,182 @@
+import os
+import os.path
+import json
+import mmap
+import struct
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+
+PAGE_STORE_MAGIC = b'PCPS'
+PAGE_STORE_VERSION = 1
+PAGE_STORE_HEADER = struct.Struct('<4sIQ')
+
+
+class PageStoreError(Exception):
+    pass
+
+
+class PageStore(object):
+    """ A read-only file containing the cached configuration and contents
+        of all the pages in a source, as found in the `pages` cache.
+
+        It's written by the main process after all the pages have been
+        loaded, and memory-mapped by the bake workers so that pages can
+        be loaded again (e.g. for listing blog posts) without opening
+        one cache file per page.
+
+        Each page is stored along with the modification time of its cache
+        file, so that it's only used when the page hasn't changed since,
+        just like the cache file itself.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._fp = None
+        self._mm = None
+        self._index = None
+
+    def open(self):
+        fp = open(self.path, 'rb')
+        try:
+            mm = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            fp.close()
+            raise
+        try:
+            magic, version, index_offset = PAGE_STORE_HEADER.unpack_from(mm)
+            if magic != PAGE_STORE_MAGIC or version != PAGE_STORE_VERSION:
+                raise PageStoreError("Invalid page store: %s" % self.path)
+            self._index = json.loads(mm[index_offset:].decode('utf8'))
+        except Exception:
+            mm.close()
+            fp.close()
+            raise
+        self._fp = fp
+        self._mm = mm
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._fp.close()
+        self._fp = None
+        self._mm = None
+        self._index = None
+
+    def getCacheTime(self, key):
+        info = self._index.get(key)
+        if info is None:
+            return None
+        return info[2]
+
+    def getRaw(self, key):
+        info = self._index.get(key)
+        if info is None:
+            return None
+        offset, length, _ = info
+        return self._mm[offset:offset + length]
+
+    def get(self, key, page_time):
+        """ Returns the cached data for the given page, as JSON text, or
+            `None` if it's not in the store, or if it's out of date.
+        """
+        info = self._index.get(key)
+        if info is None or info[2] < page_time:
+            return None
+        offset, length, _ = info
+        return self._mm[offset:offset + length].decode('utf8')
+
+
+def write_page_store(path, cache, entries):
+    """ Writes a page store with the given entries, which are tuples of
+        a page's key and its cache path in the given cache.
+
+        Pages whose cache file didn't change since the previous version
+        of the store are copied from it instead of being read again.
+    """
+    prev_store = PageStore(path)
+    try:
+        prev_store.open()
+    except (OSError, ValueError, PageStoreError, struct.error):
+        prev_store = None
+
+    index = {}
+    tmp_path = '%s.%d.tmp' % (path, os.getpid())
+    try:
+        with open(tmp_path, 'wb') as fp:
+            fp.write(PAGE_STORE_HEADER.pack(PAGE_STORE_MAGIC,
+                                            PAGE_STORE_VERSION, 0))
+            for key, cache_path in entries:
+                cache_time = cache.getCacheTime(cache_path)
+                if cache_time is None:
+                    continue
+
+                data = None
+                if (prev_store is not None and
+                        prev_store.getCacheTime(key) == cache_time):
+                    data = prev_store.getRaw(key)
+                if data is None:
+                    with cache.openRead(cache_path, mode='rb') as cfp:
+                        data = cfp.read()
+
+                index[key] = [fp.tell(), len(data), cache_time]
+                fp.write(data)
+
+            index_offset = fp.tell()
+            fp.write(json.dumps(index).encode('utf8'))
+            fp.seek(0)
+            fp.write(PAGE_STORE_HEADER.pack(PAGE_STORE_MAGIC,
+                                            PAGE_STORE_VERSION,
+                                            index_offset))
+    finally:
+        if prev_store is not None:
+            prev_store.close()
+
+    try:
+        os.replace(tmp_path, path)
+    except OSError as ex:
+        # This can happen on Windows if some process still has the
+        # previous version of the store opened.
+        logger.debug("Couldn't replace page store '%s': %s" % (path, ex))
+        os.remove(tmp_path)
+        return 0
+    return len(index)
+
+
+class PageStoreRepository(object):
+    """ Keeps the page stores of all sources opened, as needed.
+    """
+    def __init__(self):
+        self.cache = None
+        self._stores = {}
+
+    def getStore(self, source_name):
+        store = self._stores.get(source_name, False)
+        if store is not False:
+            return store
+
+        store = None
+        if self.cache is not None:
+            path = self.cache.getCachePath(
+                get_page_store_cache_path(source_name))
+            if os.path.isfile(path):
+                store = PageStore(path)
+                try:
+                    store.open()
+                except Exception as ex:
+                    logger.debug("Ignoring invalid page store '%s': %s" %
+                                 (path, ex))
+                    store = None
+        self._stores[source_name] = store
+        return store
+
+    def clear(self):
+        for store in self._stores.values():
+            if store is not None:
+                store.close()
+        self._stores = {}
+
+
+def get_page_store_cache_path(source_name):
+    return '%s.store' % source_name
@@ -1,6 +1,8 @@
 import os.path
 import copy
 import queue
+import hashlib
+import time
 import shutil
 import logging
 import threading
@@ -42,28 +44,46 @@ class PageBaker(object):
         self.force = force
         self.site_root = app.config.get('site/root')
         self.pretty_urls = app.config.get('site/pretty_urls')
+        self.use_digests = (
+            app.config.get('baker/change_detection') == 'digest')
         self._do_write = self._writeDirect
-        self._writer_queue = None
         self._writer = None
         self._stats = app.env.stats
+        self._stats.registerCounter('PageWritesSkipped',
+                                    raise_if_registered=False)
+        self._stats.registerTimer('PageWriterQueueWait',
+                                  raise_if_registered=False)
+        self._stats.registerTimer('PageWriterDisk',
+                                  raise_if_registered=False)
+        self._stats.registerManifest('PageWriteErrors',
+                                     raise_if_registered=False)
         self._rsr = app.env.rendered_segments_repository
 
     def startWriterQueue(self):
-        self._writer_queue = queue.Queue()
-        self._writer = threading.Thread(
-            name='PageSerializer',
-            daemon=True,
-            target=_text_writer,
-            args=(self._writer_queue,))
+        self._writer = _PageWriter(
+            self.app.config.get('baker/writer_threads') or 1,
+            self.app.config.get('baker/writer_queue_size') or 0)
         self._writer.start()
         self._do_write = self._sendToWriterQueue
 
     def stopWriterQueue(self):
-        self._writer_queue.put_nowait(None)
-        self._writer.join()
+        """ Waits for all queued pages to be written, and returns the
+            errors that happened, as a list of `(out_path, message)`
+            tuples. They're also added to the `PageWriteErrors` manifest,
+            so that the baker can find them in the worker reports.
+        """
+        self._writer.stop()
+        self._stats.stepTimer('PageWriterQueueWait', self._writer.wait_time)
+        self._stats.stepTimer('PageWriterDisk', self._writer.write_time)
+        errors = self._writer.errors
+        for e in errors:
+            self._stats.addManifestEntry('PageWriteErrors', e)
+        self._writer = None
+        self._do_write = self._writeDirect
+        return errors
 
     def _sendToWriterQueue(self, out_path, content):
-        self._writer_queue.put_nowait((out_path, content))
+        self._writer.put(out_path, content)
 
     def _writeDirect(self, out_path, content):
         with open(out_path, 'w', encoding='utf8') as fp:
@@ -94,22 +114,32 @@ class PageBaker(object):
 
             # Find a corresponding sub-entry in the previous bake record.
             prev_sub_entry = None
+            prev_digest = None
             if prev_entry is not None:
                 try:
                     prev_sub_entry = prev_entry.getSub(cur_sub)
                 except IndexError:
                     pass
+                if self.use_digests:
+                    prev_digest = prev_entry.digest
 
             # Figure out if we need to bake this page.
             bake_status = _get_bake_status(page, out_path,
-                                           force_segments, force_layout,
-                                           prev_sub_entry, cur_sub_entry)
+                                           _is_sub_forced(force_segments,
+                                                          cur_sub),
+                                           _is_sub_forced(force_layout,
+                                                          cur_sub),
+                                           prev_sub_entry, cur_sub_entry,
+                                           prev_digest)
 
             # If this page didn't bake because it's already up-to-date.
             # Keep trying for as many subs as we know this page has.
             if bake_status == STATUS_CLEAN:
                 cur_sub_entry['render_info'] = copy.deepcopy(
                     prev_sub_entry['render_info'])
+                cur_sub_entry['digest'] = prev_sub_entry.get('digest')
+                cur_sub_entry['source_mtime'] = \
+                    prev_sub_entry.get('source_mtime')
                 cur_sub_entry['flags'] = \
                     SubPageFlags.FLAG_COLLAPSED_FROM_LAST_RUN
 
@@ -132,7 +162,8 @@ class PageBaker(object):
                         SubPageFlags.FLAG_RENDER_CACHE_INVALIDATED
 
                 logger.debug("  p%d -> %s" % (cur_sub, out_path))
-                rp = self._bakeSingle(page, cur_sub, out_path)
+                rp = self._bakeSingle(page, cur_sub, out_path,
+                                      prev_sub_entry, cur_sub_entry)
             except AbortedSourceUseError:
                 raise
             except Exception as ex:
@@ -174,7 +205,8 @@ class PageBaker(object):
 
         return rendered_subs
 
-    def _bakeSingle(self, page, sub_num, out_path):
+    def _bakeSingle(self, page, sub_num, out_path,
+                    prev_sub_entry, cur_sub_entry):
         ctx = RenderingContext(page, sub_num=sub_num)
         page.source.prepareRenderContext(ctx)
 
@@ -182,27 +214,127 @@ class PageBaker(object):
             rp = render_page(ctx)
 
         with self._stats.timerScope("PageSerialize"):
-            self._do_write(out_path, rp.content)
+            # Don't re-write outputs that didn't change, so that their
+            # file times stay the same for publishing.
+            digest = hashlib.md5(rp.content.encode('utf8')).hexdigest()
+            cur_sub_entry['digest'] = digest
+            cur_sub_entry['source_mtime'] = page.content_mtime
+            if (prev_sub_entry is not None and
+                    prev_sub_entry.get('digest') == digest and
+                    os.path.isfile(out_path)):
+                logger.debug("  %s is unchanged, skipping write." % out_path)
+                cur_sub_entry['flags'] |= SubPageFlags.FLAG_UNCHANGED_OUTPUT
+                self._stats.stepCounter('PageWritesSkipped')
+            else:
+                self._do_write(out_path, rp.content)
 
         return rp
 
 
-def _text_writer(q):
-    while True:
-        item = q.get()
-        if item is not None:
-            out_path, txt = item
-            out_dir = os.path.dirname(out_path)
+class _PageWriter:
+    """ Writes baked pages to disk from a pool of background threads.
+
+        The queue is bounded, so baking slows down instead of piling up
+        rendered pages in memory when the disk can't keep up. Each thread
+        writes the pages it finds in the queue in batches, and only writes
+        the last contents for any given output path in a batch.
+    """
+    BATCH_SIZE = 32
+
+    def __init__(self, thread_count, queue_size):
+        self.wait_time = 0
+        self.write_time = 0
+        self.errors = []
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._threads = [
+            threading.Thread(name='PageSerializer-%d' % i,
+                             daemon=True,
+                             target=self._run)
+            for i in range(thread_count)]
+        self._created_dirs = set()
+        self._lock = threading.Lock()
+
+    def start(self):
+        for t in self._threads:
+            t.start()
+
+    def put(self, out_path, content):
+        start_time = time.perf_counter()
+        self._queue.put((out_path, content))
+        self.wait_time += time.perf_counter() - start_time
+
+    def stop(self):
+        for _ in self._threads:
+            self._queue.put(None)
+        for t in self._threads:
+            t.join()
+
+    def _run(self):
+        q = self._queue
+        write_time = 0
+        errors = []
+        keep_running = True
+        while keep_running:
+            # Wait for something to write, and then grab whatever else
+            # is already waiting. Stop at the first sentinel object so
+            # that every thread gets one.
+            batch = {}
+            item = q.get()
+            while True:
+                if item is None:
+                    keep_running = False
+                    break
+                out_path, txt = item
+                batch[out_path] = txt
+                if len(batch) >= self.BATCH_SIZE:
+                    break
+                try:
+                    item = q.get_nowait()
+                except queue.Empty:
+                    break
+
+            start_time = time.perf_counter()
+            for out_path, txt in batch.items():
+                try:
+                    self._write(out_path, txt)
+                except Exception as ex:
+                    logger.error("Error writing '%s'." % out_path)
+                    logger.exception(ex)
+                    errors.append(
+                        (out_path, "Error writing '%s': %s" % (out_path, ex)))
+            write_time += time.perf_counter() - start_time
+
+        with self._lock:
+            self.write_time += write_time
+            self.errors += errors
+
+    def _write(self, out_path, txt):
+        out_dir = os.path.dirname(out_path)
+        if out_dir not in self._created_dirs:
             _ensure_dir_exists(out_dir)
+            self._created_dirs.add(out_dir)
 
-            with open(out_path, 'w', encoding='utf8') as fp:
+        # Write to a temporary file first, so that a failed write doesn't
+        # leave a truncated output behind.
+        tmp_path = '%s.%d.tmp' % (out_path, threading.get_ident())
+        try:
+            with open(tmp_path, 'w', encoding='utf8') as fp:
                 fp.write(txt)
+            os.replace(tmp_path, out_path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
 
-            q.task_done()
-        else:
-            # Sentinel object, terminate the thread.
-            q.task_done()
-            break
+
+def _is_sub_forced(force, sub_num):
+    # Forcing can be given for all sub-pages, or as a list of sub-page
+    # numbers.
+    if isinstance(force, list):
+        return sub_num in force
+    return bool(force)
 
 
 STATUS_CLEAN = 0
@@ -211,7 +343,7 @@ STATUS_INVALIDATE_AND_BAKE = 2
 
 
 def _get_bake_status(page, out_path, force_segments, force_layout,
-                     prev_sub_entry, cur_sub_entry):
+                     prev_sub_entry, cur_sub_entry, prev_digest=None):
     # Easy tests.
     if force_segments:
         return STATUS_INVALIDATE_AND_BAKE
@@ -224,7 +356,6 @@ def _get_bake_status(page, out_path, force_segments, force_layout,
         return status
 
     # Check for up-to-date outputs.
-    in_path_time = page.content_mtime
     try:
         out_path_time = os.path.getmtime(out_path)
     except OSError:
@@ -233,8 +364,16 @@ def _get_bake_status(page, out_path, force_segments, force_layout,
             SubPageFlags.FLAG_FORCED_BY_NO_PREVIOUS
         return STATUS_BAKE
 
-    if out_path_time <= in_path_time:
-        return STATUS_BAKE
+    if prev_digest is not None:
+        # Compare the contents of the source file with what they were
+        # on the last bake, instead of looking at file times.
+        if prev_digest != page.content_digest:
+            return STATUS_BAKE
+    elif out_path_time <= page.content_mtime:
+        # Outputs that didn't change aren't written again, so they can
+        # be older than their source. Check what it was last time.
+        if prev_sub_entry.get('source_mtime') != page.content_mtime:
+            return STATUS_BAKE
 
     # Nope, all good.
     return STATUS_CLEAN
@@ -11,6 +11,7 @@ class SubPageFlags:
     FLAG_FORCED_BY_GENERAL_FORCE = 2**5
     FLAG_RENDER_CACHE_INVALIDATED = 2**6
     FLAG_COLLAPSED_FROM_LAST_RUN = 2**7
+    FLAG_UNCHANGED_OUTPUT = 2**8
 
 
 def create_subpage_job_result(out_uri, out_path):
@@ -19,7 +20,9 @@ def create_subpage_job_result(out_uri, out_path):
         'out_path': out_path,
         'flags': SubPageFlags.FLAG_NONE,
         'errors': [],
-        'render_info': None
+        'render_info': None,
+        'digest': None,
+        'source_mtime': None
     }
 
 
@@ -38,6 +41,7 @@ class PagePipelineRecordEntry(RecordEntry):
         self.config = None
         self.route_params = None
         self.timestamp = None
+        self.digest = None
         self.subs = []
 
     @property
@@ -111,7 +115,8 @@ sub_flag_descriptions = {
     SubPageFlags.FLAG_FORCED_BY_PREVIOUS_ERRORS: 'forced by errors',
     SubPageFlags.FLAG_FORCED_BY_GENERAL_FORCE: 'manually forced',
     SubPageFlags.FLAG_RENDER_CACHE_INVALIDATED: 'cache invalidated',
-    SubPageFlags.FLAG_COLLAPSED_FROM_LAST_RUN: 'from last run'
+    SubPageFlags.FLAG_COLLAPSED_FROM_LAST_RUN: 'from last run',
+    SubPageFlags.FLAG_UNCHANGED_OUTPUT: 'unchanged output'
 }
 
 
@@ -122,5 +127,7 @@ def _describe_render_info(ri):
         'UsedPagination': ri['used_pagination'],
         'PaginationHasMore': ri['pagination_has_more'],
         'UsedAssets': ri['used_assets'],
-        'UsedSourceNames': ri['used_source_names']
+        'UsedSourceNames': ri['used_source_names'],
+        'UsedSourceItems': ri.get('used_source_items'),
+        'UsedTemplates': ri.get('used_templates')
     }
@@ -14,6 +14,7 @@ class AssetPipelineRecordEntry(RecordEntry):
         self.flags = self.FLAG_NONE
         self.proc_tree = None
         self.out_paths = []
+        self.deps = None
 
     @property
     def was_prepared(self):
@@ -37,6 +38,8 @@ class AssetPipelineRecordEntry(RecordEntry):
         d = super().describe()
         d['Flags'] = get_flag_descriptions(self.flags, flag_descriptions)
         d['Processing Tree'] = _format_proc_tree(self.proc_tree, 20 * ' ')
+        d['Dependencies'] = (
+            sorted(self.deps.keys()) if self.deps is not None else 'unknown')
         return d
 
     def getAllOutputPaths(self):
@@ -49,6 +52,7 @@ def add_asset_job_result(result):
         'flags': AssetPipelineRecordEntry.FLAG_NONE,
         'proc_tree': None,
         'out_paths': [],
+        'deps': None,
     })
 
 
@@ -57,6 +61,7 @@ def merge_job_result_into_record_entry(record_entry, result):
     record_entry.flags |= result['flags']
     record_entry.proc_tree = result['proc_tree']
     record_entry.out_paths = result['out_paths']
+    record_entry.deps = result['deps']
 
 
 flag_descriptions = {
@@ -117,10 +117,14 @@ class ProcessingTreeBuilder(object):
 
 
 class ProcessingTreeRunner(object):
-    def __init__(self, base_dir, tmp_dir, out_dir):
+    def __init__(self, base_dir, tmp_dir, out_dir, force=False):
         self.base_dir = base_dir
         self.tmp_dir = tmp_dir
         self.out_dir = out_dir
+        self.force = force
+        # The modification times of the root input file and all its
+        # dependencies, or `None` if we can't know which files they are.
+        self.dependencies = {}
 
     def processSubTree(self, tree_root):
         did_process = False
@@ -195,6 +199,7 @@ class ProcessingTreeRunner(object):
         if (proc.is_bypassing_structured_processing or
                 not proc.is_delegating_dependency_check):
             # This processor wants to handle things on its own...
+            self.dependencies = None
             node.setState(STATE_DIRTY, False)
             return
 
@@ -205,6 +210,7 @@ class ProcessingTreeRunner(object):
         base_dir = self._getNodeBaseDir(node)
         full_path = os.path.join(base_dir, node.path)
         in_mtime = (full_path, os.path.getmtime(full_path))
+        all_mtimes = {full_path: in_mtime[1]}
         force_build = False
         try:
             deps = proc.getDependencies(full_path)
@@ -213,14 +219,25 @@ class ProcessingTreeRunner(object):
             elif deps is not None:
                 for dep in deps:
                     dep_mtime = os.path.getmtime(dep)
+                    all_mtimes[dep] = dep_mtime
                     if dep_mtime > in_mtime[1]:
                         in_mtime = (dep, dep_mtime)
         except Exception as e:
             logger.warning("%s -- Will force-bake: %s" % (e, node.path))
+            self.dependencies = None
             node.setState(STATE_DIRTY, True)
             return
 
+        # Only the root node's input comes from the source -- other nodes'
+        # inputs are generated from it.
         if force_build:
+            self.dependencies = None
+        elif node.level == 0 and self.dependencies is not None:
+            self.dependencies.update(all_mtimes)
+
+        if self.force:
+            node.setState(STATE_DIRTY, True)
+        elif force_build:
             # Just do what the processor told us to do.
             node.setState(STATE_DIRTY, True)
             message = "Processor requested a forced build."
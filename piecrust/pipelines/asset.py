@@ -7,10 +7,10 @@ from piecrust.pipelines._procrecords import (
     add_asset_job_result, merge_job_result_into_record_entry)
 from piecrust.pipelines._proctree import (
     ProcessingTreeBuilder, ProcessingTreeRunner,
-    get_node_name_tree, print_node,
-    STATE_DIRTY)
-from piecrust.pipelines.base import ContentPipeline
-from piecrust.processing.base import ProcessorContext
+    get_node_name_tree, print_node)
+from piecrust.pipelines.base import ContentPipeline, create_job
+from piecrust.processing.base import (
+    ProcessorContext, ProcessorPostJobRunContext)
 from piecrust.sources.fs import FSContentSourceBase
 
 
@@ -65,6 +65,52 @@ class AssetPipeline(ContentPipeline):
         stats = self.app.env.stats
         stats.registerTimer('BuildProcessingTree', raise_if_registered=False)
         stats.registerTimer('RunProcessingTree', raise_if_registered=False)
+        stats.registerTimer('CheckAssetsState', raise_if_registered=False)
+        stats.registerCounter('AssetsUpToDate', raise_if_registered=False)
+
+    def createJobs(self, ctx):
+        # Figure out which assets are up-to-date by comparing the files'
+        # modification times against the ones saved in the previous
+        # record, and only create jobs for the other ones.
+        prev_record = ctx.previous_record
+        cur_record = ctx.current_record
+        stats = self.app.env.stats
+
+        dirty_specs = None
+        out_paths = None
+        if not self.ctx.force:
+            with stats.timerScope('CheckAssetsState'):
+                mtimes = _get_dir_mtimes(self._base_dir)
+                dirty_specs = _get_dirty_specs(prev_record, mtimes)
+                out_paths = _get_existing_out_paths(prev_record)
+
+        jobs = []
+        for item in self.source.getAllContents():
+            item_spec = item.spec
+
+            # Ignored assets don't need a job.
+            rel_path = os.path.relpath(item_spec, self._base_dir)
+            if re_matchany(rel_path, self._ignore_patterns):
+                cur_record.addEntry(self.createRecordEntry(item_spec))
+                continue
+
+            if dirty_specs is not None and item_spec not in dirty_specs:
+                prev_entry = prev_record.getEntry(item_spec)
+                if (prev_entry is not None and
+                        prev_entry.deps is not None and
+                        not prev_entry.errors and
+                        all([p in out_paths for p in prev_entry.out_paths])):
+                    cur_entry = self.createRecordEntry(item_spec)
+                    _collapse_record_entry(cur_entry, prev_entry)
+                    cur_record.addEntry(cur_entry)
+                    stats.stepCounter('AssetsUpToDate')
+                    continue
+
+            jobs.append(create_job(self, item_spec))
+
+        if len(jobs) > 0:
+            return jobs, None
+        return None, None
 
     def run(self, job, ctx, result):
         # Create the result stuff.
@@ -95,21 +141,28 @@ class AssetPipeline(ContentPipeline):
             result['flags'] |= (
                 AssetPipelineRecordEntry.FLAG_BYPASSED_STRUCTURED_PROCESSING)
 
-        if self.ctx.force:
-            tree_root.setState(STATE_DIRTY, True)
-
         with stats.timerScope('RunProcessingTree'):
             runner = ProcessingTreeRunner(
-                self._base_dir, self.tmp_dir, out_dir)
+                self._base_dir, self.tmp_dir, out_dir,
+                force=self.ctx.force)
             if runner.processSubTree(tree_root):
                 result['flags'] |= (
                     AssetPipelineRecordEntry.FLAG_PROCESSED)
+            result['deps'] = runner.dependencies
 
     def handleJobResult(self, result, ctx):
         entry = self.createRecordEntry(result['item_spec'])
         merge_job_result_into_record_entry(entry, result)
         ctx.record.addEntry(entry)
 
+    def postJobRun(self, ctx):
+        # Let processors do things that need to know about everything
+        # that was baked, like generating sitemaps.
+        proc_ctx = ProcessorPostJobRunContext(
+            self, ctx.record_history, ctx.record_histories)
+        for proc in self._processors:
+            proc.onPipelinePostJobRun(proc_ctx)
+
     def getDeletions(self, ctx):
         for prev, cur in ctx.record_history.diffs:
             if prev and not cur:
@@ -125,11 +178,7 @@ class AssetPipeline(ContentPipeline):
             if prev and cur and not cur.was_processed:
                 # This asset wasn't processed, so the information from
                 # last time is still valid.
-                cur.flags = (
-                    (prev.flags & ~AssetPipelineRecordEntry.FLAG_PROCESSED) |
-                    AssetPipelineRecordEntry.FLAG_COLLAPSED_FROM_LAST_RUN)
-                cur.out_paths = list(prev.out_paths)
-                cur.errors = list(prev.errors)
+                _collapse_record_entry(cur, prev)
 
     def shutdown(self):
         # Invoke post-processors.
@@ -138,6 +187,79 @@ class AssetPipeline(ContentPipeline):
             proc.onPipelineEnd(proc_ctx)
 
 
+def _collapse_record_entry(cur, prev):
+    cur.flags = (
+        (prev.flags & ~AssetPipelineRecordEntry.FLAG_PROCESSED) |
+        AssetPipelineRecordEntry.FLAG_COLLAPSED_FROM_LAST_RUN)
+    cur.proc_tree = prev.proc_tree
+    cur.out_paths = list(prev.out_paths)
+    cur.deps = prev.deps
+    cur.errors = list(prev.errors)
+
+
+def _get_dir_mtimes(base_dir):
+    mtimes = {}
+    stack = [base_dir]
+    while stack:
+        cur_dir = stack.pop()
+        try:
+            entries = list(os.scandir(cur_dir))
+        except OSError:
+            continue
+        for e in entries:
+            if e.is_dir():
+                stack.append(e.path)
+            else:
+                mtimes[e.path] = e.stat().st_mtime
+    return mtimes
+
+
+def _get_existing_out_paths(prev_record):
+    # Only list the directories the assets were written to last time,
+    # instead of walking the whole output directory with all the baked
+    # pages in it.
+    out_dirs = set()
+    for prev_entry in prev_record.getEntries():
+        for out_path in prev_entry.out_paths:
+            out_dirs.add(os.path.dirname(out_path))
+
+    paths = set()
+    for out_dir in out_dirs:
+        try:
+            filenames = os.listdir(out_dir)
+        except OSError:
+            continue
+        for fn in filenames:
+            paths.add(os.path.join(out_dir, fn))
+    return paths
+
+
+def _get_dirty_specs(prev_record, mtimes):
+    # Build an index of which assets depend on each file, so that we only
+    # look at each file once, even when lots of assets depend on it (like
+    # a Sass partial included by every stylesheet).
+    rdeps = {}
+    for prev_entry in prev_record.getEntries():
+        if prev_entry.deps is None:
+            continue
+        for path, mtime in prev_entry.deps.items():
+            rdeps.setdefault(path, []).append((prev_entry.item_spec, mtime))
+
+    dirty_specs = set()
+    for path, users in rdeps.items():
+        cur_mtime = mtimes.get(path)
+        if cur_mtime is None:
+            # Dependencies can be outside of the assets directory.
+            try:
+                cur_mtime = os.path.getmtime(path)
+            except OSError:
+                pass
+        for item_spec, mtime in users:
+            if cur_mtime != mtime:
+                dirty_specs.add(item_spec)
+    return dirty_specs
+
+
 split_processor_names_re = re.compile(r'[ ,]+')
 
 
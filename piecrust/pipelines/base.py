@@ -11,10 +11,13 @@ class PipelineContext:
     """ The context for running a content pipeline.
     """
     def __init__(self, out_dir, *,
-                 worker_id=-1, force=None):
+                 worker_id=-1, force=None, changed_templates=None):
         self.out_dir = out_dir
         self.worker_id = worker_id
         self.force = force
+        # The names of the templates that changed since the last bake,
+        # if they're known.
+        self.changed_templates = changed_templates
 
     @property
     def is_worker(self):
@@ -102,8 +105,9 @@ class PipelineJobResultHandleContext:
 
 
 class PipelinePostJobRunContext:
-    def __init__(self, record_history):
+    def __init__(self, record_history, record_histories):
         self.record_history = record_history
+        self.record_histories = record_histories
 
 
 class PipelineDeletionContext:
@@ -122,6 +126,7 @@ class ContentPipeline:
     PIPELINE_NAME = None
     RECORD_ENTRY_CLASS = None
     PASS_NUM = 0
+    DEFAULT_JOB_COST = 0.01
 
     def __init__(self, source, ctx):
         self.source = source
@@ -135,6 +140,8 @@ class ContentPipeline:
             tmp_dir = os.path.join(tempfile.gettempdir(), 'piecrust')
         self.tmp_dir = os.path.join(tmp_dir, self.PIPELINE_NAME)
 
+        self._avg_job_times = {}
+
     @property
     def app(self):
         return self.source.app
@@ -153,6 +160,32 @@ class ContentPipeline:
         record_entry.item_spec = item_spec
         return record_entry
 
+    def getJobCost(self, job, ctx):
+        """ Returns how long the given job is expected to take, so that the
+            most expensive jobs can be started first. This is based on how
+            long the same job took during the previous bake, or on how long
+            jobs of this pipeline took on average if this job is new.
+        """
+        pass_num = ctx.pass_num
+        entry_spec = job.get('record_entry_spec', job['job_spec'][1])
+        prev_entry = ctx.previous_record.getEntry(entry_spec)
+        if prev_entry is not None:
+            t = prev_entry.job_times.get(pass_num)
+            if t is not None:
+                return t
+
+        avg = self._avg_job_times.get(pass_num)
+        if avg is None:
+            times = [e.job_times[pass_num]
+                     for e in ctx.previous_record.getEntries()
+                     if pass_num in e.job_times]
+            if times:
+                avg = sum(times) / len(times)
+            else:
+                avg = self.DEFAULT_JOB_COST
+            self._avg_job_times[pass_num] = avg
+        return avg
+
     def handleJobResult(self, result, ctx):
         raise NotImplementedError()
 
@@ -201,12 +234,14 @@ def get_pipeline_name_for_source(source):
 
 class PipelineManager:
     def __init__(self, app, out_dir, *,
-                 record_histories=None, worker_id=-1, force=False):
+                 record_histories=None, worker_id=-1, force=False,
+                 changed_templates=None):
         self.app = app
         self.record_histories = record_histories
         self.out_dir = out_dir
         self.worker_id = worker_id
         self.force = force
+        self.changed_templates = changed_templates
 
         self._pipeline_classes = {}
         for pclass in app.plugin_loader.getPipelines():
@@ -230,7 +265,8 @@ class PipelineManager:
 
         pname = get_pipeline_name_for_source(source)
         ppctx = PipelineContext(self.out_dir,
-                                worker_id=self.worker_id, force=self.force)
+                                worker_id=self.worker_id, force=self.force,
+                                changed_templates=self.changed_templates)
         pp = self._pipeline_classes[pname](source, ppctx)
         pp.initialize()
 
@@ -247,7 +283,8 @@ class PipelineManager:
             ppinfo.record_history.build()
 
         for ppinfo in self.getPipelineInfos():
-            ctx = PipelinePostJobRunContext(ppinfo.record_history)
+            ctx = PipelinePostJobRunContext(ppinfo.record_history,
+                                            self.record_histories)
             ppinfo.pipeline.postJobRun(ctx)
 
     def deleteStaleOutputs(self):
@@ -268,6 +305,14 @@ class PipelineManager:
     def collapseRecords(self, keep_unused_records=False):
         seen_records = []
         for ppinfo in self.getPipelineInfos():
+            # Keep the job timings from last time for any pass that didn't
+            # run a job this time, so we can still schedule them properly
+            # on the next bake.
+            for prev, cur in ppinfo.record_history.diffs:
+                if prev and cur:
+                    for pass_num, t in prev.job_times.items():
+                        cur.job_times.setdefault(pass_num, t)
+
             ctx = PipelineCollapseRecordContext(ppinfo.record_history)
             ppinfo.pipeline.collapseRecords(ctx)
             seen_records.append(ppinfo.pipeline.record_name)
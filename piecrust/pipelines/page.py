@@ -1,5 +1,9 @@
 import copy
+import time
 import logging
+from piecrust.chefutil import format_timed
+from piecrust.page import get_page_cache_token, get_page_cache_path
+from piecrust.pagestore import write_page_store, get_page_store_cache_path
 from piecrust.pipelines.base import (
     ContentPipeline, create_job, content_item_from_job)
 from piecrust.pipelines._pagebaker import PageBaker, get_output_path
@@ -63,12 +67,22 @@ class PagePipeline(ContentPipeline):
         uri_getter = self.source.route.getUri
         pretty_urls = app.config.get('site/pretty_urls')
 
-        history = ctx.record_histories.getHistory(ctx.record_name).copy()
+        record_histories = ctx.record_histories
+        history = record_histories.getHistory(ctx.record_name)
         history.build()
 
         cur_rec_used_paths = {}
         history.current.user_data['used_paths'] = cur_rec_used_paths
-        all_records = ctx.record_histories.current.records
+        dirty_source_names = history.current.user_data['dirty_source_names']
+        dirty_items = _get_dirty_items(history)
+        history.current.user_data['dirty_source_items'] = {
+            self.source.name: dirty_items}
+        changed_templates = self.ctx.changed_templates
+
+        # All the pages were loaded in the previous pass, so we can now
+        # pack their cached configurations and contents together for the
+        # workers to use in the next passes.
+        self._savePageStore(history.current)
 
         for prev, cur in history.diffs:
             # Ignore pages that disappeared since last bake.
@@ -79,10 +93,19 @@ class PagePipeline(ContentPipeline):
             if cur.hasFlag(PagePipelineRecordEntry.FLAG_IS_DRAFT):
                 continue
 
-            # Skip pages that haven't changed since last bake.
+            # Skip pages that haven't changed since last bake, unless their
+            # segments used some templates that changed. In that case, any
+            # page showing their contents needs to be re-baked too.
+            force_segments = False
             if (prev and not cur.hasFlag(
                     PagePipelineRecordEntry.FLAG_SOURCE_MODIFIED)):
-                continue
+                if not _uses_changed_templates(prev, 'segments',
+                                               changed_templates):
+                    continue
+                force_segments = True
+                dirty_source_names.add(self.source.name)
+                if dirty_items is not None:
+                    dirty_items.add(cur.item_spec)
 
             # For pages that are known to use other sources in their own
             # content segments (we don't care about the layout yet), we
@@ -102,9 +125,10 @@ class PagePipeline(ContentPipeline):
             # page that writes out to the same URL.
             uri = uri_getter(cur.route_params)
             out_path = get_output_path(app, out_dir, uri, pretty_urls)
-            override = _find_used_path_spec(all_records, out_path)
+            override = record_histories.getUsedPath(out_path)
             if override is not None:
-                override_source_name, override_entry_spec = override
+                override_record_name, override_entry_spec = override
+                override_source_name = override_record_name.split('@')[0]
                 override_source = app.getSource(override_source_name)
                 if override_source.config['realm'] == \
                         self.source.config['realm']:
@@ -124,26 +148,54 @@ class PagePipeline(ContentPipeline):
             # Nope, all good, let's create a job for this item.
             cur.flags |= PagePipelineRecordEntry.FLAG_SEGMENTS_RENDERED
             cur_rec_used_paths[out_path] = cur.item_spec
+            record_histories.addUsedPath(ctx.record_name, out_path,
+                                         cur.item_spec)
 
             jobs.append(create_job(self, cur.item_spec,
-                                   pass_num=pass_num))
+                                   pass_num=pass_num,
+                                   force_segments=force_segments))
 
         if len(jobs) > 0:
             return jobs
         return None
 
+    def _savePageStore(self, record):
+        cache = self.app.cache
+        if not cache.enabled:
+            return
+
+        start_time = time.perf_counter()
+        pages_cache = cache.getCache('pages')
+        src_name = self.source.name
+        entries = []
+        for entry in record.getEntries():
+            token = get_page_cache_token(src_name, entry.item_spec)
+            entries.append((token, get_page_cache_path(token)))
+
+        path = pages_cache.getCachePath(get_page_store_cache_path(src_name))
+        count = write_page_store(path, pages_cache, entries)
+        logger.debug(format_timed(
+            start_time, "saved %d pages in store for source: %s" %
+            (count, src_name), colored=False))
+
     def _createLayoutJobs(self, ctx):
-        # Get the list of all sources that had anything baked.
+        # Get the list of all sources that had anything baked, along with
+        # which of their items changed, when we know.
         dirty_source_names = set()
+        dirty_source_items = {}
         all_records = ctx.record_histories.current.records
         for rec in all_records:
             rec_dsn = rec.user_data.get('dirty_source_names')
             if rec_dsn:
                 dirty_source_names |= rec_dsn
+            rec_dsi = rec.user_data.get('dirty_source_items')
+            if rec_dsi:
+                dirty_source_items.update(rec_dsi)
 
         jobs = []
         pass_num = ctx.pass_num
-        history = ctx.record_histories.getHistory(ctx.record_name).copy()
+        changed_templates = self.ctx.changed_templates
+        history = ctx.record_histories.getHistory(ctx.record_name)
         history.build()
         for prev, cur in history.diffs:
             if not cur or cur.hasFlag(PagePipelineRecordEntry.FLAG_OVERRIDEN):
@@ -167,17 +219,25 @@ class PagePipeline(ContentPipeline):
             # The common example for this is a blog index page which hasn't
             # been touched, but needs to be re-baked because someone added or
             # edited a post.
+            #
+            # The same goes for pages that used templates that changed.
             if prev:
-                usn1, usn2 = prev.getAllUsedSourceNames()
-                force_segments = any(map(lambda u: u in dirty_source_names,
-                                     usn1))
-                force_layout = any(map(lambda u: u in dirty_source_names,
-                                   usn2))
+                force_segments = _get_forced_subs(
+                    prev, 'segments', dirty_source_names, dirty_source_items,
+                    changed_templates)
+                force_layout = _get_forced_subs(
+                    prev, 'layout', dirty_source_names, dirty_source_items,
+                    changed_templates)
 
                 if force_segments or force_layout:
                     # Yep, we need to force-rebake some aspect of this page.
                     do_bake = True
 
+                elif prev.has_any_error:
+                    # Something went wrong with this page last time, like
+                    # failing to write one of its outputs. Bake it again.
+                    do_bake = True
+
                 elif not do_bake:
                     # This page uses other sources, but no source was dirty
                     # this time around (it was a null build, maybe). We
@@ -210,6 +270,7 @@ class PagePipeline(ContentPipeline):
             new_entry.config = result['config']
             new_entry.route_params = result['route_params']
             new_entry.timestamp = result['timestamp']
+            new_entry.digest = result['digest']
             ctx.record.addEntry(new_entry)
 
             # If this page was modified, flag its entire source as "dirty",
@@ -272,6 +333,7 @@ class PagePipeline(ContentPipeline):
         result['config'] = page.config.getAll()
         result['route_params'] = content_item.metadata['route_params']
         result['timestamp'] = page.datetime.timestamp()
+        result['digest'] = page.content_digest
 
         if page.was_modified:
             result['flags'] |= PagePipelineRecordEntry.FLAG_SOURCE_MODIFIED
@@ -292,7 +354,8 @@ class PagePipeline(ContentPipeline):
         env = self.app.env
         env.abort_source_use = True
         try:
-            rdr_ctx = RenderingContext(page)
+            rdr_ctx = RenderingContext(
+                page, force_render=job.get('force_segments', False))
             render_page_segments(rdr_ctx)
         except AbortedSourceUseError:
             logger.debug("Page was aborted for using source: %s" %
@@ -316,12 +379,69 @@ class PagePipeline(ContentPipeline):
         result['subs'] = rdr_subs
 
 
-def _find_used_path_spec(records, path):
-    for rec in records:
-        up = rec.user_data.get('used_paths')
-        if up is not None:
-            entry_spec = up.get(path)
-            if entry_spec is not None:
-                src_name = rec.name.split('@')[0]
-                return (src_name, entry_spec)
-    return None
+def _get_dirty_items(history):
+    """ Returns the specs of the items that changed in the given record
+        history, or `None` if the changes could also change what other
+        pages get when they iterate over the source, like when items are
+        added or removed, or when their configuration or date changed.
+    """
+    dirty_items = set()
+    for prev, cur in history.diffs:
+        if prev is None or cur is None:
+            return None
+        if cur.hasFlag(PagePipelineRecordEntry.FLAG_SOURCE_MODIFIED):
+            if (prev.config != cur.config or
+                    prev.timestamp != cur.timestamp):
+                return None
+            dirty_items.add(cur.item_spec)
+    return dirty_items
+
+
+def _get_forced_subs(prev_entry, pass_name, dirty_source_names,
+                     dirty_source_items, changed_templates=None):
+    """ Figures out which sub-pages of a page used changed items from
+        other sources, or changed templates, on the given render pass,
+        according to the previous bake. Returns `True` if all the sub-pages
+        need to be re-rendered, or the list of sub-page numbers that do.
+    """
+    forced_subs = []
+    for i, sub in enumerate(prev_entry.subs):
+        ri = sub.get('render_info')
+        if not ri:
+            continue
+
+        if _sub_uses_changed_templates(ri, pass_name, changed_templates):
+            forced_subs.append(i + 1)
+            continue
+
+        used_items = ri.get('used_source_items', {}).get(pass_name, {})
+        for src_name in ri['used_source_names'][pass_name]:
+            if src_name not in dirty_source_names:
+                continue
+            dirty_items = dirty_source_items.get(src_name)
+            item_specs = used_items.get(src_name)
+            if dirty_items is None or item_specs is None:
+                return True
+            if not dirty_items.isdisjoint(item_specs):
+                forced_subs.append(i + 1)
+                break
+    return forced_subs
+
+
+def _uses_changed_templates(prev_entry, pass_name, changed_templates):
+    for sub in prev_entry.subs:
+        ri = sub.get('render_info')
+        if ri and _sub_uses_changed_templates(ri, pass_name,
+                                              changed_templates):
+            return True
+    return False
+
+
+def _sub_uses_changed_templates(render_info, pass_name, changed_templates):
+    if not changed_templates:
+        return False
+    used = render_info.get('used_templates', {}).get(pass_name)
+    if used is None:
+        # We don't know which templates were used.
+        return True
+    return not changed_templates.isdisjoint(used)
@@ -1,8 +1,11 @@
 import os
 import os.path
+import mmap
 import pickle
+import struct
 import hashlib
 import logging
+import itertools
 from piecrust import APP_VERSION
 
 
@@ -15,6 +18,7 @@ class RecordEntry:
     def __init__(self):
         self.item_spec = None
         self.errors = []
+        self.job_times = {}
 
     @property
     def success(self):
@@ -40,29 +44,55 @@ class Record:
         self.user_data = {}
         self.success = True
         self._entries = {}
+        self._index = None
 
     @property
     def entry_count(self):
+        if self._index is not None:
+            return self._index.count
         return len(self._entries)
 
     def addEntry(self, entry):
+        self._loadAllEntries()
         if entry.item_spec in self._entries:
             raise ValueError("Entry '%s' is already in the record." %
                              entry.item_spec)
         self._entries[entry.item_spec] = entry
 
     def getEntries(self):
+        self._loadAllEntries()
         return self._entries.values()
 
     def getEntry(self, item_spec):
-        return self._entries.get(item_spec)
+        entry = self._entries.get(item_spec)
+        if entry is None and self._index is not None:
+            entry = self._index.getEntry(item_spec)
+            if entry is not None:
+                self._entries[item_spec] = entry
+        return entry
+
+    def _loadAllEntries(self):
+        if self._index is None:
+            return
+
+        # Keep the entries we already decoded, so that anybody holding on
+        # to them still sees the same objects.
+        entries = {}
+        for e in self._index.getAllEntries():
+            entries[e.item_spec] = self._entries.get(e.item_spec, e)
+        self._entries = entries
+        self._index = None
+
+    def __getstate__(self):
+        self._loadAllEntries()
+        return self.__dict__
 
 
 class MultiRecord:
     """ A container that includes multiple `Record` instances -- one for
         each content source that was baked.
     """
-    RECORD_VERSION = 13
+    RECORD_VERSION = 18
 
     def __init__(self):
         self.records = []
@@ -71,6 +101,7 @@ class MultiRecord:
         self.incremental_count = 0
         self.invalidated = False
         self.stats = None
+        self.templates_state = None
         self._app_version = APP_VERSION
         self._record_version = self.RECORD_VERSION
 
@@ -89,14 +120,140 @@ class MultiRecord:
         if not os.path.isdir(path_dir):
             os.makedirs(path_dir, 0o755)
 
-        with open(path, 'wb') as fp:
-            pickle.dump(self, fp, pickle.HIGHEST_PROTOCOL)
+        # Write to a temporary file first, since the file we're replacing
+        # may still be memory-mapped, by us or by some bake workers.
+        temp_path = path + '.tmp'
+        with open(temp_path, 'wb') as fp:
+            _write_records(self, fp)
+        os.replace(temp_path, path)
 
     @staticmethod
     def load(path):
         logger.debug("Loading bake records from: %s" % path)
-        with open(path, 'rb') as fp:
-            return pickle.load(fp)
+        return _read_records(path)
+
+
+class InvalidRecordsFormatError(Exception):
+    pass
+
+
+# The records file starts with a header that gives the position of the
+# "table of contents", which is a pickled dictionary with everything in the
+# `MultiRecord` except for the entries. Entries are pickled one by one, and
+# each record has an index table of fixed-size rows, sorted by the MD5 hash
+# of the entries' item specs, so that a single entry can be found with a
+# binary search and un-pickled without touching the others.
+_RECORDS_MAGIC = b'PCRECS\x00\x01'
+_RECORDS_HEADER = struct.Struct('<8sQQ')
+_INDEX_ROW = struct.Struct('<16sQQ')
+
+
+def _write_records(multi_record, fp):
+    fp.write(_RECORDS_HEADER.pack(_RECORDS_MAGIC, 0, 0))
+
+    rec_infos = []
+    for rec in multi_record.records:
+        rows = []
+        for e in rec.getEntries():
+            data = pickle.dumps(e, pickle.HIGHEST_PROTOCOL)
+            rows.append((_build_index_key(e.item_spec), fp.tell(), len(data)))
+            fp.write(data)
+
+        rows.sort()
+        index_offset = fp.tell()
+        for row in rows:
+            fp.write(_INDEX_ROW.pack(*row))
+
+        rec_state = dict(rec.__dict__)
+        del rec_state['_entries']
+        del rec_state['_index']
+        rec_infos.append((rec_state, index_offset, len(rows)))
+
+    toc = dict(multi_record.__dict__)
+    toc['records'] = rec_infos
+    toc_offset = fp.tell()
+    pickle.dump(toc, fp, pickle.HIGHEST_PROTOCOL)
+    toc_size = fp.tell() - toc_offset
+
+    fp.seek(0)
+    fp.write(_RECORDS_HEADER.pack(_RECORDS_MAGIC, toc_offset, toc_size))
+
+
+def _read_records(path):
+    with open(path, 'rb') as fp:
+        if os.name == 'nt':
+            # Windows won't let the baker rotate records files that are
+            # still mapped in memory by some worker, so just read it.
+            buf = fp.read()
+        else:
+            try:
+                buf = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # Empty file.
+                buf = b''
+
+    if len(buf) < _RECORDS_HEADER.size:
+        raise InvalidRecordsFormatError("Records file is truncated.")
+    magic, toc_offset, toc_size = _RECORDS_HEADER.unpack_from(buf, 0)
+    if magic != _RECORDS_MAGIC:
+        raise InvalidRecordsFormatError("Unknown records file format.")
+
+    toc = pickle.loads(buf[toc_offset:toc_offset + toc_size])
+    rec_infos = toc.pop('records')
+
+    multi_record = MultiRecord.__new__(MultiRecord)
+    multi_record.__dict__.update(toc)
+    multi_record.records = []
+    for rec_state, index_offset, count in rec_infos:
+        rec = Record.__new__(Record)
+        rec.__dict__.update(rec_state)
+        rec._entries = {}
+        rec._index = _RecordIndex(buf, index_offset, count)
+        multi_record.records.append(rec)
+    return multi_record
+
+
+class _RecordIndex:
+    """ Finds and un-pickles record entries from a records file on demand.
+    """
+    def __init__(self, buf, index_offset, count):
+        self.count = count
+        self._buf = buf
+        self._index_offset = index_offset
+
+    def getEntry(self, item_spec):
+        key = _build_index_key(item_spec)
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._getRow(mid)[0] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+
+        # Several item specs could, in theory, have the same hash.
+        while lo < self.count:
+            row_key, offset, size = self._getRow(lo)
+            if row_key != key:
+                break
+            entry = pickle.loads(self._buf[offset:offset + size])
+            if entry.item_spec == item_spec:
+                return entry
+            lo += 1
+        return None
+
+    def getAllEntries(self):
+        # Entries were written one after the other, so we can un-pickle
+        # them in their original order.
+        rows = sorted((self._getRow(i) for i in range(self.count)),
+                      key=lambda r: r[1])
+        buf = self._buf
+        return [pickle.loads(buf[offset:offset + size])
+                for _, offset, size in rows]
+
+    def _getRow(self, i):
+        return _INDEX_ROW.unpack_from(
+            self._buf, self._index_offset + i * _INDEX_ROW.size)
 
 
 def get_flag_descriptions(flags, flag_descriptions):
@@ -115,6 +272,7 @@ def _are_records_valid(multi_record):
 
 
 def load_records(path, raise_errors=False):
+    was_invalid = False
     try:
         multi_record = MultiRecord.load(path)
     except FileNotFoundError:
@@ -122,6 +280,13 @@ def load_records(path, raise_errors=False):
             raise
         logger.debug("No existing records found at: %s" % path)
         multi_record = None
+    except InvalidRecordsFormatError:
+        if raise_errors:
+            raise
+        logger.debug("Records from '%s' have an old format." % path)
+        logger.debug("Will use empty records.")
+        multi_record = None
+        was_invalid = True
     except Exception as ex:
         if raise_errors:
             raise
@@ -130,7 +295,6 @@ def load_records(path, raise_errors=False):
         logger.debug("Will use empty records.")
         multi_record = None
 
-    was_invalid = False
     if multi_record is not None and not _are_records_valid(multi_record):
         logger.debug(
             "Records from '%s' have old version: %s/%s." %
@@ -147,6 +311,13 @@ def load_records(path, raise_errors=False):
 
 
 class RecordHistory:
+    """ Pairs up the entries of a previous and current record, by item spec.
+
+        The history can be built several times -- each new call only picks
+        up the entries that were added to the current record since the last
+        time, so pipelines can build it on every pass without re-indexing
+        everything.
+    """
     def __init__(self, previous, current):
         if previous is None or current is None:
             raise ValueError()
@@ -159,6 +330,7 @@ class RecordHistory:
         self._previous = previous
         self._current = current
         self._diffs = None
+        self._current_count = 0
 
     @property
     def name(self):
@@ -179,35 +351,31 @@ class RecordHistory:
         return self._diffs.values()
 
     def getPreviousEntry(self, item_spec):
-        key = _build_diff_key(item_spec)
-        return self._diffs[key][0]
+        return self._diffs[item_spec][0]
 
     def getCurrentEntry(self, item_spec):
-        key = _build_diff_key(item_spec)
-        return self._diffs[key][1]
+        return self._diffs[item_spec][1]
 
     def build(self):
-        if self._diffs is not None:
-            raise Exception("This record history has already been built.")
-
-        self._diffs = {}
-        if self._previous is not None:
+        if self._diffs is None:
+            self._diffs = {}
             for e in self._previous.getEntries():
-                key = _build_diff_key(e.item_spec)
-                self._diffs[key] = (e, None)
-
-        if self._current is not None:
-            for e in self._current.getEntries():
-                key = _build_diff_key(e.item_spec)
-                diff = self._diffs.get(key)
-                if diff is None:
-                    self._diffs[key] = (None, e)
-                elif diff[1] is None:
-                    self._diffs[key] = (diff[0], e)
-                else:
-                    raise Exception(
-                        "A current record entry already exists for '%s' "
-                        "(%s)" % (key, diff[1].item_spec))
+                self._diffs[e.item_spec] = (e, None)
+
+        entries = self._current.getEntries()
+        diffs = self._diffs
+        for e in itertools.islice(entries, self._current_count, None):
+            spec = e.item_spec
+            diff = diffs.get(spec)
+            if diff is None:
+                diffs[spec] = (None, e)
+            elif diff[1] is None:
+                diffs[spec] = (diff[0], e)
+            else:
+                raise Exception(
+                    "A current record entry already exists for '%s'." %
+                    spec)
+        self._current_count = len(entries)
 
     def copy(self):
         return RecordHistory(self._previous, self._current)
@@ -224,6 +392,8 @@ class MultiRecordHistory:
         self.previous = previous
         self.current = current
         self.histories = []
+        self._histories_by_name = {}
+        self._used_paths = {}
         self._linkHistories(previous, current)
 
     def getPreviousRecord(self, record_name, auto_create=True):
@@ -233,18 +403,35 @@ class MultiRecordHistory:
         return self.current.getRecord(record_name)
 
     def getHistory(self, record_name):
-        for h in self.histories:
-            if h.name == record_name:
-                return h
+        rh = self._histories_by_name.get(record_name)
+        if rh is not None:
+            return rh
 
         rh = RecordHistory(
             Record(record_name),
             Record(record_name))
-        self.histories.append(rh)
+        self._addHistory(rh)
         self.previous.records.append(rh.previous)
         self.current.records.append(rh.current)
         return rh
 
+    def addUsedPath(self, record_name, out_path, item_spec):
+        """ Remembers that the given output path is going to be baked by
+            the given entry of the given current record. The first entry
+            to claim an output path keeps it.
+        """
+        self._used_paths.setdefault(out_path, (record_name, item_spec))
+
+    def getUsedPath(self, out_path):
+        """ Returns the record name and item spec of the entry that
+            claimed the given output path, or `None`.
+        """
+        return self._used_paths.get(out_path)
+
+    def _addHistory(self, rh):
+        self.histories.append(rh)
+        self._histories_by_name[rh.name] = rh
+
     def _linkHistories(self, previous, current):
         pairs = {}
         if previous:
@@ -265,9 +452,9 @@ class MultiRecordHistory:
             if c is None:
                 c = Record(name)
                 current.records.append(c)
-            self.histories.append(RecordHistory(p, c))
+            self._addHistory(RecordHistory(p, c))
 
 
-def _build_diff_key(item_spec):
-    return hashlib.md5(item_spec.encode('utf8')).hexdigest()
+def _build_index_key(item_spec):
+    return hashlib.md5(item_spec.encode('utf8')).digest()
 
@@ -0,0 +1,174 @@
+import sys
+import json
+import queue
+import shlex
+import logging
+import threading
+import subprocess
+
+
+logger = logging.getLogger(__name__)
+
+
+class ProcessorBackendError(Exception):
+    pass
+
+
+class SubprocessBackend(object):
+    """ Runs a tool by starting a new process for each file.
+    """
+    def __init__(self, tool_name, bin_path):
+        self.tool_name = tool_name
+        self.bin_path = bin_path
+
+    def run(self, args, capture_stderr=False):
+        """ Runs the tool with the given arguments, and returns its
+            return code and error output. The error output is only
+            captured if `capture_stderr` is `True`. Otherwise, it's
+            just printed.
+        """
+        cmd = [self.bin_path] + args
+        logger.debug("Running %s: %s" % (self.tool_name, cmd))
+        try:
+            if not capture_stderr:
+                return subprocess.call(cmd), None
+
+            proc = subprocess.Popen(cmd, stderr=subprocess.PIPE)
+            _, stderr_data = proc.communicate()
+            return proc.returncode, stderr_data.decode(sys.stderr.encoding)
+        except FileNotFoundError as ex:
+            logger.error("Tried running %s processor with command: %s" %
+                         (self.tool_name, cmd))
+            raise Exception("Error running %s processor. "
+                            "Did you install it?" % self.tool_name) from ex
+
+    def close(self):
+        pass
+
+
+class DaemonBackend(object):
+    """ Runs a tool through a long-lived process that handles one file
+        after another.
+
+        The daemon reads requests from its standard input, one per line.
+        Each request is a JSON array with the same arguments that would
+        be passed to the tool on the command line. The daemon writes one
+        JSON object per request on its standard output, with a
+        `returncode` integer and an optional `stderr` string.
+
+        If the daemon can't be started, or doesn't reply within `timeout`
+        seconds, it's killed and the given fallback backend is used
+        instead.
+    """
+    def __init__(self, tool_name, command, fallback, timeout=60):
+        if isinstance(command, str):
+            command = shlex.split(command)
+        self.tool_name = tool_name
+        self.command = command
+        self.fallback = fallback
+        self.timeout = timeout
+        self._proc = None
+        self._replies = None
+        self._failed = False
+
+    def run(self, args, capture_stderr=False):
+        if not self._failed:
+            try:
+                return self._runDaemon(args, capture_stderr)
+            except (OSError, ValueError, ProcessorBackendError) as ex:
+                logger.warning(
+                    "%s daemon failed, running the tool for each file "
+                    "instead: %s" % (self.tool_name, ex))
+                self._failed = True
+                self.close()
+
+        return self.fallback.run(args, capture_stderr)
+
+    def close(self):
+        proc = self._proc
+        if proc is None:
+            return
+
+        self._proc = None
+        try:
+            proc.stdin.close()
+            proc.wait(timeout=5)
+        except (OSError, subprocess.TimeoutExpired):
+            proc.kill()
+
+    def _runDaemon(self, args, capture_stderr):
+        proc = self._ensureStarted()
+        logger.debug("Sending to %s daemon: %s" % (self.tool_name, args))
+        proc.stdin.write(json.dumps(args) + '\n')
+        proc.stdin.flush()
+
+        # Read the reply through a queue fed by a reader thread, since we
+        # can't wait on a pipe with a timeout on all platforms.
+        try:
+            line = self._replies.get(timeout=self.timeout)
+        except queue.Empty:
+            proc.kill()
+            raise ProcessorBackendError(
+                "The daemon didn't reply after %s seconds." % self.timeout)
+        if not line:
+            raise ProcessorBackendError(
+                "The daemon exited with code: %s" % proc.poll())
+
+        res = json.loads(line)
+        retcode = res.get('returncode', 1)
+        stderr_data = res.get('stderr') or ''
+        if not capture_stderr:
+            if stderr_data:
+                sys.stderr.write(stderr_data)
+            stderr_data = None
+        return retcode, stderr_data
+
+    def _ensureStarted(self):
+        if self._proc is None:
+            logger.debug("Starting %s daemon: %s" %
+                         (self.tool_name, self.command))
+            self._proc = subprocess.Popen(
+                self.command,
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                universal_newlines=True, bufsize=1)
+            self._replies = queue.Queue()
+            reader = threading.Thread(
+                target=_read_daemon_replies,
+                args=(self._proc.stdout, self._replies),
+                name='%s-daemon-reader' % self.tool_name)
+            reader.daemon = True
+            reader.start()
+        return self._proc
+
+
+def _read_daemon_replies(stdout, replies):
+    try:
+        for line in stdout:
+            replies.put(line)
+    except (OSError, ValueError):
+        pass
+    # An empty reply means the daemon exited.
+    replies.put('')
+
+
+def create_backend(tool_name, conf):
+    """ Creates the backend for running a tool, based on the `backend`
+        setting found in its configuration.
+    """
+    subprocess_backend = SubprocessBackend(tool_name, conf['bin'])
+
+    backend = conf.get('backend', 'subprocess')
+    if backend == 'subprocess':
+        return subprocess_backend
+
+    if backend == 'daemon':
+        daemon_bin = conf.get('daemon_bin')
+        if not daemon_bin:
+            raise Exception("The %s processor needs a `daemon_bin` "
+                            "setting to use the daemon backend." %
+                            tool_name)
+        return DaemonBackend(tool_name, daemon_bin, subprocess_backend,
+                             timeout=conf.get('daemon_timeout', 60))
+
+    raise Exception("Unknown backend for the %s processor: %s" %
+                    (tool_name, backend))
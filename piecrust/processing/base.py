@@ -37,6 +37,17 @@ class ProcessorContext:
         return self._pipeline_ctx.is_main_process
 
 
+class ProcessorPostJobRunContext(ProcessorContext):
+    def __init__(self, pipeline, record_history, record_histories):
+        super().__init__(pipeline)
+        self.record_history = record_history
+        self.record_histories = record_histories
+
+    @property
+    def force(self):
+        return self._pipeline_ctx.force
+
+
 class Processor(object):
     PROCESSOR_NAME = None
 
@@ -51,6 +62,9 @@ class Processor(object):
     def onPipelineStart(self, ctx):
         pass
 
+    def onPipelinePostJobRun(self, ctx):
+        pass
+
     def onPipelineEnd(self, ctx):
         pass
 
@@ -2,7 +2,7 @@ import os
 import os.path
 import logging
 import platform
-import subprocess
+from piecrust.processing.backends import create_backend
 from piecrust.processing.base import Processor, SimpleFileProcessor
 
 
@@ -15,6 +15,11 @@ class CleanCssProcessor(Processor):
     def __init__(self):
         super(CleanCssProcessor, self).__init__()
         self._conf = None
+        self._backend = None
+
+    def onPipelineEnd(self, ctx):
+        if self._backend is not None:
+            self._backend.close()
 
     def matches(self, path):
         return path.endswith('.css') and not path.endswith('.min.css')
@@ -31,18 +36,12 @@ class CleanCssProcessor(Processor):
         out_name = self.getOutputFilenames(in_name)[0]
         out_path = os.path.join(out_dir, out_name)
 
-        args = [self._conf['bin'], '-o', out_path]
+        args = ['-o', out_path]
         args += self._conf['options']
         args.append(path)
         logger.debug("Cleaning CSS file: %s" % args)
 
-        try:
-            retcode = subprocess.call(args)
-        except FileNotFoundError as ex:
-            logger.error("Tried running CleanCSS processor with command: %s" %
-                         args)
-            raise Exception("Error running CleanCSS processor. "
-                            "Did you install it?") from ex
+        retcode, _ = self._backend.run(args)
         if retcode != 0:
             raise Exception("Error occured in CleanCSS. Please check "
                             "log messages above for more information.")
@@ -65,6 +64,7 @@ class CleanCssProcessor(Processor):
         if not isinstance(self._conf['options'], list):
             raise Exception("The `cleancss/options` configuration setting "
                             "must be an array of arguments.")
+        self._backend = create_backend('CleanCSS', self._conf)
 
 
 class UglifyJSProcessor(SimpleFileProcessor):
@@ -73,6 +73,11 @@ class UglifyJSProcessor(SimpleFileProcessor):
     def __init__(self):
         super(UglifyJSProcessor, self).__init__({'js': 'js'})
         self._conf = None
+        self._backend = None
+
+    def onPipelineEnd(self, ctx):
+        if self._backend is not None:
+            self._backend.close()
 
     def matches(self, path):
         return path.endswith('.js') and not path.endswith('.min.js')
@@ -80,17 +85,11 @@ class UglifyJSProcessor(SimpleFileProcessor):
     def _doProcess(self, in_path, out_path):
         self._ensureInitialized()
 
-        args = [self._conf['bin'], in_path, '-o', out_path]
+        args = [in_path, '-o', out_path]
         args += self._conf['options']
         logger.debug("Uglifying JS file: %s" % args)
 
-        try:
-            retcode = subprocess.call(args)
-        except FileNotFoundError as ex:
-            logger.error("Tried running UglifyJS processor with command: %s" %
-                         args)
-            raise Exception("Error running UglifyJS processor. "
-                            "Did you install it?") from ex
+        retcode, _ = self._backend.run(args)
         if retcode != 0:
             raise Exception("Error occured in UglifyJS. Please check "
                             "log messages above for more information.")
@@ -110,3 +109,4 @@ class UglifyJSProcessor(SimpleFileProcessor):
         if not isinstance(self._conf['options'], list):
             raise Exception("The `uglify/options` configuration setting "
                             "must be an array of arguments.")
+        self._backend = create_backend('UglifyJS', self._conf)
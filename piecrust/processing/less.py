@@ -1,11 +1,10 @@
 import os
 import os.path
-import sys
 import json
 import hashlib
 import logging
 import platform
-import subprocess
+from piecrust.processing.backends import create_backend
 from piecrust.processing.base import (
     SimpleFileProcessor, ExternalProcessException, FORCE_BUILD)
 
@@ -20,6 +19,7 @@ class LessProcessor(SimpleFileProcessor):
         super(LessProcessor, self).__init__({'less': 'css'})
         self._conf = None
         self._map_dir = None
+        self._backend = None
 
     def onPipelineStart(self, ctx):
         self._map_dir = os.path.join(ctx.tmp_dir, 'less')
@@ -27,6 +27,10 @@ class LessProcessor(SimpleFileProcessor):
                 not os.path.isdir(self._map_dir)):
             os.makedirs(self._map_dir)
 
+    def onPipelineEnd(self, ctx):
+        if self._backend is not None:
+            self._backend.close()
+
     def getDependencies(self, path):
         map_path = self._getMapPath(path)
         try:
@@ -69,25 +73,16 @@ class LessProcessor(SimpleFileProcessor):
             os.path.dirname(in_path),
             os.path.basename(map_path))
 
-        args = [self._conf['bin'],
-                '--source-map=%s' % temp_map_path,
+        args = ['--source-map=%s' % temp_map_path,
                 '--source-map-url=%s' % map_url]
         args += self._conf['options']
         args.append(in_path)
         args.append(out_path)
         logger.debug("Processing LESS file: %s" % args)
 
-        try:
-            proc = subprocess.Popen(args, stderr=subprocess.PIPE)
-            stdout_data, stderr_data = proc.communicate()
-        except FileNotFoundError as ex:
-            logger.error("Tried running LESS processor with command: %s" %
-                         args)
-            raise Exception("Error running LESS processor. "
-                            "Did you install it?") from ex
-        if proc.returncode != 0:
-            raise ExternalProcessException(
-                stderr_data.decode(sys.stderr.encoding))
+        retcode, stderr_data = self._backend.run(args, capture_stderr=True)
+        if retcode != 0:
+            raise ExternalProcessException(stderr_data)
 
         logger.debug("Moving map file: %s -> %s" % (temp_map_path, map_path))
         if os.path.exists(map_path):
@@ -110,6 +105,7 @@ class LessProcessor(SimpleFileProcessor):
         if not isinstance(self._conf['options'], list):
             raise Exception("The `less/options` configuration setting "
                             "must be an array of arguments.")
+        self._backend = create_backend('LESS', self._conf)
 
     def _getMapPath(self, path):
         map_name = "%s_%s.map" % (
@@ -4,7 +4,7 @@ import json
 import hashlib
 import logging
 import platform
-import subprocess
+from piecrust.processing.backends import create_backend
 from piecrust.processing.base import SimpleFileProcessor, FORCE_BUILD
 
 
@@ -19,6 +19,8 @@ class SassProcessor(SimpleFileProcessor):
             extensions={'scss': 'css', 'sass': 'css'})
         self._conf = None
         self._map_dir = None
+        self._backend = None
+        self._libsass = None
 
     def initialize(self, app):
         super(SassProcessor, self).initialize(app)
@@ -56,18 +58,25 @@ class SassProcessor(SimpleFileProcessor):
         deps = list(map(_clean_scheme, sources))
         return deps
 
+    def onPipelineEnd(self, ctx):
+        super(SassProcessor, self).onPipelineEnd(ctx)
+        if self._backend is not None:
+            self._backend.close()
+
     def _doProcess(self, in_path, out_path):
         self._ensureInitialized()
 
         if _is_include_only(in_path):
             raise Exception("Include only Sass files should be ignored!")
 
+        if self._libsass is not None:
+            return self._doProcessWithLibSass(in_path, out_path)
+
         sourcemap = 'none'
         if self.app.cache.enabled:
             sourcemap = 'file'
 
-        args = [self._conf['bin'],
-                '--sourcemap=%s' % sourcemap,
+        args = ['--sourcemap=%s' % sourcemap,
                 '--style', self._conf['style']]
 
         cache_dir = self._conf['cache_dir']
@@ -83,13 +92,7 @@ class SassProcessor(SimpleFileProcessor):
         args += [in_path, out_path]
         logger.debug("Processing Sass file: %s" % args)
 
-        try:
-            retcode = subprocess.call(args)
-        except FileNotFoundError as ex:
-            logger.error("Tried running Sass processor with command: %s" %
-                         args)
-            raise Exception("Error running Sass processor. "
-                            "Did you install it?") from ex
+        retcode, _ = self._backend.run(args)
 
         # The sourcemap is generated next to the CSS file... there doesn't
         # seem to be any option to override that, sadly... so we need to move
@@ -107,6 +110,44 @@ class SassProcessor(SimpleFileProcessor):
 
         return True
 
+    def _doProcessWithLibSass(self, in_path, out_path):
+        logger.debug("Processing Sass file with libsass: %s" % in_path)
+        kwargs = {
+            'filename': in_path,
+            'output_style': self._conf['style'],
+            'include_paths': self._conf['load_paths']}
+        map_path = None
+        if self.app.cache.enabled:
+            map_path = self._getMapPath(in_path)
+            kwargs.update({
+                'source_map_filename': map_path,
+                'output_filename_hint': out_path})
+
+        try:
+            res = self._libsass.compile(**kwargs)
+        except self._libsass.CompileError as ex:
+            raise Exception("Error occured in Sass compiler: %s" %
+                            ex) from ex
+
+        css = res
+        if map_path is not None:
+            css, src_map = res
+
+            # Make the dependencies absolute, like they are with the `scss`
+            # command line tool.
+            dep_map = json.loads(src_map)
+            map_dir = os.path.dirname(map_path)
+            dep_map['sources'] = [
+                os.path.normpath(os.path.join(map_dir, _clean_scheme(p)))
+                for p in dep_map.get('sources', [])]
+            with open(map_path, 'w') as f:
+                json.dump(dep_map, f)
+
+        with open(out_path, 'w', encoding='utf8') as f:
+            f.write(css)
+
+        return True
+
     def _ensureInitialized(self):
         if self._conf is not None:
             return
@@ -137,6 +178,18 @@ class SassProcessor(SimpleFileProcessor):
             cache_dir = os.path.join(self.app.cache_dir, 'sass')
         self._conf.setdefault('cache_dir', cache_dir)
 
+        # See if we can compile Sass files in-process.
+        if self._conf.get('backend') == 'libsass':
+            try:
+                import sass
+                self._libsass = sass
+                return
+            except ImportError:
+                logger.warning("Can't find the `libsass` package, running "
+                               "the `%s` tool instead." % self._conf['bin'])
+                self._conf['backend'] = 'subprocess'
+        self._backend = create_backend('Sass', self._conf)
+
     def _getMapPath(self, path):
         map_name = "%s_%s.map" % (
             os.path.basename(path),
@@ -1,19 +1,24 @@
 import os
 import os.path
+import json
 import time
+import hashlib
 import logging
+import itertools
+from xml.sax.saxutils import escape
 import yaml
-from piecrust.dataproviders.pageiterator import PageIterator
+from piecrust.chefutil import format_timed
+from piecrust.pipelines._pagerecords import PagePipelineRecordEntry
+from piecrust.pipelines.base import get_record_name_for_source
 from piecrust.processing.base import SimpleFileProcessor
 
 
 logger = logging.getLogger(__name__)
 
 
-SITEMAP_HEADER = \
-"""<?xml version="1.0" encoding="utf-8"?>
-<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
-"""
+SITEMAP_HEADER = (
+    '<?xml version="1.0" encoding="utf-8"?>\n'
+    '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n')
 SITEMAP_FOOTER = "</urlset>\n"
 
 SITEURL_HEADER =     "  <url>\n"  # NOQA: E222
@@ -23,52 +28,69 @@ SITEURL_CHANGEFREQ = "    <changefreq>%s</changefreq>\n"  # NOQA: E222
 SITEURL_PRIORITY =   "    <priority>%0.1f</priority>\n"  # NOQA: E222
 SITEURL_FOOTER =     "  </url>\n"  # NOQA: E222
 
+SITEMAP_INDEX_HEADER = (
+    '<?xml version="1.0" encoding="utf-8"?>\n'
+    '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n')
+SITEMAP_INDEX_FOOTER = "</sitemapindex>\n"
+
+SITEMAPREF_HEADER =  "  <sitemap>\n"  # NOQA: E222
+SITEMAPREF_FOOTER =  "  </sitemap>\n"  # NOQA: E222
+
+# The maximum number of URLs in one sitemap file, as per the specification.
+MAX_URLS_PER_FILE = 50000
+
 
 class SitemapProcessor(SimpleFileProcessor):
     PROCESSOR_NAME = 'sitemap'
 
     def __init__(self):
         super(SitemapProcessor, self).__init__({'sitemap': 'xml'})
-        self._start_time = None
-
-    def onPipelineStart(self, ctx):
-        self._start_time = time.time()
 
     def _doProcess(self, in_path, out_path):
-        with open(in_path, 'r') as fp:
-            sitemap = yaml.load(fp)
+        # The sitemap can only be written once we know about all the pages
+        # that were baked, so this happens at the end of the bake, in
+        # `onPipelinePostJobRun`. We just validate the file here.
+        _load_sitemap(in_path)
+        return False
 
-        try:
-            with open(out_path, 'w') as fp:
-                fp.write(SITEMAP_HEADER)
-                self._writeManualLocs(sitemap, fp)
-                self._writeAutoLocs(sitemap, fp)
-                fp.write(SITEMAP_FOOTER)
-        except:
-            # If an exception occurs, delete the output file otherwise
-            # the pipeline will think the output was correctly produced.
-            if os.path.isfile(out_path):
-                logger.debug("Error occured, removing output sitemap.")
-                os.unlink(out_path)
-            raise
-
-        return True
-
-    def _writeManualLocs(self, sitemap, fp):
-        locs = sitemap.setdefault('locations', None)
-        if not locs:
-            return
+    def onPipelinePostJobRun(self, ctx):
+        record = ctx.record_history.current
+        for entry in record.getEntries():
+            if entry.errors or not _is_sitemap_entry(entry):
+                continue
+
+            out_path = entry.out_paths[0]
+            try:
+                start_time = time.perf_counter()
+                sitemap = _load_sitemap(entry.item_spec)
+                writer = SitemapWriter(
+                    out_path, _get_manifest_path(ctx.tmp_dir, out_path),
+                    self.app.config.get('site/root'),
+                    urls_per_file=sitemap.get('urls_per_file',
+                                              MAX_URLS_PER_FILE),
+                    force=ctx.force)
+                num_written = writer.write(
+                    self._getLocations(sitemap, ctx.record_histories))
+                logger.debug(format_timed(
+                    start_time, "wrote %d file(s) for sitemap: %s" %
+                    (num_written, out_path), colored=False))
+            except Exception as ex:
+                logger.error("Error generating sitemap '%s': %s" %
+                             (entry.item_spec, ex))
+                entry.errors.append(str(ex))
+                record.success = False
+                ctx.record_histories.current.success = False
 
-        logger.debug("Generating manual sitemap entries.")
-        for loc in locs:
-            self._writeEntry(loc, fp)
+    def _getLocations(self, sitemap, record_histories):
+        locs = sitemap.get('locations')
+        if locs:
+            logger.debug("Generating manual sitemap entries.")
+            yield from locs
 
-    def _writeAutoLocs(self, sitemap, fp):
-        source_names = sitemap.setdefault('autogen', None)
+        source_names = sitemap.get('autogen')
         if not source_names:
             return
 
-        cur_time = strftime_iso8601(time.time())
         for name in source_names:
             logger.debug("Generating automatic sitemap entries for '%s'." %
                          name)
@@ -76,29 +98,217 @@ class SitemapProcessor(SimpleFileProcessor):
             if source is None:
                 raise Exception("No such source: %s" % name)
 
-            it = PageIterator(source)
-            for page in it:
-                uri = page['url']
-                sm_cfg = page.get('sitemap')
+            # Get the URLs from the bake records if we can, instead of
+            # loading all the pages again.
+            record = _find_page_record(record_histories, source)
+            if record is not None:
+                locs = _get_record_locations(record)
+            else:
+                locs = _get_source_locations(source)
+
+            # Sort the entries so they always end up in the same file.
+            yield from sorted(locs, key=lambda loc: loc['url'])
+
+
+class SitemapWriter:
+    """ Writes a sitemap, split into several files referenced by a sitemap
+        index file when there are too many URLs for just one file.
 
-                args = {'url': uri, 'lastmod': cur_time}
-                if sm_cfg:
-                    args.update(sm_cfg)
+        Only one file's worth of entries is held in memory at a time, and
+        files whose contents didn't change since last time are not written
+        again. This is tracked in a manifest file, which is also used to
+        delete files that aren't needed anymore.
+    """
+    def __init__(self, out_path, manifest_path, root_url, *,
+                 urls_per_file=MAX_URLS_PER_FILE, force=False):
+        self.out_path = out_path
+        self.manifest_path = manifest_path
+        self.root_url = root_url.rstrip('/') + '/'
+        self.urls_per_file = max(1, min(urls_per_file, MAX_URLS_PER_FILE))
+        self.force = force
+        self._prev_digests = {}
+        self._digests = {}
+        self._num_written = 0
 
-                self._writeEntry(args, fp)
+    def write(self, locations):
+        """ Writes the sitemap for the given locations, and returns how
+            many files were actually written.
+        """
+        self._prev_digests = self._loadManifest()
+        self._digests = {}
+        self._num_written = 0
 
-    def _writeEntry(self, args, fp):
-        fp.write(SITEURL_HEADER)
-        fp.write(SITEURL_LOC % args['url'])
-        if 'lastmod' in args:
-            fp.write(SITEURL_LASTMOD % args['lastmod'])
-        if 'changefreq' in args:
-            fp.write(SITEURL_CHANGEFREQ % args['changefreq'])
-        if 'priority' in args:
-            fp.write(SITEURL_PRIORITY % args['priority'])
-        fp.write(SITEURL_FOOTER)
+        chunks = self._iterChunks(locations)
+        first = next(chunks, None) or ([], None)
+        second = next(chunks, None)
+        if second is None:
+            # Everything fits in one file.
+            self._writeFile(
+                self.out_path,
+                itertools.chain([SITEMAP_HEADER], first[0],
+                                [SITEMAP_FOOTER]))
+        else:
+            base, ext = os.path.splitext(self.out_path)
+            out_dir = os.path.dirname(self.out_path)
+            index_lines = [SITEMAP_INDEX_HEADER]
+            all_chunks = itertools.chain([first, second], chunks)
+            for i, (lines, lastmod) in enumerate(all_chunks):
+                path = '%s-%d%s' % (base, i + 1, ext)
+                self._writeFile(
+                    path,
+                    itertools.chain([SITEMAP_HEADER], lines,
+                                    [SITEMAP_FOOTER]))
+
+                url = self.root_url + os.path.relpath(path, out_dir)
+                index_lines.append(SITEMAPREF_HEADER)
+                index_lines.append(SITEURL_LOC % escape(url))
+                if lastmod:
+                    index_lines.append(SITEURL_LASTMOD % lastmod)
+                index_lines.append(SITEMAPREF_FOOTER)
+            index_lines.append(SITEMAP_INDEX_FOOTER)
+            self._writeFile(self.out_path, index_lines)
+
+        for path in self._prev_digests:
+            if path not in self._digests:
+                logger.debug("Removing stale sitemap file: %s" % path)
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+        self._saveManifest()
+        return self._num_written
+
+    def _iterChunks(self, locations):
+        lines = []
+        lastmod = None
+        count = 0
+        for loc in locations:
+            _write_entry(loc, lines)
+            loc_lastmod = loc.get('lastmod')
+            if loc_lastmod and (lastmod is None or
+                                str(loc_lastmod) > lastmod):
+                lastmod = str(loc_lastmod)
+
+            count += 1
+            if count >= self.urls_per_file:
+                yield lines, lastmod
+                lines = []
+                lastmod = None
+                count = 0
+        if count > 0:
+            yield lines, lastmod
+
+    def _writeFile(self, path, lines):
+        lines = list(lines)
+        hasher = hashlib.sha1()
+        for line in lines:
+            hasher.update(line.encode('utf8'))
+        digest = hasher.hexdigest()
+        self._digests[path] = digest
+
+        if (self._prev_digests.get(path) == digest and
+                os.path.isfile(path)):
+            return
+
+        logger.debug("Writing sitemap file: %s" % path)
+        tmp_path = '%s.%d.tmp' % (path, os.getpid())
+        with open(tmp_path, 'w', encoding='utf8') as fp:
+            fp.writelines(lines)
+        os.replace(tmp_path, path)
+        self._num_written += 1
+
+    def _loadManifest(self):
+        if self.force:
+            return {}
+        try:
+            with open(self.manifest_path, 'r', encoding='utf8') as fp:
+                return json.load(fp)
+        except (OSError, ValueError):
+            return {}
+
+    def _saveManifest(self):
+        manifest_dir = os.path.dirname(self.manifest_path)
+        os.makedirs(manifest_dir, 0o755, exist_ok=True)
+        with open(self.manifest_path, 'w', encoding='utf8') as fp:
+            json.dump(self._digests, fp)
+
+
+def _load_sitemap(path):
+    with open(path, 'r') as fp:
+        sitemap = yaml.load(fp)
+    if sitemap is None:
+        return {}
+    if not isinstance(sitemap, dict):
+        raise Exception("Sitemap file should contain a mapping: %s" % path)
+    return sitemap
+
+
+def _is_sitemap_entry(entry):
+    # Only handle sitemaps that are just copied to the output directory
+    # without being processed any further.
+    tree = entry.proc_tree
+    return (tree is not None and
+            tree[0] == SitemapProcessor.PROCESSOR_NAME and
+            all([c[0] == 'copy' and not c[1] for c in tree[1]]) and
+            len(entry.out_paths) == 1)
+
+
+def _get_manifest_path(tmp_dir, out_path):
+    key = hashlib.md5(out_path.encode('utf8')).hexdigest()
+    return os.path.join(tmp_dir, 'sitemap', '%s.json' % key)
+
+
+def _find_page_record(record_histories, source):
+    record_name = get_record_name_for_source(source)
+    for records in [record_histories.current, record_histories.previous]:
+        for rec in records.records:
+            if rec.name == record_name:
+                return rec
+    return None
+
+
+def _get_record_locations(record):
+    for entry in record.getEntries():
+        if (not entry.subs or
+                entry.hasFlag(PagePipelineRecordEntry.FLAG_IS_DRAFT) or
+                entry.hasFlag(PagePipelineRecordEntry.FLAG_OVERRIDEN)):
+            continue
+
+        loc = {'url': entry.subs[0]['out_uri']}
+        if entry.timestamp is not None:
+            loc['lastmod'] = strftime_iso8601(entry.timestamp)
+        sm_cfg = entry.config.get('sitemap') if entry.config else None
+        if sm_cfg:
+            loc.update(sm_cfg)
+        yield loc
+
+
+def _get_source_locations(source):
+    draft_setting = source.app.config['baker/no_bake_setting']
+    for page in source.getAllPages():
+        if page.config.get(draft_setting):
+            continue
+
+        loc = {'url': page.getUri(),
+               'lastmod': strftime_iso8601(page.datetime.timestamp())}
+        sm_cfg = page.config.get('sitemap')
+        if sm_cfg:
+            loc.update(sm_cfg)
+        yield loc
+
+
+def _write_entry(args, lines):
+    lines.append(SITEURL_HEADER)
+    lines.append(SITEURL_LOC % escape(args['url']))
+    if 'lastmod' in args:
+        lines.append(SITEURL_LASTMOD % args['lastmod'])
+    if 'changefreq' in args:
+        lines.append(SITEURL_CHANGEFREQ % args['changefreq'])
+    if 'priority' in args:
+        lines.append(SITEURL_PRIORITY % args['priority'])
+    lines.append(SITEURL_FOOTER)
 
 
 def strftime_iso8601(t):
     return time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(t))
-
@@ -1,12 +1,24 @@
 import os
 import os.path
+import json
+import queue
+import hashlib
 import logging
+import posixpath
+import threading
+from piecrust.baking.precompress import (
+    PRECOMPRESS_ENCODINGS, get_precompress_encodings, get_precompressed_path,
+    is_precompressable_path)
 from piecrust.publishing.base import Publisher, PublisherConfigurationError
 
 
 logger = logging.getLogger(__name__)
 
 
+DEFAULT_CONNECTIONS = 4
+MANIFEST_VERSION = 1
+
+
 class SftpPublisher(Publisher):
     PUBLISHER_NAME = 'sftp'
     PUBLISHER_SCHEME = 'sftp'
@@ -41,6 +53,8 @@ class SftpPublisher(Publisher):
         username = self.config.get('username', remote.username)
         path = self.config.get('path', path)
         pkey_path = self.config.get('key')
+        connections = max(
+            1, int(self.config.get('connections', DEFAULT_CONNECTIONS)))
 
         password = None
         if username and not ctx.preview:
@@ -50,30 +64,51 @@ class SftpPublisher(Publisher):
         if ctx.preview:
             logger.info("Would connect to %s:%s..." % (hostname, port))
             self._previewUpload(ctx, path)
-            return
+            return True
 
         import paramiko
 
-        logger.debug("Connecting to %s:%s..." % (hostname, port))
-        lfk = (not username and not pkey_path)
-        sshc = paramiko.SSHClient()
-        sshc.load_system_host_keys()
-        sshc.set_missing_host_key_policy(paramiko.WarningPolicy())
-        sshc.connect(
-            hostname, port=port,
-            username=username, password=password,
-            key_filename=pkey_path,
-            look_for_keys=lfk)
+        def _connect():
+            logger.debug("Connecting to %s:%s..." % (hostname, port))
+            lfk = (not username and not pkey_path)
+            sshc = paramiko.SSHClient()
+            sshc.load_system_host_keys()
+            sshc.set_missing_host_key_policy(paramiko.WarningPolicy())
+            sshc.connect(
+                hostname, port=port,
+                username=username, password=password,
+                key_filename=pkey_path,
+                look_for_keys=lfk)
+            return sshc
+
+        sessions = []
+        clients = []
         try:
+            sessions.append(_connect())
             logger.info("Connected as %s" %
-                        sshc.get_transport().get_username())
-            client = sshc.open_sftp()
-            try:
-                self._upload(sshc, client, ctx, path)
-            finally:
-                client.close()
+                        sessions[0].get_transport().get_username())
+
+            dest_dir = path
+            if dest_dir and dest_dir.startswith('~/'):
+                _, out_chan, _ = sessions[0].exec_command("echo $HOME")
+                home_dir = out_chan.read().decode('utf8').strip()
+                dest_dir = home_dir + dest_dir[1:]
+
+            # Open the other connections, for uploading files in parallel.
+            for _ in range(connections - 1):
+                sessions.append(_connect())
+            for s in sessions:
+                clients.append(s.open_sftp())
+
+            remote_id = '%s@%s:%s/%s' % (
+                sessions[0].get_transport().get_username(),
+                hostname, port, dest_dir)
+            return self._upload(clients, ctx, dest_dir, remote_id)
         finally:
-            sshc.close()
+            for c in clients:
+                c.close()
+            for s in sessions:
+                s.close()
 
     def _previewUpload(self, ctx, dest_dir):
         if not ctx.args.force:
@@ -81,76 +116,296 @@ class SftpPublisher(Publisher):
         else:
             logger.info("Would upload entire website...")
 
-    def _upload(self, session, client, ctx, dest_dir):
+    def _upload(self, clients, ctx, dest_dir, remote_id):
         if dest_dir:
-            if dest_dir.startswith('~/'):
-                _, out_chan, _ = session.exec_command("echo $HOME")
-                home_dir = out_chan.read().decode('utf8').strip()
-                dest_dir = home_dir + dest_dir[1:]
             logger.debug("CHDIR %s" % dest_dir)
             try:
-                client.chdir(dest_dir)
+                clients[0].chdir(dest_dir)
             except IOError:
-                client.mkdir(dest_dir)
-                client.chdir(dest_dir)
+                clients[0].mkdir(dest_dir)
+                clients[0].chdir(dest_dir)
+            for c in clients[1:]:
+                c.chdir(dest_dir)
 
-        known_dirs = {}
+        to_upload = []
+        to_delete = []
+        stale_variants = []
         if ctx.was_baked and not ctx.args.force:
-            to_upload = list(self.getBakedFiles(ctx))
-            to_delete = list(self.getDeletedFiles(ctx))
-            if to_upload or to_delete:
-                logger.info("Uploading new/changed files...")
-                for path in self.getBakedFiles(ctx):
-                    rel_path = os.path.relpath(path, ctx.bake_out_dir)
-                    logger.info(rel_path)
-                    if not ctx.preview:
-                        self._putFile(client, path, rel_path, known_dirs)
-                logger.info("Deleting removed files...")
-                for path in self.getDeletedFiles(ctx):
-                    rel_path = os.path.relpath(path, ctx.bake_out_dir)
-                    logger.info("%s [DELETE]" % rel_path)
-                    if not ctx.preview:
-                        try:
-                            client.remove(rel_path)
-                        except OSError:
-                            pass
-            else:
+            for path in self.getBakedFiles(ctx):
+                if os.path.isfile(path):
+                    to_upload.append(path)
+                for var_path in _get_precompressed_paths(path):
+                    if os.path.isfile(var_path):
+                        to_upload.append(var_path)
+                    else:
+                        stale_variants.append(var_path)
+            for path in self.getDeletedFiles(ctx):
+                # The bake already removed any local precompressed
+                # versions, so look for them remotely.
+                to_delete.append(path)
+                stale_variants += _get_precompressed_paths(path)
+            if not to_upload and not to_delete and not stale_variants:
                 logger.info(
                     "Nothing to upload or delete on the remote server.")
                 logger.info(
                     "If you want to force uploading the entire website, "
                     "use the `--force` flag.")
+                return True
+            logger.info("Uploading new/changed files...")
         else:
             logger.info("Uploading entire website...")
             for dirpath, dirnames, filenames in os.walk(ctx.bake_out_dir):
                 for f in filenames:
-                    abs_f = os.path.join(dirpath, f)
-                    rel_f = os.path.relpath(abs_f, ctx.bake_out_dir)
-                    logger.info(rel_f)
-                    if not ctx.preview:
-                        self._putFile(client, abs_f, rel_f, known_dirs)
-
-    def _putFile(self, client, local_path, remote_path, known_dirs):
-        # Split the remote path in bits.
-        remote_path = os.path.normpath(remote_path)
-        if os.sep != '/':
-            remote_path = remote_path.sub(os.sep, '/')
-
-        # Make sure each directory in the remote path exists... to prevent
-        # testing the same directories several times, we keep a cache of
-        # `known_dirs` which we know exist.
-        remote_bits = remote_path.split('/')
-        cur = ''
-        for b in remote_bits[:-1]:
-            cur = os.path.join(cur, b)
-            if cur not in known_dirs:
+                    to_upload.append(os.path.join(dirpath, f))
+
+        manifest_path = self._getManifestPath()
+        manifest = _UploadManifest(
+            manifest_path, remote_id,
+            enabled=(manifest_path is not None and
+                     self.config.get('manifest', True)))
+        manifest.load()
+
+        uploader = _ParallelUploader(clients, manifest)
+        success = uploader.upload(
+            [(p, _get_remote_path(p, ctx.bake_out_dir)) for p in to_upload])
+        logger.info("Uploaded %d file(s), skipped %d identical file(s)." %
+                    (uploader.num_uploaded, uploader.num_skipped))
+
+        # Don't leave old precompressed versions of the outputs on the
+        # remote server, e.g. when an output got too small to be worth
+        # compressing. Most sites don't precompress anything though, so
+        # only remove the ones we know are there. Without a manifest, we
+        # have to guess when precompression is enabled.
+        guess_variants = (not manifest.digests and
+                          bool(get_precompress_encodings(self.app)))
+        for path in stale_variants:
+            rel_path = _get_remote_path(path, ctx.bake_out_dir)
+            if (manifest.get(rel_path) is not None or
+                    uploader.hasRemoteFile(rel_path) or guess_variants):
+                to_delete.append(path)
+
+        if to_delete:
+            logger.info("Deleting removed files...")
+            for path in to_delete:
+                rel_path = _get_remote_path(path, ctx.bake_out_dir)
+                manifest.remove(rel_path)
                 try:
-                    client.stat(cur)
+                    clients[0].remove(rel_path)
                 except FileNotFoundError:
-                    logger.debug("Creating remote dir: %s" % cur)
-                    client.mkdir(cur)
-                known_dirs[cur] = True
+                    continue
+                except OSError as ex:
+                    logger.error("Error deleting '%s': %s" % (rel_path, ex))
+                    success = False
+                    continue
+                logger.info("%s [DELETE]" % rel_path)
+
+        manifest.save()
+        return success
+
+    def _getManifestPath(self):
+        # Keep the manifest in the cache, where it won't get uploaded.
+        # Losing it only means we compare modification times instead.
+        cache = self.app.cache
+        if not cache.enabled:
+            return None
+        return cache.getCache('publish').getCachePath(
+            '%s.sftp-manifest.json' % self.target)
+
+
+class _UploadManifest:
+    """ The digests of the files we uploaded to a remote server, so that
+        we don't upload them again if they didn't change.
+    """
+    def __init__(self, path, remote_id, enabled=True):
+        self.path = path
+        self.remote_id = remote_id
+        self.enabled = enabled
+        self.digests = {}
+        self._lock = threading.Lock()
+
+    def load(self):
+        if not self.enabled:
+            return
+        try:
+            with open(self.path, 'r', encoding='utf8') as fp:
+                data = json.load(fp)
+        except (OSError, ValueError):
+            return
+        if (data.get('version') == MANIFEST_VERSION and
+                data.get('remote') == self.remote_id):
+            self.digests = data.get('files', {})
+        else:
+            logger.debug("Ignoring upload manifest for another remote: %s" %
+                         self.path)
+
+    def save(self):
+        if not self.enabled:
+            return
+        data = {
+            'version': MANIFEST_VERSION,
+            'remote': self.remote_id,
+            'files': self.digests}
+        tmp_path = '%s.%d.tmp' % (self.path, os.getpid())
+        with open(tmp_path, 'w', encoding='utf8') as fp:
+            json.dump(data, fp)
+        os.replace(tmp_path, self.path)
+
+    def get(self, rel_path):
+        with self._lock:
+            return self.digests.get(rel_path)
+
+    def set(self, rel_path, digest):
+        with self._lock:
+            self.digests[rel_path] = digest
+
+    def remove(self, rel_path):
+        with self._lock:
+            self.digests.pop(rel_path, None)
+
+
+class _ParallelUploader:
+    """ Uploads files over several SFTP clients at the same time.
+
+        Remote directories are listed and created beforehand with the
+        first client, so we know what directories exist, and the size and
+        modification time of the files already in them. Files whose
+        remote size matches, and whose digest is the same as in the
+        upload manifest, are skipped. Files that aren't in the manifest
+        are skipped if their remote modification time matches too.
+    """
+    def __init__(self, clients, manifest):
+        self.clients = clients
+        self.manifest = manifest
+        self.num_uploaded = 0
+        self.num_skipped = 0
+        self._remote_stats = {}
+        self._lock = threading.Lock()
+        self._success = True
+
+    def upload(self, files):
+        if not files:
+            return True
+
+        self._prepareRemoteDirs([rel for _, rel in files])
+
+        q = queue.Queue()
+        for f in files:
+            q.put(f)
+
+        threads = [
+            threading.Thread(name='SftpUploader-%d' % i,
+                             daemon=True,
+                             target=self._run,
+                             args=(c, q))
+            for i, c in enumerate(self.clients[:len(files)])]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return self._success
+
+    def hasRemoteFile(self, rel_path):
+        """ Returns whether the given file was found in the remote
+            directories listed before uploading.
+        """
+        return rel_path in self._remote_stats
+
+    def _prepareRemoteDirs(self, rel_paths):
+        dirs = set()
+        for rel in rel_paths:
+            d = posixpath.dirname(rel)
+            while d and d not in dirs:
+                dirs.add(d)
+                d = posixpath.dirname(d)
+
+        # Sorting makes parent directories come first.
+        client = self.clients[0]
+        created_dirs = set()
+        for d in [''] + sorted(dirs):
+            if posixpath.dirname(d) in created_dirs:
+                # The parent was just created, so this one can't exist.
+                logger.debug("Creating remote dir: %s" % d)
+                client.mkdir(d)
+                created_dirs.add(d)
+                continue
+
+            try:
+                attrs = client.listdir_attr(d or '.')
+            except FileNotFoundError:
+                logger.debug("Creating remote dir: %s" % d)
+                client.mkdir(d)
+                created_dirs.add(d)
+                continue
+
+            for a in attrs:
+                self._remote_stats[posixpath.join(d, a.filename)] = (
+                    a.st_size, a.st_mtime)
+
+    def _run(self, client, q):
+        num_uploaded = 0
+        num_skipped = 0
+        while True:
+            try:
+                local_path, rel_path = q.get_nowait()
+            except queue.Empty:
+                break
+
+            try:
+                digest = _get_file_digest(local_path)
+                st = os.stat(local_path)
+                if self._isIdentical(rel_path, digest, st):
+                    logger.debug("%s [IDENTICAL]" % rel_path)
+                    self.manifest.set(rel_path, digest)
+                    num_skipped += 1
+                    continue
+
+                logger.info(rel_path)
+                self.manifest.remove(rel_path)
+                client.put(local_path, rel_path, confirm=False)
+                # Give the remote file the same modification time, so we
+                # can recognize it even without a manifest.
+                client.utime(rel_path, (int(st.st_atime), int(st.st_mtime)))
+                self.manifest.set(rel_path, digest)
+                num_uploaded += 1
+            except Exception as ex:
+                logger.error("Error uploading '%s': %s" % (rel_path, ex))
+                self._success = False
+
+        with self._lock:
+            self.num_uploaded += num_uploaded
+            self.num_skipped += num_skipped
+
+    def _isIdentical(self, rel_path, digest, st):
+        remote_stat = self._remote_stats.get(rel_path)
+        if remote_stat is None or remote_stat[0] != st.st_size:
+            return False
+        prev_digest = self.manifest.get(rel_path)
+        if prev_digest is not None:
+            return prev_digest == digest
+        # We don't know what we uploaded last time (if anything), so
+        # compare modification times, like `rsync` does by default.
+        return remote_stat[1] == int(st.st_mtime)
+
+
+def _get_precompressed_paths(path):
+    # Bake records don't know about the precompressed versions of the
+    # outputs, so we need to figure out where they would be.
+    if not is_precompressable_path(path):
+        return []
+    return [get_precompressed_path(path, e) for e in PRECOMPRESS_ENCODINGS]
+
+
+def _get_remote_path(path, out_dir):
+    rel_path = os.path.relpath(path, out_dir)
+    return rel_path.replace(os.sep, '/')
 
-        # Should be all good! Upload the file.
-        client.put(local_path, remote_path)
 
+def _get_file_digest(path):
+    hasher = hashlib.sha1()
+    with open(path, 'rb') as fp:
+        while True:
+            chunk = fp.read(65536)
+            if not chunk:
+                break
+            hasher.update(chunk)
+    return hasher.hexdigest()
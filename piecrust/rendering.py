@@ -1,5 +1,9 @@
 import re
+import copy
+import os
 import os.path
+import time
+import hashlib
 import logging
 from piecrust.data.builder import (
     DataBuildingContext, build_page_data, add_layout_data)
@@ -10,6 +14,13 @@ from piecrust.sources.base import AbortedSourceUseError
 logger = logging.getLogger(__name__)
 
 
+# Formatted texts that weren't used in that many seconds are removed from
+# the cache, since they're most probably for old versions of the texts.
+FORMAT_CACHE_MAX_AGE = 7 * 24 * 60 * 60
+# How often to look for those old formatted texts.
+FORMAT_CACHE_PRUNE_INTERVAL = 24 * 60 * 60
+
+
 content_abstract_re = re.compile(r'^<!--\s*(more|(page)?break)\s*-->\s*$',
                                  re.MULTILINE)
 
@@ -26,6 +37,8 @@ class RenderedSegments(object):
     def __init__(self, segments, used_templating=False):
         self.segments = segments
         self.used_templating = used_templating
+        self.used_source_items = None
+        self.used_templates = None
 
 
 class RenderedLayout(object):
@@ -53,6 +66,8 @@ def create_render_info():
     """
     return {
         'used_source_names': {'segments': [], 'layout': []},
+        'used_source_items': {'segments': {}, 'layout': {}},
+        'used_templates': {'segments': [], 'layout': []},
         'used_pagination': False,
         'pagination_has_items': False,
         'pagination_has_more': False,
@@ -70,6 +85,8 @@ class RenderingContext(object):
         self.render_info = create_render_info()
         self.custom_data = {}
         self._current_used_source_names = None
+        self._current_used_source_items = None
+        self._current_pass = None
 
     @property
     def app(self):
@@ -84,11 +101,15 @@ class RenderingContext(object):
             raise Exception("No render pass specified.")
 
     def setRenderPass(self, name):
+        self._current_pass = name
         if name is not None:
             self._current_used_source_names = \
                 self.render_info['used_source_names'][name]
+            self._current_used_source_items = \
+                self.render_info['used_source_items'][name]
         else:
             self._current_used_source_names = None
+            self._current_used_source_items = None
 
     def setPagination(self, paginator):
         ri = self.render_info
@@ -98,12 +119,73 @@ class RenderingContext(object):
         ri['used_pagination'] = True
         ri['pagination_has_items'] = paginator.has_items
         ri['pagination_has_more'] = paginator.has_more
-        self.addUsedSource(paginator._source)
-
-    def addUsedSource(self, source):
+        self.addUsedSource(paginator._source,
+                           paginator._iterator._getConsumedItemSpecs())
+
+    def addUsedSource(self, source, item_specs=None):
+        """ Records that the current render pass used the given source.
+            If `item_specs` is given, only those items from the source
+            were used. Otherwise, the page depends on all of them.
+        """
+        self._addUsedSourceName(source.name, item_specs)
+
+    def addUsedTemplate(self, name):
+        """ Records that the current render pass used the template with
+            the given name. A `None` name means that some templates were
+            used, but we don't know which ones.
+        """
+        if self._current_pass is None:
+            return
+
+        all_used = self.render_info['used_templates']
+        used = all_used[self._current_pass]
+        if used is None:
+            return
+        if name is None:
+            all_used[self._current_pass] = None
+        elif name not in used:
+            used.append(name)
+
+    def addUsedSegmentsSources(self, rendered_segments):
+        """ Records the sources and templates used by the given rendered
+            segments, which may have come from a cache.
+        """
+        used_source_items = getattr(
+            rendered_segments, 'used_source_items', None)
+        used_templates = getattr(rendered_segments, 'used_templates', [])
+        if not used_source_items and used_templates == []:
+            return
+
+        prev_pass = self._current_pass
+        prev_usn = self._current_used_source_names
+        prev_usi = self._current_used_source_items
+        self.setRenderPass('segments')
+        try:
+            if used_source_items:
+                for name, item_specs in used_source_items.items():
+                    self._addUsedSourceName(name, item_specs)
+            if used_templates is None:
+                self.addUsedTemplate(None)
+            else:
+                for name in used_templates:
+                    self.addUsedTemplate(name)
+        finally:
+            self._current_pass = prev_pass
+            self._current_used_source_names = prev_usn
+            self._current_used_source_items = prev_usi
+
+    def _addUsedSourceName(self, source_name, item_specs):
         usn = self.current_used_source_names
-        if source.name not in usn:
-            usn.append(source.name)
+        if source_name not in usn:
+            usn.append(source_name)
+
+        usi = self._current_used_source_items
+        if item_specs is None:
+            usi[source_name] = None
+        elif source_name not in usi:
+            usi[source_name] = set(item_specs)
+        elif usi[source_name] is not None:
+            usi[source_name].update(item_specs)
 
 
 class RenderingContextStack(object):
@@ -170,6 +252,7 @@ def render_page(ctx):
                     lambda: _do_render_page_segments(ctx, page_data),
                     fs_cache_time=page.content_mtime,
                     save_to_fs=save_to_fs)
+                ctx.addUsedSegmentsSources(render_result)
             else:
                 render_result = _do_render_page_segments(ctx, page_data)
                 if repo:
@@ -243,6 +326,7 @@ def render_page_segments(ctx):
                     lambda: _do_render_page_segments_from_ctx(ctx),
                     fs_cache_time=page.content_mtime,
                     save_to_fs=save_to_fs)
+                ctx.addUsedSegmentsSources(render_result)
             else:
                 render_result = _do_render_page_segments_from_ctx(ctx)
                 if repo:
@@ -289,6 +373,8 @@ def _do_render_page_segments(ctx, page_data):
                     page.content_spec, seg, page_data)
                 if was_rendered:
                     used_templating = True
+                    if not engine.TRACKS_USED_TEMPLATES:
+                        ctx.addUsedTemplate(None)
         except TemplatingError as err:
             err.lineno += seg.line
             raise err
@@ -305,6 +391,10 @@ def _do_render_page_segments(ctx, page_data):
                 formatted_segments['content.abstract'] = content_abstract
 
     res = RenderedSegments(formatted_segments, used_templating)
+    res.used_source_items = copy.deepcopy(
+        ctx.render_info['used_source_items']['segments'])
+    res.used_templates = copy.copy(
+        ctx.render_info['used_templates']['segments'])
 
     app.env.stats.stepCounter('PageRenderSegments')
 
@@ -330,6 +420,8 @@ def _do_render_layout(layout_name, page, layout_data):
     _, engine_name = os.path.splitext(full_names[0])
     engine_name = engine_name.lstrip('.')
     engine = get_template_engine(app, engine_name)
+    if not engine.TRACKS_USED_TEMPLATES:
+        cur_ctx.addUsedTemplate(None)
 
     try:
         with app.env.stats.timerScope(
@@ -362,7 +454,6 @@ def format_text(app, format_name, txt, exact_format=False):
     if exact_format and not format_name:
         raise Exception("You need to specify a format name.")
 
-    format_count = 0
     format_name = format_name or app.config.get('site/default_format')
 
     auto_fmts = app.config.get('site/auto_formats')
@@ -370,16 +461,93 @@ def format_text(app, format_name, txt, exact_format=False):
     if redirect is not None:
         format_name = redirect
 
+    # Figure out which formatters to run, and on what formats.
+    fmt_chain = []
     for fmt in app.plugin_loader.getFormatters():
         if not fmt.enabled:
             continue
         if fmt.FORMAT_NAMES is None or format_name in fmt.FORMAT_NAMES:
-            with app.env.stats.timerScope(fmt.__class__.__name__):
-                txt = fmt.render(format_name, txt)
-            format_count += 1
+            fmt_chain.append((fmt, format_name))
             if fmt.OUTPUT_FORMAT is not None:
                 format_name = fmt.OUTPUT_FORMAT
-    if exact_format and format_count == 0:
+    if exact_format and not fmt_chain:
         raise Exception("No such format: %s" % format_name)
+    if not fmt_chain or not txt:
+        return txt
+
+    # See if we already formatted the same text with the same formatters
+    # before, possibly for another page, or during a previous bake.
+    cache_path = None
+    if app.cache.enabled:
+        cache_path = _get_format_cache_path(app, fmt_chain, txt)
+        try:
+            with open(cache_path, 'r', encoding='utf8') as fp:
+                res = fp.read()
+            # Remember that this cache entry is still being used.
+            os.utime(cache_path)
+            app.env.stats.stepCounter('FormatCacheHits')
+            return res
+        except OSError:
+            app.env.stats.stepCounter('FormatCacheMisses')
+
+    for fmt, fmt_format_name in fmt_chain:
+        with app.env.stats.timerScope(fmt.__class__.__name__):
+            txt = fmt.render(fmt_format_name, txt)
+
+    if cache_path is not None:
+        # Write to a temporary file first so that other processes never
+        # see a half-written cache file.
+        cache_dir = os.path.dirname(cache_path)
+        os.makedirs(cache_dir, 0o755, exist_ok=True)
+        tmp_path = '%s.%d.tmp' % (cache_path, os.getpid())
+        with open(tmp_path, 'w', encoding='utf8') as fp:
+            fp.write(txt)
+        os.replace(tmp_path, cache_path)
+
     return txt
 
+
+def _get_format_cache_path(app, fmt_chain, txt):
+    h = hashlib.sha1()
+    for fmt, fmt_format_name in fmt_chain:
+        h.update(('%s|%s|' % (fmt.getCacheKey(),
+                              fmt_format_name)).encode('utf8'))
+    h.update(txt.encode('utf8'))
+    key = h.hexdigest()
+    cache = app.cache.getCache('formats')
+    return cache.getCachePath(os.path.join(key[:2], key[2:]))
+
+
+def prune_format_cache(app, now=None):
+    """ Removes the formatted texts that weren't used in a while from the
+        cache, and returns how many were removed. This only looks at the
+        cache once in a while (see `FORMAT_CACHE_PRUNE_INTERVAL`).
+    """
+    if not app.cache.enabled:
+        return 0
+
+    now = now or time.time()
+    cache = app.cache.getCache('formats')
+    marker_path = cache.getCachePath('last_pruned')
+    try:
+        if now - os.path.getmtime(marker_path) < FORMAT_CACHE_PRUNE_INTERVAL:
+            return 0
+    except OSError:
+        pass
+    with open(marker_path, 'w'):
+        pass
+    os.utime(marker_path, (now, now))
+
+    count = 0
+    for dirpath, _, filenames in os.walk(cache.base_dir):
+        for fn in filenames:
+            path = os.path.join(dirpath, fn)
+            if path == marker_path:
+                continue
+            try:
+                if now - os.path.getmtime(path) > FORMAT_CACHE_MAX_AGE:
+                    os.remove(path)
+                    count += 1
+            except OSError:
+                pass
+    return count
@@ -10,8 +10,6 @@ logger = logging.getLogger(__name__)
 
 
 route_re = re.compile(r'%((?P<qual>[\w\d]+):)?(?P<var>\+)?(?P<name>\w+)%')
-route_esc_re = re.compile(
-    r'\\%((?P<qual>[\w\d]+)\\:)?(?P<var>\\\+)?(?P<name>\w+)\\%')
 ugly_url_cleaner = re.compile(r'\.html$')
 
 
@@ -65,9 +63,7 @@ class Route(object):
         self.uri_format = route_re.sub(self._uriFormatRepl, self.uri_pattern)
 
         # Get the straight-forward regex for matching this URI pattern.
-        p = route_esc_re.sub(self._uriPatternRepl,
-                             re.escape(self.uri_pattern)) + '$'
-        self.uri_re = re.compile(p)
+        self.uri_re = self._compileUriPattern(self.uri_pattern)
 
         # If the URI pattern has a 'path'-type component, we'll need to match
         # the versions for which that component is empty. So for instance if
@@ -81,12 +77,19 @@ class Route(object):
             .replace('//', '/')
             .rstrip('/'))
         if uri_pattern_no_path != self.uri_pattern:
-            p = route_esc_re.sub(self._uriPatternRepl,
-                                 re.escape(uri_pattern_no_path)) + '$'
-            self.uri_re_no_path = re.compile(p)
+            self.uri_re_no_path = self._compileUriPattern(uri_pattern_no_path)
         else:
             self.uri_re_no_path = None
 
+        # The literal directories at the start of the URI pattern, used by
+        # `RouteMatcher` to only try this route on URIs that start with
+        # them.
+        self.uri_prefix_segments = []
+        for seg in self.uri_pattern.split('/')[:-1]:
+            if not seg or '%' in seg:
+                break
+            self.uri_prefix_segments.append(seg)
+
         self.func_name = self._validateFuncName(cfg.get('func'))
         self.func_has_variadic_parameter = False
         for p in self.uri_params[:-1]:
@@ -126,6 +129,9 @@ class Route(object):
         return set(self.uri_params).issubset(route_params.keys())
 
     def matchUri(self, uri, strict=False):
+        return self._matchCleanUri(self._cleanUri(uri), strict)
+
+    def _cleanUri(self, uri):
         if not uri.startswith(self.uri_root):
             raise Exception("The given URI is not absolute: %s" % uri)
         uri = uri[len(self.uri_root):]
@@ -134,7 +140,9 @@ class Route(object):
             uri = ugly_url_cleaner.sub('', uri)
         elif self.trailing_slash:
             uri = uri.rstrip('/')
+        return uri
 
+    def _matchCleanUri(self, uri, strict):
         route_params = None
         m = self.uri_re.match(uri)
         if m:
@@ -270,6 +278,16 @@ class Route(object):
                             "Must be one of: %s'" %
                             (name, self.uri_pattern, known))
 
+    def _compileUriPattern(self, pattern):
+        p = ''
+        last = 0
+        for m in route_re.finditer(pattern):
+            p += re.escape(pattern[last:m.start()])
+            p += self._uriPatternRepl(m)
+            last = m.end()
+        p += re.escape(pattern[last:]) + '$'
+        return re.compile(p)
+
     def _uriPatternRepl(self, m):
         name = m.group('name')
         param_type = self.getParameterType(name)
@@ -286,7 +304,7 @@ class Route(object):
         param_type = self.getParameterType(name)
         if param_type == RouteParameter.TYPE_PATH:
             return ''
-        return r'(?P<%s>[^/\?]+)' % name
+        return m.group(0)
 
     def _coerceRouteParameter(self, name, val):
         try:
@@ -316,6 +334,60 @@ class Route(object):
         return name
 
 
+class RouteMatcher(object):
+    """ Finds the routes matching an URI without trying all of them.
+
+        Routes are stored in a tree of the literal directories that start
+        their URI patterns, so that only the routes found along the path
+        of a given URI need to run their regexes. For instance, a route
+        like `/blog/%slug%` is only tried on URIs starting with `/blog`.
+    """
+    def __init__(self, routes):
+        self.routes = routes
+        self._root = _RouteMatcherNode()
+        for i, route in enumerate(routes):
+            node = self._root
+            for seg in route.uri_prefix_segments:
+                node = node.children.setdefault(seg, _RouteMatcherNode())
+            node.routes.append((i, route))
+
+    def match(self, uri):
+        """ Returns the routes matching the given URI, along with the
+            route parameters they found, in the same order as they were
+            given.
+        """
+        if not self.routes:
+            return []
+
+        # All routes come from the same app, so they clean URIs (e.g.
+        # remove the site root) the same way.
+        uri = self.routes[0]._cleanUri(uri)
+
+        candidates = list(self._root.routes)
+        node = self._root
+        for seg in uri.split('/'):
+            node = node.children.get(seg)
+            if node is None:
+                break
+            candidates += node.routes
+        candidates.sort(key=lambda c: c[0])
+
+        res = []
+        for _, route in candidates:
+            route_params = route._matchCleanUri(uri, False)
+            if route_params is not None:
+                res.append((route, route_params))
+        return res
+
+
+class _RouteMatcherNode(object):
+    __slots__ = ['children', 'routes']
+
+    def __init__(self):
+        self.children = {}
+        self.routes = []
+
+
 class RouteFunction:
     def __init__(self, route):
         self._route = route
@@ -1,3 +1,4 @@
+import json
 import os.path
 from werkzeug.exceptions import HTTPException, NotFound, Forbidden
 from werkzeug.wrappers import Request, Response
@@ -42,17 +43,19 @@ class PieCrustDebugMiddleware(object):
         the asset pipeline in an SSE thread.
     """
     def __init__(self, app, appfactory,
-                 run_sse_check=None):
+                 run_sse_check=None, server=None):
         self.app = app
         self.appfactory = appfactory
         self.run_sse_check = run_sse_check
+        self.server = server
         self._proc_loop = None
         self._out_dir = os.path.join(
             appfactory.root_dir, CACHE_DIR, appfactory.cache_key, 'server')
         self._handlers = {
             'debug_info': self._getDebugInfo,
             'werkzeug_shutdown': self._shutdownWerkzeug,
-            'pipeline_status': self._startSSEProvider}
+            'pipeline_status': self._startSSEProvider,
+            'response_cache': self._getResponseCacheStats}
 
         if not self.run_sse_check or self.run_sse_check():
             # When using a server with code reloading, some implementations
@@ -63,6 +66,10 @@ class PieCrustDebugMiddleware(object):
             self._proc_loop = ProcessingLoop(self.appfactory, self._out_dir)
             self._proc_loop.start()
 
+    @property
+    def proc_loop(self):
+        return self._proc_loop
+
     def __call__(self, environ, start_response):
         debug_mount = '/__piecrust_debug/'
 
@@ -105,6 +112,16 @@ class PieCrustDebugMiddleware(object):
         response = Response(output, mimetype='text/html')
         return response(request.environ, start_response)
 
+    def _getResponseCacheStats(self, request, start_response):
+        if self.server is None:
+            raise NotFound("No PieCrust server to get statistics from.")
+
+        stats = self.server.server.response_cache.getStats()
+        stats['enabled'] = self.server.server.is_watching_changes
+        response = Response(json.dumps(stats), mimetype='application/json')
+        response.headers['Cache-Control'] = 'no-cache'
+        return response(request.environ, start_response)
+
     def _shutdownWerkzeug(self, request, start_response):
         shutdown_func = request.environ.get('werkzeug.server.shutdown')
         if shutdown_func is None:
@@ -82,11 +82,16 @@ class _AssetProcessingInfo:
 
 
 class ProcessingLoopBase:
+    # Whether this loop sends `site_changed` events to its observers
+    # when pages, templates, or the site configuration change.
+    WATCHES_SITE_CHANGES = False
+
     def __init__(self, appfactory, out_dir):
         self.appfactory = appfactory
         self.out_dir = out_dir
         self.last_status_id = 0
         self._app = None
+        self._worker_pool = None
         self._obs = []
         self._obs_lock = threading.Lock()
         config_name = (
@@ -105,6 +110,10 @@ class ProcessingLoopBase:
         return self._app
 
     def initialize(self):
+        # Bake workers hold their own app, so they need to be re-created
+        # along with ours.
+        if self._worker_pool is not None:
+            self._worker_pool.close()
         self._app = self.appfactory.create()
         self.onInitialize()
 
@@ -135,15 +144,34 @@ class ProcessingLoopBase:
                 continue
             yield src
 
-    def runPipelines(self, only_for_source=None):
+    def getSiteDirs(self):
+        """ Returns the directories with the content and templates that
+            the preview server uses.
+        """
+        dirs = []
+        for src in self._app.sources:
+            if src.config.get('pipeline') == 'asset':
+                continue
+            path = getattr(src, 'fs_endpoint_path', None)
+            if path:
+                dirs.append(path)
+        dirs += self._app.templates_dirs
+        return [d for d in dirs if os.path.isdir(d)]
+
+    def runPipelines(self, only_for_source=None, changed_paths=None):
         try:
-            self._doRunPipelines(only_for_source)
+            self._doRunPipelines(only_for_source, changed_paths)
         except Exception as ex:
             logger.error("Error while running asset pipeline:")
             logger.exception(ex)
 
-    def _doRunPipelines(self, only_for_source):
-        from piecrust.baking.baker import Baker
+    def _doRunPipelines(self, only_for_source, changed_paths):
+        from piecrust.baking.baker import Baker, PersistentWorkerPool
+
+        # Keep the bake workers around between runs, so that we don't
+        # need to wait for them to start up every time something changes.
+        if self._worker_pool is None:
+            self._worker_pool = PersistentWorkerPool()
 
         allowed_sources = None
         if only_for_source:
@@ -153,7 +181,9 @@ class ProcessingLoopBase:
             allowed_pipelines=['asset'],
             allowed_sources=allowed_sources,
             rotate_bake_records=False,
-            keep_unused_records=(allowed_sources is not None))
+            keep_unused_records=(allowed_sources is not None),
+            worker_pool=self._worker_pool,
+            changed_paths=changed_paths)
         records = baker.bake()
 
         self._onPipelinesRun(records)
@@ -190,6 +220,15 @@ class ProcessingLoopBase:
 
                 self._notifyObservers(item)
 
+    def _notifySiteChanged(self, paths, reinit=False):
+        self.last_status_id += 1
+        item = {
+            'id': self.last_status_id,
+            'type': 'site_changed',
+            'paths': list(paths),
+            'reinit': reinit}
+        self._notifyObservers(item)
+
     def _notifyObservers(self, item):
         with self._obs_lock:
             observers = list(self._obs)
@@ -225,6 +264,21 @@ if _has_watchdog:
                     'time': time.time()})
                 pl._event.set()
 
+    class _SiteFileEventHandler(FileSystemEventHandler):
+        def __init__(self, proc_loop):
+            self._proc_loop = proc_loop
+
+        def on_any_event(self, event):
+            # Don't skip directories, since moving one doesn't generate
+            # events for the files inside it.
+            pl = self._proc_loop
+            with pl._lock:
+                pl._ops.append({
+                    'op': 'refresh',
+                    'path': event.src_path,
+                    'change': event.event_type,
+                    'time': time.time()})
+                pl._event.set()
 
     class _SiteConfigEventHandler(FileSystemEventHandler):
         def __init__(self, proc_loop, path):
@@ -240,8 +294,9 @@ if _has_watchdog:
                 pl._ops.append({'op': 'reinit', 'time': time.time()})
                 pl._event.set()
 
-
     class WatchdogProcessingLoop(ProcessingLoopBase):
+        WATCHES_SITE_CHANGES = True
+
         def __init__(self, appfactory, out_dir):
             ProcessingLoopBase.__init__(self, appfactory, out_dir)
             self._op_thread = threading.Thread(
@@ -274,6 +329,11 @@ if _has_watchdog:
                 event_handler = _AssetFileEventHandler(self, src)
                 observer.schedule(event_handler, path, recursive=True)
 
+            for path in self.getSiteDirs():
+                logger.debug(" - %s" % path)
+                event_handler = _SiteFileEventHandler(self)
+                observer.schedule(event_handler, path, recursive=True)
+
             observer.start()
             self._op_thread.start()
 
@@ -286,38 +346,56 @@ if _has_watchdog:
                         self._ops = []
                         self._event.clear()
 
-                    orig_len = len(ops)
-                    lot = self._last_op_time
-                    ops = list(filter(lambda o: o['time'] > lot, ops))
-                    logger.debug("Got %d ops, with %d that happened after "
-                                 "our last operation." % (orig_len, len(ops)))
-                    if len(ops) == 0:
-                        continue
-
-                    if any(filter(lambda o: o['op'] == 'reinit', ops)):
-                        logger.info("Site configuration changed, "
-                                    "reloading pipeline.")
-                        self.initialize()
-                        self.runPipelines()
-                        continue
-
-                    sources = set()
-                    ops = list(filter(lambda o: o['op'] == 'bake', ops))
-                    for op in ops:
-                        logger.info("Detected file-system change: "
-                                    "%s [%s]" %
-                                    (op['path'], op['change']))
-                        sources.add(op['source'])
-
-                    logger.debug("Processing: %s" % [s.name for s in sources])
-                    for s in sources:
-                        self.runPipelines(s)
-
-                    self._last_op_time = time.time()
+                    self._processOps(ops)
 
                 except (KeyboardInterrupt, SystemExit):
                     break
 
+        def _processOps(self, ops):
+            # Running the asset pipelines writes files, so ignore asset
+            # changes that happened before our last run was done. Changes
+            # to the site itself can't come from us, and must not be lost.
+            orig_len = len(ops)
+            lot = self._last_op_time
+            ops = list(filter(
+                lambda o: o['op'] != 'bake' or o['time'] > lot, ops))
+            logger.debug("Got %d ops, with %d that happened after "
+                         "our last operation." % (orig_len, len(ops)))
+            if len(ops) == 0:
+                return
+
+            if any(filter(lambda o: o['op'] == 'reinit', ops)):
+                logger.info("Site configuration changed, "
+                            "reloading pipeline.")
+                self._notifySiteChanged([self.config_path],
+                                        reinit=True)
+                self.initialize()
+                self.runPipelines()
+                return
+
+            site_paths = set(
+                [o['path'] for o in ops if o['op'] == 'refresh'])
+            if site_paths:
+                logger.debug("Detected %d website change(s)." %
+                             len(site_paths))
+                self._notifySiteChanged(site_paths)
+
+            sources = set()
+            changed_paths = set()
+            ops = list(filter(lambda o: o['op'] == 'bake', ops))
+            for op in ops:
+                logger.info("Detected file-system change: "
+                            "%s [%s]" %
+                            (op['path'], op['change']))
+                sources.add(op['source'])
+                changed_paths.add(op['path'])
+
+            logger.debug("Processing: %s" % [s.name for s in sources])
+            for s in sources:
+                self.runPipelines(s, list(changed_paths))
+
+            self._last_op_time = time.time()
+
     ProcessingLoop = WatchdogProcessingLoop
 
 else:
@@ -358,22 +436,24 @@ else:
                     # For each assets folder we try to find the first new or
                     # modified file. If any, we just run the pipeline on
                     # that source.
-                    found_new_or_modified = False
+                    found_new_or_modified = None
+                    procinfo.source.invalidateCache()
                     for item in procinfo.source.getAllContents():
                         path = item.spec
                         if path not in procinfo.paths:
                             logger.debug("Found new asset: %s" % path)
                             procinfo.paths.add(path)
-                            found_new_or_modified = True
+                            found_new_or_modified = path
                             break
                         if os.path.getmtime(path) > procinfo.last_bake_time:
                             logger.debug("Found modified asset: %s" % path)
-                            found_new_or_modified = True
+                            found_new_or_modified = path
                             break
                     if found_new_or_modified:
                         logger.info("change detected, reprocessed '%s'." %
                                     procinfo.source.name)
-                        self.runPipelines(procinfo.source)
+                        self.runPipelines(procinfo.source,
+                                          [found_new_or_modified])
                         procinfo.last_bake_time = time.time()
 
                 time.sleep(self.interval)
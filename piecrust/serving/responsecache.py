@@ -0,0 +1,160 @@
+import os.path
+import gzip
+import hashlib
+import logging
+import threading
+import collections
+
+
+logger = logging.getLogger(__name__)
+
+
+class CachedPageResponse(object):
+    """ A rendered page, as kept in the `ResponseCache`, along with what
+        it needs to be sent again, and what it depends on.
+    """
+    def __init__(self, content, *, mimetype=None, cache_time=None,
+                 source_names=None, template_names=None):
+        self.content = content.encode('utf8')
+        self.etag = hashlib.md5(self.content).hexdigest()
+        self.mimetype = mimetype
+        self.cache_time = cache_time
+        # The names of the sources this page uses, including its own.
+        self.source_names = set(source_names or [])
+        # The names of the templates this page uses, or `None` if we don't
+        # know which ones it uses.
+        self.template_names = (
+            set(template_names) if template_names is not None else None)
+        self._gzip_content = None
+
+    @property
+    def gzip_content(self):
+        if self._gzip_content is None:
+            self._gzip_content = gzip.compress(self.content)
+        return self._gzip_content
+
+    def dependsOn(self, source_names, template_names):
+        if not self.source_names.isdisjoint(source_names):
+            return True
+        if template_names:
+            if self.template_names is None:
+                return True
+            # Changed template names can also be directories.
+            for n in template_names:
+                prefix = n + '/'
+                for t in self.template_names:
+                    if t == n or t.startswith(prefix):
+                        return True
+        return False
+
+
+class ResponseCache(object):
+    """ A least-recently-used cache of rendered pages for the preview
+        server, so that pages that didn't change since the last time they
+        were requested don't need to be rendered again.
+
+        Cached pages are invalidated when the files they depend on
+        change, i.e. when something changed in a source they use, or in a
+        template they use.
+    """
+    def __init__(self, max_size=256):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.invalidations = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, entry):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def stepNotModified(self):
+        with self._lock:
+            self.not_modified += 1
+
+    def clear(self):
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+
+    def invalidate(self, app, changed_paths):
+        """ Removes the cached pages that depend on any of the given
+            files, using the given app to know what sources and templates
+            those files belong to.
+        """
+        source_names = set()
+        template_names = set()
+        for path in changed_paths:
+            res = _find_source_or_template(app, path)
+            if res is None:
+                # We don't know what this is, so it could affect any page.
+                logger.debug("Unknown changed file, clearing response "
+                             "cache: %s" % path)
+                self.clear()
+                return
+            source_names.update(res[0])
+            if res[1] is not None:
+                template_names.add(res[1])
+
+        with self._lock:
+            to_remove = [
+                k for k, e in self._entries.items()
+                if e.dependsOn(source_names, template_names)]
+            for k in to_remove:
+                del self._entries[k]
+            self.invalidations += len(to_remove)
+        if to_remove:
+            logger.debug("Removed %d page(s) from the response cache." %
+                         len(to_remove))
+
+    def getStats(self):
+        with self._lock:
+            return collections.OrderedDict([
+                ('size', len(self._entries)),
+                ('max_size', self.max_size),
+                ('hits', self.hits),
+                ('misses', self.misses),
+                ('not_modified', self.not_modified),
+                ('invalidations', self.invalidations)])
+
+
+def _find_source_or_template(app, path):
+    # Returns the names of the sources the given file belongs to, or the
+    # name of the template it is.
+    path = os.path.abspath(path)
+    source_names = []
+    for src in app.sources:
+        endpoint = getattr(src, 'fs_endpoint_path', None)
+        if endpoint and _is_path_under(path, os.path.abspath(endpoint)):
+            source_names.append(src.name)
+    if source_names:
+        return source_names, None
+
+    for tpl_dir in app.templates_dirs:
+        tpl_dir = os.path.abspath(tpl_dir)
+        if path != tpl_dir and _is_path_under(path, tpl_dir):
+            name = os.path.relpath(path, tpl_dir).replace('\\', '/')
+            return [], name
+    return None
+
+
+def _is_path_under(path, dir_path):
+    return path == dir_path or path.startswith(dir_path.rstrip(os.sep) +
+                                               os.sep)
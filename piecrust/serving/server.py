@@ -1,10 +1,8 @@
-import io
 import os
-import gzip
 import time
 import os.path
-import hashlib
 import logging
+import threading
 from werkzeug.exceptions import (
     NotFound, MethodNotAllowed, InternalServerError, HTTPException)
 from werkzeug.wrappers import Request, Response
@@ -13,6 +11,8 @@ from piecrust import CACHE_DIR, RESOURCES_DIR
 from piecrust.page import PageNotFoundError
 from piecrust.rendering import RenderingContext, render_page
 from piecrust.routing import RouteNotFoundError
+from piecrust.serving.responsecache import (
+    ResponseCache, CachedPageResponse)
 from piecrust.serving.util import (
     content_type_map, make_wrapped_file_response, get_requested_pages,
     get_app_for_server)
@@ -31,6 +31,12 @@ class PieCrustServer(object):
     def __call__(self, environ, start_response):
         return self.server._run_request(environ, start_response)
 
+    def watchChanges(self, proc_loop):
+        """ Keeps the website loaded between requests, and lets the given
+            processing loop tell us when something changed.
+        """
+        self.server.watchChanges(proc_loop)
+
 
 class MultipleNotFound(HTTPException):
     """ Represents a 404 (not found) error that tried to serve one or
@@ -69,6 +75,38 @@ class _ServerImpl(object):
             CACHE_DIR,
             (appfactory.cache_key or 'default'),
             'server')
+        self._watch_changes = False
+        self._apps = {}
+        self._app_lock = threading.Lock()
+        self._changed_paths = set()
+        self._response_cache = ResponseCache()
+
+    @property
+    def response_cache(self):
+        return self._response_cache
+
+    @property
+    def is_watching_changes(self):
+        return self._watch_changes
+
+    def watchChanges(self, proc_loop):
+        self._watch_changes = True
+        proc_loop.addObserver(self)
+
+    def addBuildEvent(self, item):
+        # Called by the processing loop when something changed.
+        if item['type'] != 'site_changed':
+            return
+
+        with self._app_lock:
+            if item.get('reinit'):
+                logger.debug("Website configuration changed, dropping "
+                             "loaded website.")
+                self._apps = {}
+                self._changed_paths = set()
+                self._response_cache.clear()
+            else:
+                self._changed_paths.update(item['paths'])
 
     def _run_request(self, environ, start_response):
         try:
@@ -80,6 +118,7 @@ class _ServerImpl(object):
             return self._handle_error(ex, environ, start_response)
 
     def _try_run_request(self, environ):
+        request_start_time = time.perf_counter()
         request = Request(environ)
 
         # We don't support anything else than GET requests since we're
@@ -100,17 +139,86 @@ class _ServerImpl(object):
         if response is not None:
             return response
 
-        # Create the app for this request.
+        # Get the app for this request, and serve a page with it.
+        show_debug_info = (self.enable_debug_info and
+                           '!debug' in request.args)
+        if not self._watch_changes:
+            app_start_time = time.perf_counter()
+            app = self._createApp(show_debug_info)
+            app_time = time.perf_counter() - app_start_time
+            return self._try_serve_page_with_app(
+                app, environ, request, request_start_time, app_time)
+
+        # Requests share the same app, so they need to be handled one at
+        # a time.
+        with self._app_lock:
+            app_start_time = time.perf_counter()
+            app = self._getWarmApp(show_debug_info)
+            app_time = time.perf_counter() - app_start_time
+
+            # See if we already rendered this page since it last changed.
+            # Pages showing debug info are always rendered again, since
+            # they show how long that took.
+            cache_key = None
+            if not app.debug and not app.config.get('site/show_debug_info'):
+                cache_key = (request.path, show_debug_info)
+                entry = self._response_cache.get(cache_key)
+                if entry is not None:
+                    return self._make_page_response(app, request, entry)
+
+            return self._try_serve_page_with_app(
+                app, environ, request, request_start_time, app_time,
+                cache_key=cache_key)
+
+    def _createApp(self, show_debug_info):
         app = get_app_for_server(self.appfactory,
                                  root_url=self.root_url)
-        if (app.config.get('server/enable_debug_info') and
-                self.enable_debug_info and
-                '!debug' in request.args):
+        if (show_debug_info and
+                app.config.get('server/enable_debug_info')):
             app.config.set('site/show_debug_info', True)
+        return app
+
+    def _getWarmApp(self, show_debug_info):
+        if self._changed_paths:
+            changed_paths = list(self._changed_paths)
+            self._changed_paths = set()
+            logger.debug("Refreshing loaded website after %d change(s)." %
+                         len(changed_paths))
+            for app in self._apps.values():
+                app.invalidateCaches(changed_paths)
+
+            app = next(iter(self._apps.values()), None)
+            if app is not None:
+                self._response_cache.invalidate(app, changed_paths)
+            else:
+                self._response_cache.clear()
+
+        # Pages render differently with debug info (e.g. their links), so
+        # keep a separate app for that.
+        app = self._apps.get(show_debug_info)
+        if app is None:
+            app = self._createApp(show_debug_info)
+
+            # Rendered segments are kept in memory until something changes.
+            # We don't use the file-system cache because its entries are
+            # only invalidated when their page changes, and not when some
+            # other page or template they use does.
+            app.env.rendered_segments_repository.fs_cache = None
 
+            self._response_cache.max_size = app.config.get(
+                'server/response_cache_size') or 0
+
+            self._apps[show_debug_info] = app
+        return app
+
+    def _try_serve_page_with_app(self, app, environ, request,
+                                 request_start_time, app_time,
+                                 cache_key=None):
         # Let's try to serve a page.
         try:
-            response = self._try_serve_page(app, environ, request)
+            response = self._try_serve_page(app, environ, request,
+                                            request_start_time, app_time,
+                                            cache_key=cache_key)
             return response
         except (RouteNotFoundError, SourceNotFoundError) as ex:
             raise NotFound() from ex
@@ -151,7 +259,8 @@ class _ServerImpl(object):
         except OSError:
             return None
 
-    def _try_serve_page(self, app, environ, request):
+    def _try_serve_page(self, app, environ, request,
+                        request_start_time, app_time, cache_key=None):
         # Find a matching page.
         req_pages, not_founds = get_requested_pages(app, request.path)
 
@@ -159,9 +268,12 @@ class _ServerImpl(object):
 
         for req_page in req_pages:
             # We have a page, let's try to render it.
-            render_ctx = RenderingContext(req_page.page,
-                                          sub_num=req_page.sub_num,
-                                          force_render=True)
+            # Only use the cached rendered segments if we're sure they're
+            # up to date.
+            render_ctx = RenderingContext(
+                req_page.page,
+                sub_num=req_page.sub_num,
+                force_render=not self._watch_changes)
             req_page.page.source.prepareRenderContext(render_ctx)
 
             # Render the page.
@@ -201,15 +313,49 @@ class _ServerImpl(object):
             now_time = time.perf_counter()
             timing_info = (
                 '%8.1f ms' %
-                ((now_time - app.env.start_time) * 1000.0))
+                ((now_time - request_start_time) * 1000.0))
+            timing_info += (
+                ', including %.1f ms to load the website' %
+                (app_time * 1000.0))
             rp_content = rp_content.replace(
                 '__PIECRUST_TIMING_INFORMATION__', timing_info)
 
-        # Build the response.
+        content_type = page.config.get('content_type')
+        if content_type and '/' not in content_type:
+            mimetype = content_type_map.get(content_type, content_type)
+        else:
+            mimetype = content_type
+
+        render_info = rendered_page.render_info
+        source_names = set([page.source.name])
+        template_names = set()
+        for p in ['segments', 'layout']:
+            source_names.update(render_info['used_source_names'][p])
+            used_templates = render_info['used_templates'][p]
+            if template_names is not None:
+                if used_templates is None:
+                    template_names = None
+                else:
+                    template_names.update(used_templates)
+
+        entry = CachedPageResponse(
+            rp_content,
+            mimetype=mimetype,
+            cache_time=(page.config.get('cache_time') or
+                        app.config.get('site/cache_time')),
+            source_names=source_names,
+            template_names=template_names)
+        if cache_key is not None:
+            self._response_cache.put(cache_key, entry)
+
+        return self._make_page_response(app, request, entry)
+
+    def _make_page_response(self, app, request, entry):
         response = Response()
 
-        etag = hashlib.md5(rp_content.encode('utf8')).hexdigest()
+        etag = entry.etag
         if not app.debug and etag in request.if_none_match:
+            self._response_cache.stepNotModified()
             response.status_code = 304
             return response
 
@@ -221,33 +367,24 @@ class _ServerImpl(object):
             cache_control.no_cache = True
             cache_control.must_revalidate = True
         else:
-            cache_time = (page.config.get('cache_time') or
-                          app.config.get('site/cache_time'))
+            cache_time = entry.cache_time
             if cache_time:
                 cache_control.public = True
                 cache_control.max_age = cache_time
 
-        content_type = page.config.get('content_type')
-        if content_type and '/' not in content_type:
-            mimetype = content_type_map.get(content_type, content_type)
-        else:
-            mimetype = content_type
-        if mimetype:
-            response.mimetype = mimetype
+        if entry.mimetype:
+            response.mimetype = entry.mimetype
 
+        content = entry.content
         if ('gzip' in request.accept_encodings and
                 app.config.get('site/enable_gzip')):
             try:
-                with io.BytesIO() as gzip_buffer:
-                    with gzip.open(gzip_buffer, mode='wt',
-                                   encoding='utf8') as gzip_file:
-                        gzip_file.write(rp_content)
-                    rp_content = gzip_buffer.getvalue()
-                    response.content_encoding = 'gzip'
+                content = entry.gzip_content
+                response.content_encoding = 'gzip'
             except Exception:
                 logger.error("Error compressing response, "
                              "falling back to uncompressed.")
-        response.set_data(rp_content)
+        response.set_data(content)
 
         return response
 
@@ -5,8 +5,11 @@ import logging
 import datetime
 from werkzeug.wrappers import Response
 from werkzeug.wsgi import wrap_file
+from piecrust.baking.precompress import (
+    get_precompressed_path, is_precompressed_path_valid,
+    is_precompressable_path)
 from piecrust.page import PageNotFoundError
-from piecrust.routing import RouteNotFoundError
+from piecrust.routing import RouteNotFoundError, RouteMatcher
 from piecrust.uriutil import split_sub_uri
 
 
@@ -31,13 +34,21 @@ class RequestedPage(object):
 
 
 def find_routes(routes, uri, decomposed_uri=None):
-    """ Returns routes matching the given URL.
+    """ Returns routes matching the given URL. The routes can be given
+        as a list, or as a `RouteMatcher` that only tries the relevant
+        ones.
     """
     sub_num = 0
     uri_no_sub = None
     if decomposed_uri is not None:
         uri_no_sub, sub_num = decomposed_uri
 
+    if isinstance(routes, RouteMatcher):
+        res = [(r, p, 1) for r, p in routes.match(uri)]
+        if sub_num > 1:
+            res += [(r, p, sub_num) for r, p in routes.match(uri_no_sub)]
+        return res
+
     res = []
 
     for route in routes:
@@ -64,7 +75,8 @@ def get_requested_pages(app, req_path):
     # It could also be a sub-page (i.e. the URL ends with a page number), so
     # we try to also match the base URL (without the number).
     req_path_no_sub, sub_num = split_sub_uri(app, req_path)
-    routes = find_routes(app.routes, req_path, (req_path_no_sub, sub_num))
+    routes = find_routes(app.route_matcher, req_path,
+                         (req_path_no_sub, sub_num))
     if len(routes) == 0:
         raise RouteNotFoundError("Can't find route for: %s" % req_path)
 
@@ -123,9 +135,15 @@ def load_mimetype_map():
 
 
 def make_wrapped_file_response(environ, request, path):
+    # See if there's a precompressed version of the file we can send.
+    st = os.stat(path)
+    mtime = st.st_mtime
+    encoding = _get_precompressed_encoding(request, path, st.st_mtime_ns)
+
     # Check if we can return a 304 status code.
-    mtime = os.path.getmtime(path)
     etag_str = '%s$$%s' % (path, mtime)
+    if encoding is not None:
+        etag_str += '$$%s' % encoding
     etag = hashlib.md5(etag_str.encode('utf8')).hexdigest()
     if etag in request.if_none_match:
         logger.debug("Serving %s [no download, E-Tag matches]" % path)
@@ -133,18 +151,37 @@ def make_wrapped_file_response(environ, request, path):
         response.status_code = 304
         return response
 
-    logger.debug("Serving %s [full download]" % path)
-    wrapper = wrap_file(environ, open(path, 'rb'))
+    if encoding is not None:
+        logger.debug("Serving %s [full download, %s]" % (path, encoding))
+        wrapper = wrap_file(
+            environ, open(get_precompressed_path(path, encoding), 'rb'))
+    else:
+        logger.debug("Serving %s [full download]" % path)
+        wrapper = wrap_file(environ, open(path, 'rb'))
     response = Response(wrapper)
     _, ext = os.path.splitext(path)
     response.set_etag(etag)
     response.last_modified = datetime.datetime.fromtimestamp(mtime)
     response.mimetype = mimetype_map.get(
         ext.lstrip('.'), 'text/plain')
+    if encoding is not None:
+        response.content_encoding = encoding
+    if is_precompressable_path(path):
+        response.vary.add('Accept-Encoding')
     response.direct_passthrough = True
     return response
 
 
+def _get_precompressed_encoding(request, path, mtime_ns):
+    if not is_precompressable_path(path):
+        return None
+    for e in ['br', 'gzip']:
+        if (request.accept_encodings[e] > 0 and
+                is_precompressed_path_valid(path, e, mtime_ns)):
+            return e
+    return None
+
+
 mimetype_map = load_mimetype_map()
 content_type_map = {
     'html': 'text/html',
@@ -175,12 +175,19 @@ def _get_piecrust_server(appfactory, *,
             PieCrustStaticResourcesMiddleware, PieCrustDebugMiddleware)
         from piecrust.serving.server import PieCrustServer
 
-        app = PieCrustServer(appfactory)
-        app = PieCrustStaticResourcesMiddleware(app)
+        server = PieCrustServer(appfactory)
+        app = PieCrustStaticResourcesMiddleware(server)
 
         if is_cmdline_mode:
             app = PieCrustDebugMiddleware(
-                app, appfactory, run_sse_check=run_sse_check)
+                app, appfactory, run_sse_check=run_sse_check,
+                server=server)
+
+            # If we're watching for changes, the server can keep the
+            # website loaded between requests.
+            proc_loop = app.proc_loop
+            if proc_loop is not None and proc_loop.WATCHES_SITE_CHANGES:
+                server.watchChanges(proc_loop)
 
     if serve_admin:
         from piecrust.admin.web import create_foodtruck_app
@@ -142,6 +142,8 @@ class BlogArchivesPipeline(ContentPipeline):
     PIPELINE_NAME = 'blog_archives'
     PASS_NUM = 10
     RECORD_ENTRY_CLASS = BlogArchivesPipelineRecordEntry
+    # Listing pages are usually more expensive to render than other pages.
+    DEFAULT_JOB_COST = 0.1
 
     def __init__(self, source, ctx):
         if not isinstance(source, BlogArchivesSource):
@@ -26,6 +26,7 @@ class DefaultContentSource(FSContentSource,
         self.auto_formats = app.config.get('site/auto_formats')
         self.default_auto_format = app.config.get('site/default_auto_format')
         self.supported_extensions = list(self.auto_formats)
+        self._route_index = None
 
     def _finalizeContent(self, parent_group, items, groups):
         SimpleAssetsSubDirMixin._removeAssetGroups(self, groups)
@@ -66,8 +67,15 @@ class DefaultContentSource(FSContentSource,
         return [
             RouteParameter('slug', RouteParameter.TYPE_PATH)]
 
+    def invalidateCache(self):
+        super().invalidateCache()
+        self._route_index = None
+
     def findContentFromRoute(self, route_params):
         uri_path = route_params.get('slug', '')
+        if self._useRouteIndex():
+            return self._findContentFromRouteIndex(uri_path)
+
         if not uri_path:
             uri_path = '_index'
         path = os.path.join(self.fs_endpoint_path, uri_path)
@@ -85,6 +93,44 @@ class DefaultContentSource(FSContentSource,
                 return ContentItem(path, metadata)
         return None
 
+    def _useRouteIndex(self):
+        # When serving, look pages up in the list of all our items instead
+        # of probing the file-system for each possible extension. This is
+        # only worth it if that list is cached, either in memory or in the
+        # source's scan index.
+        return (self.app.config.get('server/is_serving') and
+                (self._cache is not None or self.app.cache.enabled))
+
+    def _findContentFromRouteIndex(self, uri_path):
+        if self._route_index is None:
+            self._route_index = self._buildRouteIndex()
+        by_slug, by_path = self._route_index
+
+        item = by_slug.get(uri_path)
+        if item is None and uri_path:
+            # The URL could also have the page's extension, e.g. `foo.md`.
+            path = os.path.normpath(
+                os.path.join(self.fs_endpoint_path, uri_path))
+            item = by_path.get(path)
+        return item
+
+    def _buildRouteIndex(self):
+        by_slug = {}
+        by_path = {}
+        ext_order = {e: i for i, e in enumerate(self.supported_extensions)}
+        for item in self.getAllContents():
+            by_path[os.path.normpath(item.spec)] = item
+
+            # If there are several pages with the same slug, pick the one
+            # we would find first when probing each supported extension.
+            slug = item.metadata['route_params']['slug']
+            prev_item = by_slug.get(slug)
+            if (prev_item is None or
+                    _get_ext_rank(item.spec, ext_order) <
+                    _get_ext_rank(prev_item.spec, ext_order)):
+                by_slug[slug] = item
+        return by_slug, by_path
+
     def setupPrepareParser(self, parser, app):
         parser.add_argument('slug', help='The slug for the new page.')
 
@@ -107,3 +153,8 @@ class DefaultContentSource(FSContentSource,
         return [
             InteractiveField('slug', InteractiveField.TYPE_STRING,
                              'new-page')]
+
+
+def _get_ext_rank(path, ext_order):
+    _, ext = os.path.splitext(path)
+    return ext_order.get(ext.lstrip('.'), len(ext_order))
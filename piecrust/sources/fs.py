@@ -8,6 +8,7 @@ from piecrust.routing import RouteParameter
 from piecrust.sources.base import (
     ContentItem, ContentGroup, ContentSource,
     REL_PARENT_GROUP, REL_LOGICAL_PARENT_ITEM, REL_LOGICAL_CHILD_GROUP)
+from piecrust.sources.fsindex import FSScanIndex
 
 
 logger = logging.getLogger(__name__)
@@ -29,6 +30,10 @@ class FSContentSourceBase(ContentSource):
     """ Implements some basic stuff for a `ContentSource` that stores its
         items as files on disk.
     """
+    # Whether the metadata of this source's items depends on the contents
+    # of their files, and not just on their paths.
+    SCAN_INDEX_CHECKS_ITEMS = False
+
     def __init__(self, app, name, config):
         super().__init__(app, name, config)
         self.fs_endpoint = config.get('fs_endpoint', name)
@@ -48,6 +53,27 @@ class FSContentSourceBase(ContentSource):
                                                  self.fs_endpoint_path)
         return True
 
+    def getAllContents(self):
+        if self._cache is not None:
+            return self._cache
+
+        if not self.app.cache.enabled:
+            return super().getAllContents()
+
+        stats = self.app.env.stats
+        index = FSScanIndex(self)
+        items = index.load()
+        if items is not None:
+            stats.stepCounter('SourceScanIndexHits')
+            self._cache = items
+            return items
+
+        stats.stepCounter('SourceScanIndexMisses')
+        dirs_state = index.getDirsState()
+        items = super().getAllContents()
+        index.save(dirs_state, items)
+        return items
+
     def openItem(self, item, mode='r', **kwargs):
         for m in 'wxa+':
             if m in mode:
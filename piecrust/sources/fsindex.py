@@ -0,0 +1,153 @@
+import os
+import os.path
+import time
+import pickle
+import hashlib
+import logging
+from piecrust import APP_VERSION
+from piecrust.sources.base import ContentItem
+
+
+logger = logging.getLogger(__name__)
+
+
+SCAN_INDEX_VERSION = 2
+
+# How close to the scan a directory can be modified for us to not trust
+# its modification time. Some file-systems only store times to the second
+# (or even two seconds for FAT), so a file added right after the scan
+# could leave its directory's modification time unchanged.
+RACY_MTIME_WINDOW_NS = 2 * 10**9
+
+
+class FSScanIndex(object):
+    """ A list of all the content items in a file-system source, saved
+        in the cache directory so that the bake workers, and the next
+        bake or preview, can get them without scanning the file-system
+        again.
+
+        Each item is stored with its path, modification time, size, and
+        metadata (route parameters, dates parsed from the path, etc.)
+
+        The index is valid as long as no directory under the source's
+        endpoint was modified, since adding, removing, or renaming a
+        file changes the modification time of its parent directory.
+        Directories modified right before the scan make the index
+        invalid too, like racy entries in a git index.
+        Sources whose item metadata depends on the contents of the files
+        set `SCAN_INDEX_CHECKS_ITEMS`, and the items' files are then
+        checked too.
+    """
+    def __init__(self, source):
+        self.source = source
+        self.cache = source.app.cache.getCache('sources')
+        self.cache_path = '%s.idx' % source.name
+
+    def getDirsState(self):
+        """ Returns the current time, and the modification times of all
+            the directories under the source's endpoint. This should be
+            called before scanning the source, so that changes made during
+            the scan invalidate the index.
+        """
+        scan_time = int(time.time() * 10**9)
+        endpoint = self.source.fs_endpoint_path
+        dirs = {endpoint: _get_mtime(endpoint)}
+        for dirpath, dirnames, _ in os.walk(endpoint, followlinks=True):
+            for dn in dirnames:
+                path = os.path.join(dirpath, dn)
+                dirs[path] = _get_mtime(path)
+        return scan_time, dirs
+
+    def load(self):
+        """ Returns the indexed content items, or `None` if there's no
+            index, or if it's out of date.
+        """
+        try:
+            with self.cache.openRead(self.cache_path, mode='rb') as fp:
+                index = pickle.load(fp)
+        except FileNotFoundError:
+            return None
+        except Exception as ex:
+            logger.debug("Ignoring invalid scan index for source '%s': %s" %
+                         (self.source.name, ex))
+            return None
+
+        if index.get('key') != self._getKey():
+            return None
+
+        racy_time = index['scan_time'] - RACY_MTIME_WINDOW_NS
+        for path, mtime in index['dirs'].items():
+            if _get_mtime(path) != mtime:
+                logger.debug("Scan index for source '%s' is out of date, "
+                             "directory has changed: %s" %
+                             (self.source.name, path))
+                return None
+            if mtime is not None and mtime >= racy_time:
+                logger.debug("Scan index for source '%s' can't be trusted, "
+                             "directory changed right before the scan: %s" %
+                             (self.source.name, path))
+                return None
+
+        check_items = self.source.SCAN_INDEX_CHECKS_ITEMS
+        items = []
+        for spec, mtime, size, metadata in index['items']:
+            if check_items and _get_file_info(spec) != (mtime, size):
+                logger.debug("Scan index for source '%s' is out of date, "
+                             "file has changed: %s" %
+                             (self.source.name, spec))
+                return None
+            items.append(ContentItem(spec, metadata))
+        return items
+
+    def save(self, dirs_state, items):
+        """ Saves the given content items, found while the directories
+            were in the given state (see `getDirsState`).
+        """
+        scan_time, dirs = dirs_state
+        index_items = []
+        for i in items:
+            mtime, size = _get_file_info(i.spec)
+            index_items.append((i.spec, mtime, size, i.metadata))
+        index = {'key': self._getKey(), 'scan_time': scan_time,
+                 'dirs': dirs, 'items': index_items}
+
+        # Write to a temporary file first so that other processes never
+        # see a half-written index.
+        path = self.cache.getCachePath(self.cache_path)
+        tmp_path = '%s.%d.tmp' % (path, os.getpid())
+        try:
+            with open(tmp_path, 'wb') as fp:
+                pickle.dump(index, fp, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except (OSError, pickle.PicklingError) as ex:
+            logger.debug("Couldn't save scan index for source '%s': %s" %
+                         (self.source.name, ex))
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    def _getKey(self):
+        src = self.source
+        cfg = src.app.config
+        key = '%d|%s|%s.%s|%s|%s|%s|%s' % (
+            SCAN_INDEX_VERSION, APP_VERSION,
+            src.__class__.__module__, src.__class__.__qualname__,
+            src.fs_endpoint_path, repr(src.config),
+            cfg.get('__cache_key'), cfg.get('__cache_digest'))
+        return hashlib.sha1(key.encode('utf8')).hexdigest()
+
+
+def _get_mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _get_file_info(path):
+    try:
+        st = os.stat(path)
+        return st.st_mtime_ns, st.st_size
+    except OSError:
+        return None, None
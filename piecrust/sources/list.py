@@ -18,6 +18,15 @@ class ListSource(ContentSource):
     def getContents(self, group):
         return self.items
 
+    def getAllPages(self):
+        # Get the pages from the inner source so we share them with
+        # anybody else who's using that source.
+        if self._page_cache is None:
+            getter = self.app.getPage
+            self._page_cache = [getter(self.inner_source, i)
+                                for i in self.items]
+        return self._page_cache
+
     def getRelatedContents(self, item, relationship):
         return self.inner_source.getRelatedContents(item, relationship)
 
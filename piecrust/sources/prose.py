@@ -8,6 +8,7 @@ logger = logging.getLogger(__name__)
 
 class ProseSource(DefaultContentSource):
     SOURCE_NAME = 'prose'
+    SCAN_INDEX_CHECKS_ITEMS = True
 
     def __init__(self, app, name, config):
         super().__init__(app, name, config)
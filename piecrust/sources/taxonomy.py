@@ -13,6 +13,7 @@ from piecrust.pipelines.base import (
 from piecrust.routing import RouteParameter
 from piecrust.sources.base import ContentItem
 from piecrust.sources.generator import GeneratorSourceBase
+from piecrust.sources.list import ListSource
 
 
 logger = logging.getLogger(__name__)
@@ -98,9 +99,6 @@ class TaxonomySource(GeneratorSourceBase):
         return self.slugifier.slugifyMultiple(terms)
 
     def prepareRenderContext(self, ctx):
-        # Set the pagination source as the source we're generating for.
-        ctx.pagination_source = self.inner_source
-
         # Get the taxonomy terms from the route metadata... this can come from
         # the browser's URL (while serving) or from the baking (see `bake`
         # method below). In both cases, we expect to have the *slugified*
@@ -116,7 +114,20 @@ class TaxonomySource(GeneratorSourceBase):
         #
         route_params = ctx.page.source_metadata['route_params']
         tax_terms, is_combination = self._getTaxonomyTerms(route_params)
-        self._setTaxonomyFilter(ctx, tax_terms, is_combination)
+
+        # Set the pagination source as the source we're generating for.
+        # When baking, we already know which items have the terms we want
+        # (see `_TaxonomyTermsAnalyzer`) so we only paginate over those.
+        # Otherwise, we have to filter all the items of the source.
+        term_items = ctx.page.source_metadata.get('term_items')
+        if term_items is not None:
+            inner_source = self.inner_source
+            items = [inner_source.findContentFromSpec(s) for s in term_items]
+            ctx.pagination_source = ListSource(
+                inner_source, [i for i in items if i is not None])
+        else:
+            ctx.pagination_source = self.inner_source
+            self._setTaxonomyFilter(ctx, tax_terms, is_combination)
 
         # Add some custom data for rendering.
         ctx.custom_data.update({
@@ -154,7 +165,7 @@ class TaxonomySource(GeneratorSourceBase):
         # Set up the filter that will check the pages' terms.
         flt = PaginationFilter()
         flt.addClause(HasTaxonomyTermsFilterClause(
-            self.taxonomy, self.slugifier.mode, term_value, is_combination))
+            self.taxonomy, self.slugifier, term_value, is_combination))
         ctx.pagination_filter = flt
 
     def onRouteFunctionUsed(self, route_params):
@@ -191,11 +202,11 @@ class TaxonomySource(GeneratorSourceBase):
 
 
 class HasTaxonomyTermsFilterClause(SettingFilterClause):
-    def __init__(self, taxonomy, slugify_mode, value, is_combination):
+    def __init__(self, taxonomy, slugifier, value, is_combination):
         super().__init__(taxonomy.setting_name, value)
         self._taxonomy = taxonomy
         self._is_combination = is_combination
-        self._slugifier = _Slugifier(taxonomy, slugify_mode)
+        self._slugifier = slugifier
         if taxonomy.is_multiple:
             self.pageMatches = self._pageMatchesAny
         else:
@@ -250,6 +261,8 @@ class TaxonomyPipeline(ContentPipeline):
     PIPELINE_NAME = 'taxonomy'
     PASS_NUM = 10
     RECORD_ENTRY_CLASS = TaxonomyPipelineRecordEntry
+    # Listing pages are usually more expensive to render than other pages.
+    DEFAULT_JOB_COST = 0.1
 
     def __init__(self, source, ctx):
         if not isinstance(source, TaxonomySource):
@@ -288,9 +301,11 @@ class TaxonomyPipeline(ContentPipeline):
 
         for slugified_term in self._analyzer.dirty_slugified_terms:
             item_spec = '_index[%s]' % slugified_term
+            term_items = self._analyzer.getSlugifiedTermItems(slugified_term)
 
             jobs.append(create_job(self, item_spec,
-                                   term=slugified_term))
+                                   term=slugified_term,
+                                   term_items=term_items))
 
             entry = rec_fac(item_spec)
             current_record.addEntry(entry)
@@ -303,6 +318,7 @@ class TaxonomyPipeline(ContentPipeline):
         term = job['term']
         content_item = ContentItem('_index[%s]' % term,
                                    {'term': term,
+                                    'term_items': job.get('term_items'),
                                     'route_params': {
                                         self.taxonomy.term_name: term}
                                     })
@@ -350,6 +366,7 @@ class _TaxonomyTermsAnalyzer(object):
         self.pipeline = pipeline
         self.record_histories = record_histories
         self._all_terms = {}
+        self._all_term_items = {}
         self._all_dirty_slugified_terms = None
 
     @property
@@ -365,6 +382,17 @@ class _TaxonomyTermsAnalyzer(object):
         """
         return term in self._all_terms
 
+    def getSlugifiedTermItems(self, term):
+        """ Returns the sorted specs of the items that have the given
+            slugified term, or all the terms of a combination.
+        """
+        taxonomy = self.pipeline.taxonomy
+        if taxonomy.is_multiple and taxonomy.separator in term:
+            item_sets = [self._all_term_items.get(t, set())
+                         for t in term.split(taxonomy.separator)]
+            return sorted(set.intersection(*item_sets))
+        return sorted(self._all_term_items.get(term, ()))
+
     def analyze(self):
         # Build the list of terms for our taxonomy, and figure out which ones
         # are 'dirty' for the current bake.
@@ -380,9 +408,11 @@ class _TaxonomyTermsAnalyzer(object):
         # the ones used by the pages that were actually rendered (instead of
         # those that were up-to-date and skipped).
         single_dirty_slugified_terms = set()
+        removed_slugified_terms = set()
         current_records = self.record_histories.current
         record_name = get_record_name_for_source(source)
         cur_rec = current_records.getRecord(record_name)
+        prev_rec = self.record_histories.getPreviousRecord(record_name)
         for cur_entry in cur_rec.getEntries():
             if cur_entry.hasFlag(PagePipelineRecordEntry.FLAG_OVERRIDEN):
                 continue
@@ -408,6 +438,24 @@ class _TaxonomyTermsAnalyzer(object):
                         (slugifier.slugify(t)
                          for t in cur_terms))
 
+                # Also remember the terms this page had before, since
+                # their listing pages may not show it anymore.
+                prev_entry = prev_rec.getEntry(cur_entry.item_spec)
+                if prev_entry is not None:
+                    prev_terms = prev_entry.config.get(tax_setting_name)
+                    if prev_terms and not tax_is_mult:
+                        removed_slugified_terms.add(
+                            slugifier.slugify(prev_terms))
+                    elif prev_terms:
+                        removed_slugified_terms.update(
+                            (slugifier.slugify(t)
+                             for t in prev_terms))
+
+        # Terms that aren't used by any page anymore don't get a listing
+        # page at all, so there's nothing to re-bake for them.
+        single_dirty_slugified_terms.update(
+            (t for t in removed_slugified_terms if t in self._all_terms))
+
         self._all_dirty_slugified_terms = list(
             single_dirty_slugified_terms)
         logger.debug("Gathered %d dirty taxonomy terms",
@@ -463,6 +511,7 @@ class _TaxonomyTermsAnalyzer(object):
                 "previously existing '%s'. The two will be merged." %
                 (term, item_spec, st, orig_terms[0]))
         orig_terms.append(term)
+        self._all_term_items.setdefault(st, set()).add(item_spec)
 
 
 def _get_all_entry_taxonomy_terms(entry):
@@ -479,11 +528,19 @@ class _Slugifier(object):
     def __init__(self, taxonomy, mode):
         self.taxonomy = taxonomy
         self.mode = mode
+        self._cache = {}
 
     def slugifyMultiple(self, terms):
         return tuple(map(self.slugify, terms))
 
     def slugify(self, term):
+        res = self._cache.get(term)
+        if res is None:
+            res = self._doSlugify(term)
+            self._cache[term] = res
+        return res
+
+    def _doSlugify(self, term):
         if self.mode & SLUGIFY_TRANSLITERATE:
             term = unidecode.unidecode(term)
         if self.mode & SLUGIFY_LOWERCASE:
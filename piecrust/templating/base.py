@@ -23,6 +23,9 @@ class TemplatingError(Exception):
 
 class TemplateEngine(object):
     EXTENSIONS = []
+    # Whether the engine tells the current rendering context about the
+    # templates it loads (see `RenderingContext.addUsedTemplate`).
+    TRACKS_USED_TEMPLATES = False
 
     def initialize(self, app):
         self.app = app
@@ -30,6 +33,12 @@ class TemplateEngine(object):
     def populateCache(self):
         pass
 
+    def invalidateCache(self, paths=None):
+        """ Forgets any compiled templates that come from the given files,
+            or all of them if no paths are given.
+        """
+        pass
+
     def renderSegment(self, path, segment, data):
         raise NotImplementedError()
 
@@ -0,0 +1,64 @@
+import os
+import os.path
+import hashlib
+import logging
+import jinja2
+from jinja2.bccache import FileSystemBytecodeCache
+from piecrust import APP_VERSION
+
+
+logger = logging.getLogger(__name__)
+
+
+class PieCrustBytecodeCache(FileSystemBytecodeCache):
+    """ A bytecode cache that stores compiled templates in the website's
+        cache directory, so that they can be shared between the bake
+        workers, and re-used on the next bake or preview.
+
+        Cache files are keyed on the template's path and modification
+        time, the PieCrust and Jinja versions, and the options that
+        change how templates are compiled (`options_key`).
+    """
+    def __init__(self, directory, options_key, stats):
+        if not os.path.isdir(directory):
+            os.makedirs(directory, 0o755, exist_ok=True)
+        super().__init__(directory, '%s.jinjac')
+        self.options_key = options_key
+        self.stats = stats
+
+    def get_cache_key(self, name, filename=None):
+        mtime = 0
+        if filename:
+            try:
+                mtime = os.path.getmtime(filename)
+            except OSError:
+                pass
+        key = '%s|%s|%s|%s|%s|%s' % (
+            APP_VERSION, jinja2.__version__, self.options_key,
+            name, filename, mtime)
+        return hashlib.sha1(key.encode('utf8')).hexdigest()
+
+    def get_bucket(self, environment, name, filename, source):
+        bucket = super().get_bucket(environment, name, filename, source)
+        if bucket.code is not None:
+            self.stats.stepCounter('JinjaBytecodeCacheHits')
+        else:
+            self.stats.stepCounter('JinjaBytecodeCacheMisses')
+        return bucket
+
+    def load_bytecode(self, bucket):
+        try:
+            super().load_bytecode(bucket)
+        except Exception as ex:
+            logger.debug("Ignoring invalid Jinja bytecode cache file for "
+                         "'%s': %s" % (bucket.key, ex))
+            bucket.reset()
+
+    def dump_bytecode(self, bucket):
+        # Write to a temporary file first so that other processes never
+        # see a half-written cache file.
+        path = self._get_cache_filename(bucket)
+        tmp_path = '%s.%d.tmp' % (path, os.getpid())
+        with open(tmp_path, 'wb') as fp:
+            bucket.write_bytecode(fp)
+        os.replace(tmp_path, path)
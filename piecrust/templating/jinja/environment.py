@@ -78,6 +78,15 @@ class PieCrustEnvironment(Environment):
 
         self.filters['raw'] = self.filters['safe']
 
+    def _load_template(self, name, globals):
+        # Keep track of all the templates a page tries to use, including
+        # the ones it includes, imports, or extends, so that the baker
+        # knows which pages to re-bake when a template changes.
+        ctx = self.app.env.render_ctx_stack.current_ctx
+        if ctx is not None:
+            ctx.addUsedTemplate(name)
+        return super(PieCrustEnvironment, self)._load_template(name, globals)
+
     def _paginate(self, value, items_per_page=5):
         ctx = self.app.env.render_ctx_stack.current_ctx
         if ctx is None or ctx.page is None:
@@ -1,24 +1,26 @@
-import os.path
 from jinja2 import FileSystemLoader
 
 
 class PieCrustLoader(FileSystemLoader):
     def __init__(self, searchpath, encoding='utf-8'):
         super(PieCrustLoader, self).__init__(searchpath, encoding)
-        self.segments_cache = {}
 
-    def get_source(self, environment, template):
-        if template.startswith('$seg='):
-            filename, seg_content = self.segments_cache[template]
+    def loadSegment(self, environment, name, source, filename):
+        """ Loads a template for a page segment. The name is expected to
+            be derived from the source text, so the template never needs
+            to be reloaded, and it can come from the bytecode cache.
+        """
+        code = None
+        bcc = environment.bytecode_cache
+        if bcc is not None:
+            bucket = bcc.get_bucket(environment, name, None, source)
+            code = bucket.code
 
-            mtime = os.path.getmtime(filename)
+        if code is None:
+            code = environment.compile(source, name, filename)
+            if bcc is not None:
+                bucket.code = code
+                bcc.set_bucket(bucket)
 
-            def uptodate():
-                try:
-                    return os.path.getmtime(filename) == mtime
-                except OSError:
-                    return False
-
-            return seg_content, filename, uptodate
-
-        return super(PieCrustLoader, self).get_source(environment, template)
+        return environment.template_class.from_code(
+            environment, code, environment.make_globals(None), None)
@@ -1,5 +1,7 @@
 import os.path
+import hashlib
 import logging
+import repoze.lru
 from piecrust.sources.base import AbortedSourceUseError
 from piecrust.templating.base import (TemplateEngine, TemplateNotFoundError,
                                       TemplatingError)
@@ -11,27 +13,59 @@ logger = logging.getLogger(__name__)
 class JinjaTemplateEngine(TemplateEngine):
     ENGINE_NAMES = ['jinja', 'jinja2', 'j2']
     EXTENSIONS = ['html', 'jinja', 'jinja2', 'j2']
+    TRACKS_USED_TEMPLATES = True
+
+    # The maximum number of page segment templates to keep in memory.
+    SEGMENT_TEMPLATES_CACHE_SIZE = 2048
 
     def __init__(self):
         self.env = None
+        self._seg_templates = repoze.lru.LRUCache(
+            self.SEGMENT_TEMPLATES_CACHE_SIZE)
         self._jinja_syntax_error = None
         self._jinja_not_found = None
 
+    def populateCache(self):
+        self._ensureLoaded()
+        if self.env.bytecode_cache is None:
+            return
+
+        # Compile all the templates once so that the bake workers (and
+        # the next bakes) can load them from the bytecode cache.
+        for name in self.env.loader.list_templates():
+            try:
+                self.env.get_template(name)
+            except Exception as ex:
+                logger.debug("Can't pre-compile template '%s': %s" %
+                             (name, ex))
+
+    def invalidateCache(self, paths=None):
+        if self.env is None:
+            return
+
+        # Templates for page segments are named after their contents, so
+        # they never go stale. Other templates get reloaded by Jinja when
+        # their file changes.
+        if paths is None:
+            self._seg_templates.clear()
+            if self.env.cache is not None:
+                self.env.cache.clear()
+
     def renderSegment(self, path, segment, data):
         if not _string_needs_render(segment.content):
             return segment.content, False
 
         self._ensureLoaded()
 
-        seg_path = _make_segment_path(path, segment.offset)
-        self.env.loader.segments_cache[seg_path] = (
-            path, segment.content)
-        try:
-            tpl = self.env.get_template(seg_path)
-        except self._jinja_syntax_error as tse:
-            raise self._getTemplatingError(tse, filename=path)
-        except self._jinja_not_found:
-            raise TemplateNotFoundError()
+        seg_name = _make_segment_name(segment.content)
+        tpl = self._seg_templates.get(seg_name)
+        if tpl is None:
+            try:
+                tpl = self.env.loader.loadSegment(
+                    self.env, seg_name, segment.content, path)
+            except self._jinja_syntax_error as tse:
+                raise self._getTemplatingError(tse, filename=path)
+            self._seg_templates.put(seg_name, tpl)
 
         try:
             return tpl.render(data), True
@@ -85,6 +119,10 @@ class JinjaTemplateEngine(TemplateEngine):
                             raise_if_registered=False)
         stats.registerTimer('JinjaTemplateEngine_extensions',
                             raise_if_registered=False)
+        stats.registerCounter('JinjaBytecodeCacheHits',
+                              raise_if_registered=False)
+        stats.registerCounter('JinjaBytecodeCacheMisses',
+                              raise_if_registered=False)
         with stats.timerScope('JinjaTemplateEngine_setup'):
             self._load()
 
@@ -122,11 +160,26 @@ class JinjaTemplateEngine(TemplateEngine):
                      self.app.templates_dirs)
         from piecrust.templating.jinja.loader import PieCrustLoader
         loader = PieCrustLoader(self.app.templates_dirs)
+        # Cache compiled templates on disk, unless the cache is disabled.
+        # The cache is shared between all the chef commands (like `bake`
+        # and `serve`) since it's keyed on anything that changes how
+        # templates are compiled.
+        bytecode_cache = None
+        if self.app.cache.enabled:
+            from piecrust import CACHE_DIR
+            from piecrust.templating.jinja.bytecodecache import (
+                PieCrustBytecodeCache)
+            bytecode_cache = PieCrustBytecodeCache(
+                os.path.join(self.app.root_dir, CACHE_DIR, 'jinja'),
+                repr((extensions, get_config('jinja'))),
+                self.app.env.stats)
+
         from piecrust.templating.jinja.environment import PieCrustEnvironment
         self.env = PieCrustEnvironment(
             self.app,
             loader=loader,
-            extensions=extensions)
+            extensions=extensions,
+            bytecode_cache=bytecode_cache)
 
         # Get types we need later.
         from jinja2 import TemplateNotFound
@@ -145,6 +198,6 @@ def _string_needs_render(txt):
     return False
 
 
-def _make_segment_path(path, start):
-    return '$seg=%s:%d' % (path, start)
+def _make_segment_name(content):
+    return '$seg=%s' % hashlib.sha1(content.encode('utf8')).hexdigest()
 
@@ -5,6 +5,7 @@ import time
 import logging
 import threading
 import traceback
+import collections
 import multiprocessing
 from piecrust.environment import ExecutionStats
 
@@ -27,6 +28,18 @@ class IWorker(object):
     def process(self, job):
         raise NotImplementedError()
 
+    def update(self, data):
+        """ Called when the pool is reused for another batch of jobs,
+            with whatever data the pool's owner sent along.
+        """
+        raise NotImplementedError()
+
+    def flush(self):
+        """ Called before the worker reports its stats, to make sure
+            any pending work is done.
+        """
+        pass
+
     def getStats(self):
         return None
 
@@ -56,9 +69,15 @@ def _get_errors(ex):
 TASK_JOB = 0
 TASK_JOB_BATCH = 1
 TASK_END = 2
+TASK_UPDATE = 3
+TASK_REPORT = 4
 _TASK_ABORT_WORKER = 10
 _CRITICAL_WORKER_ERROR = 11
 
+SCHEDULER_QUEUE = 'queue'
+SCHEDULER_STEALING = 'stealing'
+SCHEDULERS = [SCHEDULER_QUEUE, SCHEDULER_STEALING]
+
 
 def worker_func(params):
     if params.is_profiling:
@@ -86,7 +105,7 @@ def _real_worker_func(params):
         logger.exception(ex)
         msg = ("CRITICAL ERROR IN WORKER %d\n%s" % (params.wid, str(ex)))
         params.outqueue.put((
-            _CRITICAL_WORKER_ERROR, None, False, params.wid, msg))
+            _CRITICAL_WORKER_ERROR, params.wid, [(None, msg, False)], 0))
 
 
 def _pre_parse_pytest_args():
@@ -184,6 +203,7 @@ def _real_worker_func_unsafe(params):
 
             result_list = []
 
+            process_start_time = time.perf_counter()
             for td in task_data_list:
                 try:
                     worker_res = w.process(td)
@@ -195,31 +215,46 @@ def _real_worker_func_unsafe(params):
                     error_res = _get_worker_exception_data(wid)
                     result_list.append((td, error_res, False))
 
-            res = (task_type, wid, result_list)
+            process_time = time.perf_counter() - process_start_time
+            res = (task_type, wid, result_list, process_time)
             put_start_time = time.perf_counter()
             put(res)
             time_in_put += (time.perf_counter() - put_start_time)
 
             completed += len(task_data_list)
 
-        # End task... gather stats to send back to the main process.
-        elif task_type == TASK_END:
-            logger.debug("Worker %d got end task, exiting." % wid)
-            stats.registerTimer('Worker_%d_TaskGet' % wid, time=time_in_get)
-            stats.registerTimer('Worker_all_TaskGet', time=time_in_get)
-            stats.registerTimer('Worker_%d_ResultPut' % wid, time=time_in_put)
-            stats.registerTimer('Worker_all_ResultPut', time=time_in_put)
+        # Update task... let the worker know it's being reused.
+        elif task_type == TASK_UPDATE:
+            logger.debug("Worker %d got update task." % wid)
             try:
-                stats.mergeStats(w.getStats())
-                stats_data = stats.toData()
-                rep = (task_type, wid, [(task_data, (wid, stats_data), True)])
+                w.update(task_data)
+                rep = (task_type, wid, [(None, (wid, None), True)], 0)
             except Exception as e:
                 logger.debug(
-                    "Error getting report, sending exception to main process:")
+                    "Error updating worker, sending exception to main "
+                    "process:")
                 logger.debug(traceback.format_exc())
                 we = _get_worker_exception_data(wid)
-                rep = (task_type, wid, [(task_data, (wid, we), False)])
+                rep = (task_type, wid, [(None, (wid, we), False)], 0)
             put(rep)
+            _wait_for_other_workers(params)
+
+        # Report task... gather stats to send back to the main process,
+        # and start counting from zero again.
+        elif task_type == TASK_REPORT:
+            logger.debug("Worker %d got report task." % wid)
+            put(_make_worker_report(
+                w, wid, task_type, stats, time_in_get, time_in_put))
+            stats = ExecutionStats()
+            time_in_get = 0
+            time_in_put = 0
+            _wait_for_other_workers(params)
+
+        # End task... gather stats to send back to the main process.
+        elif task_type == TASK_END:
+            logger.debug("Worker %d got end task, exiting." % wid)
+            put(_make_worker_report(
+                w, wid, task_type, stats, time_in_get, time_in_put))
             break
 
         # Emergy abort.
@@ -240,12 +275,44 @@ def _real_worker_func_unsafe(params):
     logger.debug("Worker %d completed %d tasks." % (wid, completed))
 
 
+def _make_worker_report(w, wid, task_type, stats, time_in_get, time_in_put):
+    stats.registerTimer('Worker_%d_TaskGet' % wid, time=time_in_get)
+    stats.registerTimer('Worker_all_TaskGet', time=time_in_get)
+    stats.registerTimer('Worker_%d_ResultPut' % wid, time=time_in_put)
+    stats.registerTimer('Worker_all_ResultPut', time=time_in_put)
+    try:
+        w.flush()
+        stats.mergeStats(w.getStats())
+        stats_data = stats.toData()
+        return (task_type, wid, [(None, (wid, stats_data), True)], 0)
+    except Exception as e:
+        logger.debug(
+            "Error getting report, sending exception to main process:")
+        logger.debug(traceback.format_exc())
+        we = _get_worker_exception_data(wid)
+        return (task_type, wid, [(None, (wid, we), False)], 0)
+
+
+def _wait_for_other_workers(params):
+    # When all workers share the same task queue, the master process sends
+    # one copy of a broadcast task per worker. Don't go back to the queue
+    # until everybody got theirs, otherwise we could get a second copy.
+    if params.barrier is None:
+        return
+    try:
+        params.barrier.wait()
+    except threading.BrokenBarrierError:
+        logger.error("Worker %d couldn't wait for other workers." %
+                     params.wid)
+
+
 class _WorkerParams:
     def __init__(self, wid, inqueue, outqueue, worker_class, initargs=(),
-                 is_profiling=False, is_unit_testing=False):
+                 barrier=None, is_profiling=False, is_unit_testing=False):
         self.wid = wid
         self.inqueue = inqueue
         self.outqueue = outqueue
+        self.barrier = barrier
         self.worker_class = worker_class
         self.initargs = initargs
         self.is_profiling = is_profiling
@@ -256,7 +323,7 @@ class WorkerPool:
     def __init__(self, worker_class, initargs=(), *,
                  callback=None, error_callback=None,
                  worker_count=None, batch_size=None,
-                 userdata=None):
+                 scheduler=None, userdata=None):
         init_start_time = time.perf_counter()
 
         stats = ExecutionStats()
@@ -269,16 +336,27 @@ class WorkerPool:
 
         worker_count = worker_count or os.cpu_count() or 1
 
-        if use_fastqueue:
-            self._task_queue = FastQueue()
-            self._result_queue = FastQueue()
-            self._quick_put = self._task_queue.put
-            self._quick_get = self._result_queue.get
+        scheduler = scheduler or SCHEDULER_QUEUE
+        if scheduler not in SCHEDULERS:
+            raise Exception("No such worker pool scheduler: %s" % scheduler)
+
+        # With the default scheduler, all workers pull jobs from the same
+        # queue. With the work-stealing scheduler, each worker gets its own
+        # queue, which the scheduler feeds from the master process.
+        if scheduler == SCHEDULER_STEALING:
+            self._task_queues = [_make_queue() for _ in range(worker_count)]
+            self._task_queue = None
+            self._barrier = None
         else:
-            self._task_queue = multiprocessing.SimpleQueue()
-            self._result_queue = multiprocessing.SimpleQueue()
+            self._task_queue = _make_queue()
+            self._task_queues = [self._task_queue] * worker_count
+            self._barrier = multiprocessing.Barrier(worker_count)
+        self._result_queue = _make_queue()
+        self._quick_get = self._result_queue.get
+        if self._task_queue is not None:
             self._quick_put = self._task_queue.put
-            self._quick_get = self._result_queue.get
+        else:
+            self._quick_put = None
 
         self._callback = callback
         self._error_callback = error_callback
@@ -299,8 +377,9 @@ class WorkerPool:
         self._pool = []
         for i in range(worker_count):
             worker_params = _WorkerParams(
-                i, self._task_queue, self._result_queue,
+                i, self._task_queues[i], self._result_queue,
                 worker_class, initargs,
+                barrier=self._barrier,
                 is_profiling=is_profiling,
                 is_unit_testing=is_unit_testing)
             w = multiprocessing.Process(target=worker_func,
@@ -316,12 +395,38 @@ class WorkerPool:
         self._result_handler.daemon = True
         self._result_handler.start()
 
+        self._scheduler = None
+        if scheduler == SCHEDULER_STEALING:
+            self._scheduler = _WorkStealingScheduler(
+                self._task_queues, stats, max_batch_size=batch_size)
+            self._scheduler.start()
+
         stats.stepTimerSince('MasterInit', init_start_time)
 
     @property
     def pool_size(self):
         return len(self._pool)
 
+    @property
+    def is_reusable(self):
+        """ Returns whether this pool can be given another batch of jobs
+            after the previous one, i.e. it's still open, it's done with
+            all its jobs, and none of its workers have died.
+        """
+        return (not self._closed and
+                self._jobs_left == 0 and
+                self._event.is_set() and
+                all(map(lambda w: w is not None, self._pool)))
+
+    def setCallbacks(self, callback=None, error_callback=None,
+                     userdata=None):
+        """ Changes the callbacks for job results, so that the pool can be
+            reused for another batch of jobs by some other owner.
+        """
+        self._callback = callback
+        self._error_callback = error_callback
+        self.userdata = userdata
+
     def queueJobs(self, jobs):
         if self._closed:
             if self._error_on_join:
@@ -338,7 +443,9 @@ class WorkerPool:
 
             self._event.clear()
             bs = self._batch_size
-            if not bs:
+            if self._scheduler is not None:
+                self._scheduler.addJobs(jobs)
+            elif not bs:
                 for job in jobs:
                     self._quick_put((TASK_JOB, job))
             else:
@@ -365,22 +472,49 @@ class WorkerPool:
             raise self._error_on_join
         return ret
 
+    def updateWorkers(self, data):
+        """ Sends the given data to the `update` method of every worker, and
+            waits until they're all done with it.
+        """
+        handler = self._broadcast(TASK_UPDATE, data, _BroadcastHandler)
+        if handler.errors:
+            raise Exception(
+                "Some workers failed to update:\n%s" %
+                '\n'.join([we['value'] for we in handler.errors]))
+
+    def getReports(self):
+        """ Gets stats from the workers without closing the pool. Counting
+            starts again from zero afterwards, both for the workers and
+            for the pool itself.
+        """
+        handler = self._broadcast(TASK_REPORT, None, _ReportHandler)
+
+        stats = ExecutionStats()
+        stats.mergeStats(self._stats)
+        stats.registerTimer('MasterTaskPut', time=self._time_in_put,
+                            raise_if_registered=False)
+        stats.registerTimer('MasterResultGet', time=self._time_in_get,
+                            raise_if_registered=False)
+        self._stats.clear()
+        self._time_in_put = 0
+        self._time_in_get = 0
+
+        return [stats] + handler.reports
+
     def close(self):
-        if self._closed:
-            raise Exception("This worker pool has been closed.")
-        if self._jobs_left > 0:
-            raise Exception("A previous job queue has not finished yet.")
-        if not self._event.is_set():
-            raise Exception("A previous job queue hasn't been cleared.")
+        self._checkIsIdle()
 
         close_start_time = time.perf_counter()
         logger.debug("Closing worker pool...")
         live_workers = list(filter(lambda w: w is not None, self._pool))
-        handler = _ReportHandler(len(live_workers))
+        handler = _ReportHandler(len(self._pool), len(live_workers))
         self._callback = handler._handle
         self._error_callback = handler._handleError
-        for w in live_workers:
-            self._quick_put((TASK_END, None))
+        if self._scheduler is not None:
+            self._scheduler.stop()
+        for wid, w in enumerate(self._pool):
+            if w is not None:
+                self._task_queues[wid].put((TASK_END, None))
         for w in live_workers:
             w.join()
 
@@ -404,11 +538,59 @@ class WorkerPool:
 
         return [stats] + handler.reports
 
+    def terminate(self):
+        """ Kills all the workers without waiting for them to be done, or
+            for their reports.
+        """
+        logger.debug("Terminating worker pool...")
+        if self._scheduler is not None:
+            self._scheduler.stop()
+        for w in self._pool:
+            if w is not None:
+                w.terminate()
+                w.join()
+        self._result_queue.put(None)
+        self._result_handler.join()
+        self._closed = True
+
+    def _checkIsIdle(self):
+        if self._closed:
+            raise Exception("This worker pool has been closed.")
+        if self._jobs_left > 0:
+            raise Exception("A previous job queue has not finished yet.")
+        if not self._event.is_set():
+            raise Exception("A previous job queue hasn't been cleared.")
+
+    def _broadcast(self, task_type, task_data, handler_class):
+        self._checkIsIdle()
+
+        live_wids = [i for i, w in enumerate(self._pool) if w is not None]
+        if self._barrier is not None and len(live_wids) < len(self._pool):
+            # Some workers would wait forever for the dead ones.
+            raise Exception("Can't send tasks to all workers, some of them "
+                            "have died.")
+
+        handler = handler_class(len(self._pool), len(live_wids))
+        callback, error_callback = self._callback, self._error_callback
+        self._callback = handler._handle
+        self._error_callback = handler._handleError
+        try:
+            for wid in live_wids:
+                self._task_queues[wid].put((task_type, task_data))
+            handler.wait()
+        finally:
+            self._callback = callback
+            self._error_callback = error_callback
+        return handler
+
     def _onResultHandlerCriticalError(self, wid):
         logger.error("Result handler received a critical error from "
                      "worker %d." % wid)
+        lost_jobs = []
         with self._lock_workers:
             self._pool[wid] = None
+            if self._scheduler is not None:
+                lost_jobs = self._scheduler.removeWorker(wid)
             if all(map(lambda w: w is None, self._pool)):
                 logger.error("All workers have died!")
                 self._closed = True
@@ -416,6 +598,19 @@ class WorkerPool:
                 self._event.set()
                 return False
 
+        # The jobs the worker was processing when it died are failed, since
+        # they might be what killed it.
+        if lost_jobs:
+            msg = "Worker %d died while processing this job." % wid
+            exc_data = {'wid': wid, 'type': 'WorkerDied', 'value': msg,
+                        'traceback': msg}
+            for job in lost_jobs:
+                if self._error_callback:
+                    self._error_callback(job, exc_data, self.userdata)
+                else:
+                    logger.error(msg)
+            self._onTaskDone(len(lost_jobs))
+
         return True
 
     def _onTaskDone(self, done_count):
@@ -428,7 +623,6 @@ class WorkerPool:
 
     @staticmethod
     def _handleResults(pool):
-        userdata = pool.userdata
         while True:
             try:
                 get_start_time = time.perf_counter()
@@ -443,13 +637,13 @@ class WorkerPool:
                 logger.debug("Result handler exiting.")
                 return
 
-            task_type, wid, res_data_list = res
+            task_type, wid, res_data_list, process_time = res
             for res_data in res_data_list:
                 try:
                     task_data, data, success = res_data
                     if success:
                         if pool._callback:
-                            pool._callback(task_data, data, userdata)
+                            pool._callback(task_data, data, pool.userdata)
                     else:
                         if task_type == _CRITICAL_WORKER_ERROR:
                             logger.error(data)
@@ -459,7 +653,8 @@ class WorkerPool:
                                 return
                         else:
                             if pool._error_callback:
-                                pool._error_callback(task_data, data, userdata)
+                                pool._error_callback(
+                                    task_data, data, pool.userdata)
                             else:
                                 logger.error(
                                     "Worker %d failed to process a job:" % wid)
@@ -468,38 +663,254 @@ class WorkerPool:
                     logger.exception(ex)
 
             if task_type == TASK_JOB or task_type == TASK_JOB_BATCH:
+                if pool._scheduler is not None:
+                    pool._scheduler.onBatchDone(
+                        wid, len(res_data_list), process_time)
                 pool._onTaskDone(len(res_data_list))
 
 
-class _ReportHandler:
-    def __init__(self, worker_count):
+class _WorkStealingScheduler:
+    """ A scheduler that keeps one job deque per worker in the master
+        process. Each worker is fed batches from its own deque, and when
+        that deque is empty, it steals jobs from the tail of the busiest
+        other deque. Batch sizes adapt to the observed cost of jobs, and
+        get smaller as the pass nears completion so that a few expensive
+        jobs don't hold up whole batches at the end.
+    """
+    MAX_BATCHES_IN_FLIGHT = 2
+    TARGET_BATCH_TIME = 0.05
+    JOB_COST_SMOOTHING = 0.2
+
+    def __init__(self, task_queues, stats, *, max_batch_size=None):
+        worker_count = len(task_queues)
+        self._task_queues = task_queues
+        self._stats = stats
+        self._max_batch_size = max_batch_size
+        self._deques = [collections.deque() for _ in range(worker_count)]
+        # The batches sent to each worker that it didn't finish yet, in
+        # the order it will process them.
+        self._in_flight = [collections.deque() for _ in range(worker_count)]
+        self._alive = [True] * worker_count
+        self._idle = [True] * worker_count
+        self._pending = 0
+        self._next_wid = 0
+        self._job_cost = None
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._dispatcher = None
+
+        stats.registerCounter('Worker_all_Idle', raise_if_registered=False)
+        stats.registerCounter('Worker_all_Steals', raise_if_registered=False)
+        for wid in range(worker_count):
+            stats.registerCounter('Worker_%d_Idle' % wid,
+                                  raise_if_registered=False)
+            stats.registerCounter('Worker_%d_Steals' % wid,
+                                  raise_if_registered=False)
+
+    @property
+    def job_cost(self):
+        return self._job_cost
+
+    def start(self):
+        self._dispatcher = threading.Thread(
+            name='WorkStealingDispatcher',
+            target=self._dispatchLoop)
+        self._dispatcher.daemon = True
+        self._dispatcher.start()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        if self._dispatcher is not None:
+            self._dispatcher.join()
+            self._dispatcher = None
+
+    def addJobs(self, jobs):
+        # Deal the jobs round-robin, so that every deque keeps the order
+        # in which the jobs were given to us.
+        with self._cond:
+            live_wids = [i for i, a in enumerate(self._alive) if a]
+            if not live_wids:
+                raise Exception("All workers have died!")
+            for job in jobs:
+                wid = live_wids[self._next_wid % len(live_wids)]
+                self._deques[wid].append(job)
+                self._next_wid += 1
+            self._pending += len(jobs)
+            self._cond.notify()
+
+    def removeWorker(self, wid):
+        """ Stops sending jobs to a worker that died, and returns the
+            jobs it was processing at the time. The other batches that
+            were sent to it go back in its deque, where they will get
+            stolen by the other workers along with its other jobs.
+        """
+        with self._cond:
+            self._alive[wid] = False
+            in_flight = self._in_flight[wid]
+            self._in_flight[wid] = collections.deque()
+            lost_jobs = in_flight.popleft() if in_flight else []
+            while in_flight:
+                batch = in_flight.pop()
+                self._deques[wid].extendleft(reversed(batch))
+                self._pending += len(batch)
+            self._cond.notify()
+            return lost_jobs
+
+    def onBatchDone(self, wid, job_count, process_time):
+        with self._cond:
+            if self._in_flight[wid]:
+                self._in_flight[wid].popleft()
+            if job_count > 0:
+                cost = process_time / job_count
+                if self._job_cost is None:
+                    self._job_cost = cost
+                else:
+                    k = self.JOB_COST_SMOOTHING
+                    self._job_cost = (1 - k) * self._job_cost + k * cost
+            self._cond.notify()
+
+    def assignBatches(self):
+        """ Figures out which batches of jobs to send to which workers.
+            Must be called with the scheduler's lock held.
+        """
+        assignments = []
+        for wid, alive in enumerate(self._alive):
+            if not alive:
+                continue
+            while len(self._in_flight[wid]) < self.MAX_BATCHES_IN_FLIGHT:
+                batch = self._takeBatch(wid)
+                if not batch:
+                    break
+                self._in_flight[wid].append(batch)
+                assignments.append((wid, batch))
+        return assignments
+
+    def getBatchSize(self):
+        if self._job_cost is None:
+            # We don't know anything about these jobs yet, send them one
+            # by one until we get some timing information back.
+            return 1
+
+        bs = int(self.TARGET_BATCH_TIME / max(self._job_cost, 1e-6))
+        # Don't take more than a fraction of what's left for each worker,
+        # so that the end of the pass is split in smaller and smaller
+        # batches.
+        live_count = max(1, sum(self._alive))
+        bs = min(bs, self._pending // (2 * live_count))
+        if self._max_batch_size:
+            bs = min(bs, self._max_batch_size)
+        return max(1, bs)
+
+    def _takeBatch(self, wid):
+        bs = self.getBatchSize()
+
+        own = self._deques[wid]
+        if own:
+            count = min(bs, len(own))
+            batch = [own.popleft() for _ in range(count)]
+            self._pending -= count
+            self._idle[wid] = False
+            return batch
+
+        victim = max(range(len(self._deques)),
+                     key=lambda i: len(self._deques[i]))
+        victim_deque = self._deques[victim]
+        if not victim_deque:
+            # Nothing to do anywhere. Only count it as idle time if other
+            # workers are still busy.
+            if (not self._in_flight[wid] and not self._idle[wid] and
+                    any(self._in_flight)):
+                self._stats.stepCounter('Worker_%d_Idle' % wid)
+                self._stats.stepCounter('Worker_all_Idle')
+            if not self._in_flight[wid]:
+                self._idle[wid] = True
+            return None
+
+        # Steal from the tail of the victim's deque, and never more than
+        # half of it.
+        count = min(bs, (len(victim_deque) + 1) // 2)
+        batch = [victim_deque.pop() for _ in range(count)]
+        batch.reverse()
+        self._pending -= count
+        self._idle[wid] = False
+        self._stats.stepCounter('Worker_%d_Steals' % wid, count)
+        self._stats.stepCounter('Worker_all_Steals', count)
+        return batch
+
+    def _dispatchLoop(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._stopped:
+                        return
+                    assignments = self.assignBatches()
+                    if assignments:
+                        break
+                    self._cond.wait()
+
+            # Send the jobs outside of the lock, since writing to a worker's
+            # queue can block until that worker is ready to read.
+            for wid, batch in assignments:
+                self._task_queues[wid].put((TASK_JOB_BATCH, batch))
+
+
+class _BroadcastHandler:
+    def __init__(self, worker_count, expected_count=None):
         self.reports = [None] * worker_count
+        self.errors = []
         self._count = worker_count
+        self._expected = (expected_count if expected_count is not None
+                          else worker_count)
         self._received = 0
         self._lock = threading.Lock()
         self._event = threading.Event()
+        if self._expected == 0:
+            self._event.set()
 
     def wait(self, timeout=None):
         return self._event.wait(timeout)
 
+    def _makeReport(self, data):
+        return data
+
     def _handle(self, job, res, _):
         wid, data = res
-        if wid < 0 or wid > self._count:
+        if wid < 0 or wid >= self._count:
             logger.error("Ignoring report from unknown worker %d." % wid)
             return
 
-        stats = ExecutionStats()
-        stats.fromData(data)
+        report = self._makeReport(data)
 
         with self._lock:
-            self.reports[wid] = stats
-            self._received += 1
-            if self._received == self._count:
-                self._event.set()
+            self.reports[wid] = report
+            self._onReceived()
 
     def _handleError(self, job, res, _):
         logger.error("Worker %d failed to send its report." % res[0])
         logger.error(res)
+        with self._lock:
+            self.errors.append(res[1])
+            self._onReceived()
+
+    def _onReceived(self):
+        self._received += 1
+        if self._received == self._expected:
+            self._event.set()
+
+
+class _ReportHandler(_BroadcastHandler):
+    def _makeReport(self, data):
+        stats = ExecutionStats()
+        stats.fromData(data)
+        return stats
+
+
+def _make_queue():
+    if use_fastqueue:
+        return FastQueue()
+    return multiprocessing.SimpleQueue()
 
 
 class FastQueue:
@@ -1,4 +1,5 @@
 import io
+import re
 import sys
 import time
 import pprint
@@ -535,10 +536,37 @@ def _compare_lists(left, right, ctx):
     return None
 
 
+re_file_time_iso8601 = re.compile(r'%file_time_iso8601:([^%]+)%')
+re_local_time_iso8601 = re.compile(r'%local_time_iso8601:([^%]+)%')
+
+
+def _replace_time_patterns(text):
+    # `%file_time_iso8601:<path>%` is the modification time of a file
+    # relative to the repository root, while `%local_time_iso8601:<time>%`
+    # is the given local time. Both are printed as UTC.
+    def _repl_file_time(m):
+        path = os.path.join(os.path.dirname(os.path.dirname(__file__)),
+                            m.group(1))
+        return time.strftime('%Y-%m-%dT%H:%M:%SZ',
+                             time.gmtime(os.path.getmtime(path)))
+
+    def _repl_local_time(m):
+        t = time.mktime(time.strptime(m.group(1), '%Y-%m-%d %H:%M:%S'))
+        return time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(t))
+
+    text = re_file_time_iso8601.sub(_repl_file_time, text)
+    text = re_local_time_iso8601.sub(_repl_local_time, text)
+    return text
+
+
 def _compare_str(left, right, ctx):
     if left == right:
         return None
 
+    left = _replace_time_patterns(left)
+    if left == right:
+        return None
+
     test_time_iso8601 = time.strftime('%Y-%m-%dT%H:%M:%SZ',
                                       time.gmtime(ctx.time))
     test_time_iso8601_pattern = '%test_time_iso8601%'
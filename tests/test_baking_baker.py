@@ -1,4 +1,6 @@
+import os
 import time
+import pytest
 from .mockutil import get_mock_app, mock_fs, mock_fs_scope
 
 
@@ -111,3 +113,667 @@ def test_bake_four_times_again():
         assert structure['2017']['01']['01']['first.html'] == 'something 1'
         assert structure['2017']['01']['02']['second.html'] == 'something 2'
 
+
+def test_bake_with_stealing_scheduler():
+    fs = (mock_fs()
+          .withConfig({'baker': {'scheduler': 'stealing'}})
+          .withPage('pages/_index.html', {'layout': 'none', 'format': 'none'},
+                    "{% for p in pagination.posts -%}\n"
+                    "{{p.title}}\n"
+                    "{% endfor %}")
+          .withPages(8, 'posts/2017-01-0{idx1}_post{idx1}.html',
+                     lambda i: {'title': "Post %d" % (i + 1)}))
+    with mock_fs_scope(fs):
+        fs.runChef('bake')
+        structure = fs.getStructure('kitchen/_counter')
+        assert structure['index.html'] == (
+            'Post 8\nPost 7\nPost 6\nPost 5\nPost 4\n')
+        assert len(structure['2017']['01']) == 8
+
+
+@pytest.mark.parametrize('scheduler', ['queue', 'stealing'])
+def test_bake_with_persistent_worker_pool(scheduler):
+    from piecrust.app import PieCrustFactory
+    from piecrust.baking.baker import Baker, PersistentWorkerPool
+
+    fs = (mock_fs()
+          .withConfig({'baker': {'workers': 2, 'scheduler': scheduler}})
+          .withPage('pages/_index.html', {'layout': 'none', 'format': 'none'},
+                    "{% for p in pagination.posts -%}\n"
+                    "{{p.title}} : {{p.content}}\n"
+                    "{% endfor %}")
+          .withPage('posts/2017-01-01_first.html',
+                    {'title': "First", 'layout': 'none', 'format': 'none'},
+                    "something 1"))
+    with mock_fs_scope(fs):
+        appfactory = PieCrustFactory(fs.path('kitchen'))
+        out_dir = fs.path('kitchen/_counter')
+        worker_pool = PersistentWorkerPool()
+        try:
+            app = appfactory.create()
+            records = Baker(appfactory, app, out_dir,
+                            worker_pool=worker_pool).bake()
+            assert records.success
+            assert worker_pool.is_running
+            pool = worker_pool.getPool((2, None, scheduler))
+            structure = fs.getStructure('kitchen/_counter')
+            assert structure['index.html'] == 'First : something 1\n'
+
+            time.sleep(1)
+            fs.withPage('posts/2017-01-01_first.html',
+                        {'title': "First", 'layout': 'none',
+                         'format': 'none'},
+                        "something else")
+            fs.withPage('posts/2017-01-02_second.html',
+                        {'title': "Second", 'layout': 'none',
+                         'format': 'none'},
+                        "something 2")
+            changed_paths = [
+                fs.path('kitchen/posts/2017-01-01_first.html'),
+                fs.path('kitchen/posts/2017-01-02_second.html')]
+            # Use a new app so that the cache is valid this time, and
+            # workers don't just start from scratch.
+            app = appfactory.create()
+            records = Baker(appfactory, app, out_dir,
+                            worker_pool=worker_pool,
+                            changed_paths=changed_paths).bake()
+            assert records.success
+            assert worker_pool.getPool((2, None, scheduler)) is pool
+            structure = fs.getStructure('kitchen/_counter')
+            assert structure['index.html'] == (
+                'Second : something 2\nFirst : something else\n')
+            assert (structure['2017']['01']['01']['first.html'] ==
+                    'something else')
+        finally:
+            worker_pool.close()
+        assert not worker_pool.is_running
+
+
+def test_bake_worker_shuts_pipelines_down_once_per_bake(monkeypatch):
+    from piecrust.app import PieCrustFactory
+    from piecrust.baking.worker import BakeWorker, BakeWorkerContext
+    from piecrust.pipelines.base import PipelineManager
+
+    calls = []
+    shutdown_pipelines = PipelineManager.shutdownPipelines
+
+    def _counting_shutdown(self):
+        calls.append(self)
+        shutdown_pipelines(self)
+
+    monkeypatch.setattr(PipelineManager, 'shutdownPipelines',
+                        _counting_shutdown)
+
+    fs = (mock_fs()
+          .withConfig()
+          .withPage('pages/foo.md', {'layout': 'none', 'format': 'none'},
+                    "Foo"))
+    with mock_fs_scope(fs):
+        ctx = BakeWorkerContext(PieCrustFactory(fs.path('kitchen')),
+                                fs.path('kitchen/_counter'))
+        worker = BakeWorker(ctx)
+        worker.wid = 0
+        worker.initialize()
+
+        # Reporting flushes the worker, and the pool may report again
+        # when it ends.
+        worker.flush()
+        worker.flush()
+        assert len(calls) == 1
+
+        # Updating the worker for the next bake doesn't shut down the
+        # same pipelines again, but creates new ones.
+        worker.update((ctx, []))
+        assert len(calls) == 1
+        worker.flush()
+        worker.shutdown()
+        assert len(calls) == 2
+        assert calls[0] is not calls[1]
+
+
+def test_bake_with_digest_change_detection():
+    import os
+    import os.path
+
+    fs = (mock_fs()
+          .withConfig({'baker': {'change_detection': 'digest'}})
+          .withPage('pages/_index.html', {'layout': 'none', 'format': 'none'},
+                    "{% for p in pagination.posts -%}\n"
+                    "{{p.title}}\n"
+                    "{% endfor %}")
+          .withPage('posts/2017-01-01_first.html',
+                    {'title': "First", 'layout': 'none', 'format': 'none'},
+                    "something 1")
+          .withPage('posts/2017-01-02_second.html',
+                    {'title': "Second", 'layout': 'none', 'format': 'none'},
+                    "something 2"))
+
+    def _touch_sources(future):
+        for name in ['config.yml', 'pages', 'posts']:
+            path = fs.path('kitchen/%s' % name)
+            paths = [path]
+            for dpath, _, filenames in os.walk(path):
+                paths += [os.path.join(dpath, fn) for fn in filenames]
+            for p in paths:
+                os.utime(p, (future, future))
+
+    def _get_out_mtimes():
+        return {
+            p: os.path.getmtime(fs.path('kitchen/_counter/%s' % p))
+            for p in ['index.html', '2017/01/01/first.html',
+                      '2017/01/02/second.html']}
+
+    with mock_fs_scope(fs):
+        fs.runChef('bake')
+        mtimes = _get_out_mtimes()
+
+        # Pretend we just checked out the same files again.
+        time.sleep(1)
+        _touch_sources(time.time() + 1)
+        time.sleep(1)
+        fs.runChef('bake')
+        assert _get_out_mtimes() == mtimes
+
+        # Now really change something.
+        fs.withPage('posts/2017-01-02_second.html',
+                    {'title': "Second", 'layout': 'none', 'format': 'none'},
+                    "something else")
+        time.sleep(1)
+        fs.runChef('bake')
+        new_mtimes = _get_out_mtimes()
+        assert new_mtimes['2017/01/01/first.html'] == \
+            mtimes['2017/01/01/first.html']
+        assert new_mtimes['2017/01/02/second.html'] > \
+            mtimes['2017/01/02/second.html']
+        structure = fs.getStructure('kitchen/_counter')
+        assert structure['2017']['01']['02']['second.html'] == \
+            'something else'
+
+
+def test_bake_skips_unchanged_outputs():
+    import os.path
+
+    fs = (mock_fs()
+          .withConfig()
+          .withPage('pages/_index.html', {'layout': 'none', 'format': 'none'},
+                    "{% for p in pagination.posts -%}\n"
+                    "{{p.title}}\n"
+                    "{% endfor %}")
+          .withPage('posts/2017-01-01_first.html',
+                    {'title': "First", 'layout': 'none', 'format': 'none'},
+                    "something 1"))
+    with mock_fs_scope(fs):
+        fs.runChef('bake')
+        index_path = fs.path('kitchen/_counter/index.html')
+        post_path = fs.path('kitchen/_counter/2017/01/01/first.html')
+        index_mtime = os.path.getmtime(index_path)
+        post_mtime = os.path.getmtime(post_path)
+
+        # The index page gets re-rendered because the post changed, but
+        # it still renders the same thing.
+        time.sleep(1)
+        fs.withPage('posts/2017-01-01_first.html',
+                    {'title': "First", 'layout': 'none', 'format': 'none'},
+                    "something else")
+        fs.runChef('bake')
+        assert os.path.getmtime(index_path) == index_mtime
+        assert os.path.getmtime(post_path) > post_mtime
+        structure = fs.getStructure('kitchen/_counter')
+        assert structure['index.html'] == 'First\n'
+        assert structure['2017']['01']['01']['first.html'] == \
+            'something else'
+
+
+def test_bake_doesnt_rebake_unchanged_outputs_again():
+    import os.path
+    from piecrust.app import PieCrustFactory
+    from piecrust.baking.baker import Baker
+    from piecrust.pipelines._pagerecords import SubPageFlags
+
+    fs = (mock_fs()
+          .withConfig({'site': {'posts_per_page': 2}})
+          .withPage('pages/_index.html', {'layout': 'idx', 'format': 'none'},
+                    "Index")
+          .withPages(4, 'posts/2017-01-0{idx1}_post{idx1}.html',
+                     lambda i: {'title': "Post %d" % (i + 1),
+                                'layout': 'none', 'format': 'none'},
+                     lambda i: "something %d" % (i + 1))
+          .withFile('kitchen/templates/idx.html',
+                    "{{content}}\n"
+                    "{% for p in pagination.posts -%}\n"
+                    "{{p.title}} : {{p.content}}\n"
+                    "{% endfor %}"))
+    with mock_fs_scope(fs):
+        appfactory = PieCrustFactory(fs.path('kitchen'))
+        out_dir = fs.path('kitchen/_counter')
+        index_path = fs.path('kitchen/pages/_index.html')
+        out_path = fs.path('kitchen/_counter/2.html')
+        Baker(appfactory, appfactory.create(), out_dir).bake()
+        out_mtime = os.path.getmtime(out_path)
+
+        def _get_sub_flags(records):
+            entry = records.getRecord('pages@page').getEntry(index_path)
+            return [s['flags'] for s in entry.subs]
+
+        # Changing the index page in a way that doesn't change what it
+        # renders bakes it again, but the outputs aren't written.
+        time.sleep(1)
+        fs.withPage('pages/_index.html', {'layout': 'idx', 'format': 'none',
+                                          'unused': "something"},
+                    "Index")
+        records = Baker(appfactory, appfactory.create(), out_dir).bake()
+        flags = _get_sub_flags(records)
+        assert flags[1] & SubPageFlags.FLAG_UNCHANGED_OUTPUT
+        assert os.path.getmtime(out_path) == out_mtime
+
+        # The second index page is now older than its source, but we know
+        # it's still up to date when the first one gets re-baked.
+        time.sleep(1)
+        fs.withPage('posts/2017-01-04_post4.html',
+                    {'title': "Post 4", 'layout': 'none', 'format': 'none'},
+                    "something else")
+        records = Baker(appfactory, appfactory.create(), out_dir).bake()
+        flags = _get_sub_flags(records)
+        assert flags[0] & SubPageFlags.FLAG_BAKED
+        assert flags[1] == SubPageFlags.FLAG_COLLAPSED_FROM_LAST_RUN
+        structure = fs.getStructure('kitchen/_counter')
+        assert structure['index.html'] == (
+            'Index\nPost 4 : something else\nPost 3 : something 3\n')
+
+
+def test_bake_with_several_writer_threads():
+    fs = (mock_fs()
+          .withConfig({'baker': {'writer_threads': 3,
+                                 'writer_queue_size': 1}})
+          .withPage('pages/_index.html', {'layout': 'none', 'format': 'none'},
+                    "{% for p in pagination.posts -%}\n"
+                    "{{p.title}}\n"
+                    "{% endfor %}")
+          .withPages(8, 'posts/2017-01-0{idx1}_post{idx1}.html',
+                     lambda i: {'title': "Post %d" % (i + 1),
+                                'layout': 'none', 'format': 'none'}))
+    with mock_fs_scope(fs):
+        fs.runChef('bake')
+        structure = fs.getStructure('kitchen/_counter')
+        assert structure['index.html'] == (
+            'Post 8\nPost 7\nPost 6\nPost 5\nPost 4\n')
+        assert len(structure['2017']['01']) == 8
+        assert structure['2.html'] == 'Post 3\nPost 2\nPost 1\n'
+
+
+def test_bake_fails_when_writing_a_page_fails():
+    import mock
+    from piecrust.app import PieCrustFactory
+    from piecrust.baking.baker import Baker
+    from piecrust.pipelines._pagerecords import SubPageFlags
+
+    fs = (mock_fs()
+          .withConfig()
+          .withPage('pages/foo.html', {'layout': 'none', 'format': 'none'},
+                    "FOO")
+          .withPage('pages/bar.html', {'layout': 'none', 'format': 'none'},
+                    "BAR"))
+
+    orig_replace = os.replace
+
+    def _failing_replace(src, dst):
+        if os.path.basename(dst) == 'bar.html':
+            raise OSError("Disk is full")
+        orig_replace(src, dst)
+
+    with mock_fs_scope(fs):
+        appfactory = PieCrustFactory(fs.path('kitchen'))
+        out_dir = fs.path('kitchen/_counter')
+        records = Baker(appfactory, appfactory.create(), out_dir).bake()
+        assert records.success
+
+        time.sleep(1)
+        fs.withPage('pages/bar.html', {'layout': 'none', 'format': 'none'},
+                    "NEW BAR")
+        with mock.patch('os.replace', _failing_replace):
+            records = Baker(appfactory, appfactory.create(), out_dir).bake()
+        assert not records.success
+        rec = records.getRecord('pages@page')
+        assert not rec.success
+        assert rec.getEntry(fs.path('kitchen/pages/foo.html')).success
+        bar_entry = rec.getEntry(fs.path('kitchen/pages/bar.html'))
+        assert not bar_entry.success
+        assert 'Disk is full' in bar_entry.errors[0]
+        assert 'Disk is full' in bar_entry.subs[0]['errors'][0]
+
+        # The previous output is left alone.
+        structure = fs.getStructure('kitchen/_counter')
+        assert sorted(structure.keys()) == [
+            'bar.html', 'foo.html', 'index.html']
+        assert structure['bar.html'] == 'BAR'
+
+        # The page is written again on the next bake.
+        records = Baker(appfactory, appfactory.create(), out_dir).bake()
+        assert records.success
+        bar_entry = records.getRecord('pages@page').getEntry(
+            fs.path('kitchen/pages/bar.html'))
+        assert (bar_entry.subs[0]['flags'] &
+                SubPageFlags.FLAG_FORCED_BY_PREVIOUS_ERRORS)
+        structure = fs.getStructure('kitchen/_counter')
+        assert structure['bar.html'] == 'NEW BAR'
+
+
+def test_bake_only_rerenders_pages_using_changed_items():
+    from piecrust.app import PieCrustFactory
+    from piecrust.baking.baker import Baker
+    from piecrust.pipelines._pagerecords import SubPageFlags
+
+    fs = (mock_fs()
+          .withConfig({'site': {'posts_per_page': 2}})
+          .withPage('pages/_index.html', {'layout': 'none', 'format': 'none'},
+                    "{% for p in pagination.posts -%}\n"
+                    "{{p.title}} : {{p.content}}\n"
+                    "{% endfor %}")
+          .withPages(5, 'posts/2017-01-0{idx1}_post{idx1}.html',
+                     lambda i: {'title': "Post %d" % (i + 1),
+                                'layout': 'none', 'format': 'none'},
+                     lambda i: "something %d" % (i + 1)))
+    with mock_fs_scope(fs):
+        appfactory = PieCrustFactory(fs.path('kitchen'))
+        out_dir = fs.path('kitchen/_counter')
+        Baker(appfactory, appfactory.create(), out_dir).bake()
+        structure = fs.getStructure('kitchen/_counter')
+        assert structure['index.html'] == (
+            'Post 5 : something 5\nPost 4 : something 4\n')
+        assert structure['2.html'] == (
+            'Post 3 : something 3\nPost 2 : something 2\n')
+
+        # Only the first index page shows the newest post.
+        time.sleep(1)
+        fs.withPage('posts/2017-01-05_post5.html',
+                    {'title': "Post 5", 'layout': 'none', 'format': 'none'},
+                    "something else")
+        records = Baker(appfactory, appfactory.create(), out_dir).bake()
+        structure = fs.getStructure('kitchen/_counter')
+        assert structure['index.html'] == (
+            'Post 5 : something else\nPost 4 : something 4\n')
+
+        index_entry = records.getRecord('pages@page').getEntry(
+            fs.path('kitchen/pages/_index.html'))
+        flags = [s['flags'] for s in index_entry.subs]
+        assert len(flags) == 3
+        assert flags[0] & SubPageFlags.FLAG_BAKED
+        assert flags[1] == SubPageFlags.FLAG_COLLAPSED_FROM_LAST_RUN
+        assert flags[2] == SubPageFlags.FLAG_COLLAPSED_FROM_LAST_RUN
+
+        # Adding a post changes what every index page shows.
+        time.sleep(1)
+        fs.withPage('posts/2017-01-06_post6.html',
+                    {'title': "Post 6", 'layout': 'none', 'format': 'none'},
+                    "something 6")
+        records = Baker(appfactory, appfactory.create(), out_dir).bake()
+        structure = fs.getStructure('kitchen/_counter')
+        assert structure['2.html'] == (
+            'Post 4 : something 4\nPost 3 : something 3\n')
+        assert structure['3.html'] == (
+            'Post 2 : something 2\nPost 1 : something 1\n')
+
+
+def test_bake_tag_pages_with_retagged_post():
+    fs = (mock_fs()
+          .withConfig()
+          .withPage('pages/_index.html', {'layout': 'none', 'format': 'none'},
+                    '')
+          .withPages(3, 'posts/2017-01-0{idx1}_post{idx1}.html',
+                     lambda i: {'title': "Post %d" % (i + 1),
+                                'tags': ['foo'] if i < 2 else ['bar'],
+                                'layout': 'none', 'format': 'none'},
+                     lambda i: "something %d" % (i + 1))
+          .withFile('kitchen/templates/_tag.html',
+                    "{% for p in pagination.posts %}{{p.title}}\n"
+                    "{% endfor %}"))
+    with mock_fs_scope(fs):
+        fs.runChef('bake')
+        structure = fs.getStructure('kitchen/_counter/tag')
+        assert structure['foo.html'] == 'Post 2\nPost 1\n'
+        assert structure['bar.html'] == 'Post 3\n'
+
+        time.sleep(1)
+        fs.withPage('posts/2017-01-01_post1.html',
+                    {'title': "Post 1", 'tags': ['bar'],
+                     'layout': 'none', 'format': 'none'},
+                    "something 1")
+        fs.runChef('bake')
+        structure = fs.getStructure('kitchen/_counter/tag')
+        assert structure['foo.html'] == 'Post 2\n'
+        assert structure['bar.html'] == 'Post 3\nPost 1\n'
+
+
+def test_bake_reuses_formatted_text_after_template_change():
+    from piecrust.app import PieCrustFactory
+    from piecrust.baking.baker import Baker
+
+    fs = (mock_fs()
+          .withConfig()
+          .withPage('pages/_index.html', {'layout': 'none', 'format': 'none'},
+                    '')
+          .withPages(2, 'pages/foo{idx1}.md',
+                     lambda i: {'layout': 'foo', 'format': 'markdown'},
+                     lambda i: "Some *text* %d" % (i + 1))
+          .withFile('kitchen/templates/foo.html', "[{{content}}]"))
+    with mock_fs_scope(fs):
+        appfactory = PieCrustFactory(fs.path('kitchen'))
+        out_dir = fs.path('kitchen/_counter')
+        records = Baker(appfactory, appfactory.create(), out_dir).bake()
+        assert records.stats.counters['FormatCacheMisses'] == 2
+
+        # Changing a template re-bakes the pages using it, but the Markdown
+        # texts don't need to be formatted again.
+        time.sleep(1)
+        fs.withFile('kitchen/templates/foo.html', "<{{content}}>")
+        records = Baker(appfactory, appfactory.create(), out_dir).bake()
+        assert records.stats.counters['FormatCacheMisses'] == 0
+        structure = fs.getStructure('kitchen/_counter')
+        assert structure['foo1.html'] == (
+            '<<p>Some <em>text</em> 1</p>>')
+
+
+def test_bake_prunes_unused_formatted_text():
+    from piecrust.app import PieCrustFactory
+    from piecrust.baking.baker import Baker
+    from piecrust.rendering import (
+        FORMAT_CACHE_MAX_AGE, FORMAT_CACHE_PRUNE_INTERVAL)
+
+    fs = (mock_fs()
+          .withConfig()
+          .withPage('pages/_index.html', {'layout': 'none', 'format': 'none'},
+                    '')
+          .withPage('pages/foo.md', {'layout': 'none', 'format': 'markdown'},
+                    "Some *text*"))
+
+    def _get_cache_files():
+        res = []
+        for dirpath, _, filenames in os.walk(cache_dir):
+            res += [os.path.join(dirpath, fn) for fn in filenames
+                    if fn != 'last_pruned']
+        return res
+
+    def _make_older(path, seconds):
+        mtime = os.path.getmtime(path) - seconds
+        os.utime(path, (mtime, mtime))
+
+    with mock_fs_scope(fs):
+        appfactory = PieCrustFactory(fs.path('kitchen'))
+        out_dir = fs.path('kitchen/_counter')
+        cache_dir = appfactory.create().cache.getCacheDir('formats')
+        Baker(appfactory, appfactory.create(), out_dir).bake()
+        old_files = _get_cache_files()
+        assert len(old_files) == 1
+
+        # Editing the page leaves the old formatted text in the cache.
+        time.sleep(1)
+        fs.withPage('pages/foo.md', {'layout': 'none', 'format': 'markdown'},
+                    "Some other *text*")
+        Baker(appfactory, appfactory.create(), out_dir).bake()
+        assert len(_get_cache_files()) == 2
+
+        # It gets removed once it's old enough, next time we look.
+        _make_older(old_files[0], FORMAT_CACHE_MAX_AGE + 60)
+        Baker(appfactory, appfactory.create(), out_dir).bake()
+        assert len(_get_cache_files()) == 2
+        _make_older(os.path.join(cache_dir, 'last_pruned'),
+                    FORMAT_CACHE_PRUNE_INTERVAL + 60)
+        Baker(appfactory, appfactory.create(), out_dir).bake()
+        cur_files = _get_cache_files()
+        assert len(cur_files) == 1
+        assert cur_files[0] != old_files[0]
+
+
+def test_bake_only_rebakes_pages_using_changed_templates():
+    import os.path
+    from piecrust.app import PieCrustFactory
+    from piecrust.baking.baker import Baker
+
+    fs = (mock_fs()
+          .withConfig()
+          .withPage('pages/_index.html', {'layout': 'none', 'format': 'none'},
+                    '')
+          .withPage('pages/foo.html', {'layout': 'foo', 'format': 'none'},
+                    "FOO")
+          .withPage('pages/bar.html', {'layout': 'bar', 'format': 'none'},
+                    "BAR")
+          .withPage('pages/baz.html', {'layout': 'none', 'format': 'none'},
+                    "{% include '_baz.html' %}")
+          .withFile('kitchen/templates/foo.html',
+                    "[{{content}}] {% include '_foo.html' %}")
+          .withFile('kitchen/templates/_foo.html', "foo partial")
+          .withFile('kitchen/templates/bar.html', "[{{content}}]")
+          .withFile('kitchen/templates/_baz.html', "baz partial"))
+
+    def _get_out_mtimes():
+        return {
+            p: os.path.getmtime(fs.path('kitchen/_counter/%s.html' % p))
+            for p in ['foo', 'bar', 'baz']}
+
+    with mock_fs_scope(fs):
+        appfactory = PieCrustFactory(fs.path('kitchen'))
+        out_dir = fs.path('kitchen/_counter')
+        Baker(appfactory, appfactory.create(), out_dir).bake()
+        mtimes = _get_out_mtimes()
+
+        # Changing a partial only re-bakes the page whose layout uses it.
+        time.sleep(1)
+        fs.withFile('kitchen/templates/_foo.html', "new foo partial")
+        Baker(appfactory, appfactory.create(), out_dir).bake()
+        new_mtimes = _get_out_mtimes()
+        assert new_mtimes['foo'] > mtimes['foo']
+        assert new_mtimes['bar'] == mtimes['bar']
+        assert new_mtimes['baz'] == mtimes['baz']
+        structure = fs.getStructure('kitchen/_counter')
+        assert structure['foo.html'] == '[FOO] new foo partial'
+
+        # Templates used in page contents are tracked too.
+        time.sleep(1)
+        fs.withFile('kitchen/templates/_baz.html', "new baz partial")
+        Baker(appfactory, appfactory.create(), out_dir).bake()
+        newer_mtimes = _get_out_mtimes()
+        assert newer_mtimes['foo'] == new_mtimes['foo']
+        assert newer_mtimes['bar'] == new_mtimes['bar']
+        assert newer_mtimes['baz'] > new_mtimes['baz']
+        structure = fs.getStructure('kitchen/_counter')
+        assert structure['baz.html'] == 'new baz partial'
+
+
+def test_bake_loads_unchanged_pages_from_page_store():
+    from piecrust.app import PieCrustFactory
+    from piecrust.baking.baker import Baker
+
+    fs = (mock_fs()
+          .withConfig()
+          .withPage('pages/_index.html', {'layout': 'none', 'format': 'none'},
+                    "{% for p in pagination.posts -%}\n"
+                    "{{p.title}}\n"
+                    "{% endfor %}")
+          .withPage('posts/2017-01-01_first.html', {'title': "First"},
+                    "something")
+          .withPage('posts/2017-01-02_second.html', {'title': "Second"},
+                    "something else"))
+    with mock_fs_scope(fs):
+        appfactory = PieCrustFactory(fs.path('kitchen'))
+        out_dir = fs.path('kitchen/_counter')
+        records = Baker(appfactory, appfactory.create(), out_dir).bake()
+        assert records.stats.counters['PageStoreHits'] == 0
+        assert os.path.isfile(fs.path(
+            'kitchen/_cache/default/pages/posts.store'))
+
+        time.sleep(1)
+        fs.withPage('posts/2017-01-03_third.html', {'title': "Third"},
+                    "something new")
+        records = Baker(appfactory, appfactory.create(), out_dir).bake()
+        assert records.stats.counters['PageStoreHits'] >= 3
+        structure = fs.getStructure('kitchen/_counter')
+        assert structure['index.html'] == 'Third\nSecond\nFirst\n'
+
+
+def test_bake_precompresses_outputs():
+    import gzip
+    from piecrust.app import PieCrustFactory
+    from piecrust.baking.baker import Baker
+
+    fs = (mock_fs()
+          .withConfig({'baker': {'precompress': ['gzip']}})
+          .withPage('pages/foo.html', {'layout': 'none', 'format': 'none'},
+                    "FOO" * 200)
+          .withPage('pages/bar.html', {'layout': 'none', 'format': 'none'},
+                    "BAR" * 200)
+          .withPage('pages/tiny.html', {'layout': 'none', 'format': 'none'},
+                    "TINY"))
+    with mock_fs_scope(fs):
+        appfactory = PieCrustFactory(fs.path('kitchen'))
+        out_dir = fs.path('kitchen/_counter')
+        records = Baker(appfactory, appfactory.create(), out_dir).bake()
+        gz_names = [n for n in os.listdir(out_dir) if n.endswith('.gz')]
+        assert 'foo.html.gz' in gz_names
+        assert 'bar.html.gz' in gz_names
+        assert 'tiny.html.gz' not in gz_names
+        assert (records.stats.counters['PrecompressedOutputs'] ==
+                len(gz_names))
+        with gzip.open(fs.path('kitchen/_counter/foo.html.gz'), 'rt') as fp:
+            assert fp.read() == "FOO" * 200
+
+        time.sleep(1)
+        records = Baker(appfactory, appfactory.create(), out_dir).bake()
+        assert records.stats.counters['PrecompressedOutputs'] == 0
+
+        time.sleep(1)
+        fs.withPage('pages/foo.html', {'layout': 'none', 'format': 'none'},
+                    "NEW FOO" * 200)
+        os.remove(fs.path('kitchen/pages/bar.html'))
+        records = Baker(appfactory, appfactory.create(), out_dir).bake()
+        assert records.stats.counters['PrecompressedOutputs'] == 1
+        with gzip.open(fs.path('kitchen/_counter/foo.html.gz'), 'rt') as fp:
+            assert fp.read() == "NEW FOO" * 200
+        assert not os.path.exists(fs.path('kitchen/_counter/bar.html.gz'))
+
+
+def test_bake_precompresses_outputs_after_slow_writes():
+    import mock
+    from piecrust.app import PieCrustFactory
+    from piecrust.baking.baker import Baker
+    from piecrust.pipelines._pagebaker import _PageWriter
+
+    fs = (mock_fs()
+          .withConfig({'baker': {'precompress': ['gzip']}})
+          .withPages(20, 'pages/foo{idx1}.html',
+                     lambda i: {'layout': 'none', 'format': 'none'},
+                     lambda i: "FOO %d " % (i + 1) * 100))
+
+    orig_write = _PageWriter._write
+
+    def _slow_write(self, out_path, txt):
+        time.sleep(0.05)
+        orig_write(self, out_path, txt)
+
+    with mock_fs_scope(fs):
+        appfactory = PieCrustFactory(fs.path('kitchen'))
+        out_dir = fs.path('kitchen/_counter')
+        with mock.patch.object(_PageWriter, '_write', _slow_write):
+            Baker(appfactory, appfactory.create(), out_dir).bake()
+        for i in range(20):
+            assert os.path.isfile(
+                fs.path('kitchen/_counter/foo%d.html.gz' % (i + 1)))
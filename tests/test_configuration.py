@@ -3,7 +3,7 @@ import yaml
 import pytest
 from collections import OrderedDict
 from piecrust.configuration import (
-    Configuration, ConfigurationLoader, merge_dicts,
+    Configuration, ConfigurationLoader, merge_dicts, parse_flat_yaml,
     MERGE_APPEND_LISTS, MERGE_PREPEND_LISTS, MERGE_OVERWRITE_VALUES)
 
 
@@ -181,3 +181,42 @@ time: 21:35:50
     assert type(data['time']) is int
     assert data['time'] == (21 * 60 * 60 + 35 * 60 + 50)
 
+
+@pytest.mark.parametrize('header', [
+    "title: Hello World\n",
+    "title: Hello\ndate: 2017-01-02\ntime: 12:30\n",
+    "tags: [foo, bar, 12]\nempty_tags: []\n",
+    "draft: yes\ncount: 0x1F\nratio: .5\nnothing:\nnull_value: ~\n",
+    "# Some comment\n\ntitle: C# rocks\nurl: http://example.org/foo\n",
+    "title: -foo\nnumber: -5\n",
+    "datetime: 2017-01-02 10:20:30\n",
+    "title: Windows line endings\r\nfoo: bar\r\n",
+    "on: off\n",
+    "title: first\ntitle: second\n"
+])
+def test_parse_flat_yaml(header):
+    data = parse_flat_yaml(header)
+    expected = yaml.load(header, Loader=ConfigurationLoader)
+    assert type(data) is OrderedDict
+    assert list(data.items()) == list(expected.items())
+    for k, v in data.items():
+        assert type(v) is type(expected[k])
+
+
+@pytest.mark.parametrize('header', [
+    "",
+    "# Just a comment\n",
+    "title: 'quoted'\n",
+    "title: foo # comment\n",
+    "items:\n  - a\n  - b\n",
+    "tags: [a, ]\n",
+    "tags: [a, [b]]\n",
+    "- foo\n",
+    "title: foo: bar\n",
+    "key:value\n",
+    "anchor: &foo bar\n",
+    "text: |\n  some text\n",
+    "mixed: tab\t\n\t\n"
+])
+def test_parse_flat_yaml_falls_back(header):
+    assert parse_flat_yaml(header) is None
@@ -0,0 +1,51 @@
+import os.path
+from piecrust.cache import SimpleCache
+from piecrust.pagestore import PageStore, write_page_store
+
+
+def _write_cache_file(cache, path, text, mtime):
+    cache.write(path, text)
+    os.utime(cache.getCachePath(path), (mtime, mtime))
+
+
+def test_page_store(tmpdir):
+    cache = SimpleCache(str(tmpdir))
+    _write_cache_file(cache, 'foo.json', '{"foo": 1}', 100)
+    _write_cache_file(cache, 'bar.json', '{"bar": 2}', 200)
+
+    path = os.path.join(str(tmpdir), 'test.store')
+    entries = [('foo', 'foo.json'), ('bar', 'bar.json'),
+               ('missing', 'missing.json')]
+    assert write_page_store(path, cache, entries) == 2
+
+    store = PageStore(path)
+    store.open()
+    try:
+        assert store.get('foo', 100) == '{"foo": 1}'
+        assert store.get('foo', 150) is None
+        assert store.get('bar', 150) == '{"bar": 2}'
+        assert store.get('missing', 0) is None
+    finally:
+        store.close()
+
+    # Changed or missing cache files are updated.
+    _write_cache_file(cache, 'bar.json', '{"bar": 3}', 300)
+    os.remove(cache.getCachePath('foo.json'))
+    assert write_page_store(path, cache, entries[:2]) == 1
+
+    store = PageStore(path)
+    store.open()
+    try:
+        assert store.get('foo', 0) is None
+        assert store.get('bar', 250) == '{"bar": 3}'
+    finally:
+        store.close()
+
+    # Unchanged cache files are copied from the previous store.
+    assert write_page_store(path, cache, entries[1:2]) == 1
+    store = PageStore(path)
+    store.open()
+    try:
+        assert store.get('bar', 250) == '{"bar": 3}'
+    finally:
+        store.close()
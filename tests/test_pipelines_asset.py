@@ -3,6 +3,8 @@ import os.path
 import random
 import inspect
 import pytest
+from piecrust.app import PieCrustFactory
+from piecrust.baking.baker import Baker
 from piecrust.pipelines.asset import get_filtered_processors
 from piecrust.pipelines.records import MultiRecord
 from piecrust.processing.base import SimpleFileProcessor
@@ -162,6 +164,116 @@ def test_removed():
         assert expected == fs.getStructure('counter')
 
 
+def test_dependency_dirtyness():
+    plugname = _get_test_plugin_name()
+    fs = (mock_fs()
+          .withDir('counter')
+          .withConfig({
+              'site': {'plugins': [plugname]},
+              'pipelines': {'asset': {'processors': ['foo', 'copy'],
+                                      'ignore': ['_*']}}})
+          .withFile('kitchen/assets/one.foo', 'One')
+          .withFile('kitchen/assets/two.foo', 'Two')
+          .withFile('kitchen/assets/_dep.txt', 'Dependency'))
+    src = [
+        'import os.path',
+        'from piecrust.plugins.base import PieCrustPlugin',
+        'from piecrust.processing.base import SimpleFileProcessor',
+        '',
+        'class FooProcessor(SimpleFileProcessor):',
+        '    PROCESSOR_NAME = "foo"',
+        '    def __init__(self):',
+        '        super().__init__({"foo": "bar"})',
+        '    def getDependencies(self, path):',
+        '        if os.path.basename(path) == "one.foo":',
+        '            return [os.path.join(os.path.dirname(path), "_dep.txt")]',
+        '        return None',
+        '    def _doProcess(self, in_path, out_path):',
+        '        with open(in_path, "r") as f:',
+        '            text = f.read()',
+        '        with open(out_path, "w") as f:',
+        '            f.write("FOO: %s" % text)',
+        '        return True',
+        '',
+        'class FooPlugin(PieCrustPlugin):',
+        '    def getProcessors(self):',
+        '        yield FooProcessor()',
+        '',
+        '__piecrust_plugin__ = FooPlugin']
+    fs.withFile('kitchen/plugins/%s.py' % plugname, '\n'.join(src))
+    with mock_fs_scope(fs):
+        appfactory = PieCrustFactory(fs.path('kitchen'))
+
+        def _bake():
+            return Baker(appfactory, appfactory.create(), fs.path('counter'),
+                         allowed_pipelines=['asset']).bake()
+
+        _bake()
+        expected = {'one.bar': 'FOO: One', 'two.bar': 'FOO: Two'}
+        assert expected == fs.getStructure('counter')
+        mtime1 = os.path.getmtime(fs.path('/counter/one.bar'))
+        mtime2 = os.path.getmtime(fs.path('/counter/two.bar'))
+
+        # Nothing changed, so no asset is even sent to the workers.
+        time.sleep(1)
+        records = _bake()
+        assert records.stats.counters['AssetsUpToDate'] == 2
+        assert mtime1 == os.path.getmtime(fs.path('/counter/one.bar'))
+        assert mtime2 == os.path.getmtime(fs.path('/counter/two.bar'))
+
+        time.sleep(1)
+        fs.withFile('kitchen/assets/_dep.txt', 'Changed dependency')
+        _bake()
+        assert mtime1 < os.path.getmtime(fs.path('/counter/one.bar'))
+        assert mtime2 == os.path.getmtime(fs.path('/counter/two.bar'))
+
+        # Missing outputs are re-processed.
+        os.remove(fs.path('/counter/two.bar'))
+        _bake()
+        assert expected == fs.getStructure('counter')
+
+
+def test_only_asset_output_dirs_are_checked():
+    import mock
+
+    fs = (_get_test_fs()
+          .withFile('kitchen/assets/css/site.foo', 'Site')
+          .withFile('counter/blog/2017/post.html', 'Post'))
+    with mock_fs_scope(fs):
+        appfactory = PieCrustFactory(fs.path('kitchen'))
+
+        def _bake():
+            return Baker(appfactory, appfactory.create(), fs.path('counter'),
+                         allowed_pipelines=['asset']).bake()
+
+        _bake()
+        listed_dirs = []
+        orig_listdir = os.listdir
+        orig_walk = os.walk
+
+        def _listdir(path):
+            listed_dirs.append(path)
+            return orig_listdir(path)
+
+        def _walk(path, *args, **kwargs):
+            listed_dirs.append(path)
+            return orig_walk(path, *args, **kwargs)
+
+        with mock.patch('os.listdir', _listdir), \
+                mock.patch('os.walk', _walk):
+            records = _bake()
+        assert records.stats.counters['AssetsUpToDate'] == 1
+        counter_dir = fs.path('counter')
+        assert [d for d in listed_dirs if d.startswith(counter_dir)] == [
+            os.path.join(counter_dir, 'css')]
+
+        # Missing outputs are still re-processed.
+        os.remove(fs.path('counter/css/site.foo'))
+        records = _bake()
+        assert records.stats.counters['AssetsUpToDate'] == 0
+        assert fs.getStructure('counter/css') == {'site.foo': 'Site'}
+
+
 def test_record_version_change():
     plugname = _get_test_plugin_name()
     fs = (_get_test_fs(plugins=[plugname], processors=['foo'])
@@ -1,8 +1,11 @@
 import time
 import os.path
+import hashlib
 import urllib.parse
 import pytest
-from piecrust.pipelines.records import MultiRecord
+from piecrust.app import PieCrust
+from piecrust.baking.baker import get_bake_records_path
+from piecrust.pipelines.records import MultiRecord, load_records
 from piecrust.pipelines._pagebaker import get_output_path
 from .mockutil import get_mock_app, mock_fs, mock_fs_scope
 
@@ -99,3 +102,29 @@ def test_record_version_change():
         finally:
             MultiRecord.RECORD_VERSION -= 1
 
+
+def test_job_times_are_recorded():
+    fs = (mock_fs()
+          .withConfig()
+          .withPage('pages/foo.md', {'layout': 'none', 'format': 'none'},
+                    'a foo page'))
+    with mock_fs_scope(fs):
+        out_dir = fs.path('counter')
+        fs.runChef('bake', '-o', out_dir)
+
+        # Chef uses the `default` cache key when baking.
+        app = PieCrust(fs.path('kitchen'),
+                       cache_key=hashlib.md5(b'default').hexdigest())
+        records_path = get_bake_records_path(app, out_dir)
+        records = load_records(records_path)
+        entry = records.getRecord('pages@page').getEntry(
+            fs.path('kitchen/pages/foo.md'))
+        assert sorted(entry.job_times.keys()) == [0, 1, 2]
+
+        # Nothing gets rendered this time, but we should keep the timings
+        # from the previous bake.
+        fs.runChef('bake', '-o', out_dir)
+        records = load_records(records_path)
+        entry = records.getRecord('pages@page').getEntry(
+            fs.path('kitchen/pages/foo.md'))
+        assert sorted(entry.job_times.keys()) == [0, 1, 2]
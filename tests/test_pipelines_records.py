@@ -0,0 +1,118 @@
+import os.path
+import pytest
+from piecrust.pipelines.records import (
+    MultiRecord, MultiRecordHistory, Record, RecordEntry, RecordHistory,
+    load_records)
+
+
+def _make_entry(spec, value):
+    e = RecordEntry()
+    e.item_spec = spec
+    e.job_times['value'] = value
+    return e
+
+
+def _make_records():
+    records = MultiRecord()
+    records.bake_time = 1234
+    rec = records.getRecord('pages@page')
+    rec.user_data['foo'] = 'bar'
+    for i in range(20):
+        rec.addEntry(_make_entry('pages:item%d.md' % i, i))
+    records.getRecord('assets@asset')
+    return records
+
+
+def test_records_round_trip(tmpdir):
+    path = os.path.join(str(tmpdir), 'test.records')
+    _make_records().save(path)
+
+    records = load_records(path, True)
+    assert not records.invalidated
+    assert records.bake_time == 1234
+    assert [r.name for r in records.records] == ['pages@page', 'assets@asset']
+
+    rec = records.getRecord('pages@page')
+    assert rec.user_data == {'foo': 'bar'}
+    assert rec.entry_count == 20
+    assert [e.item_spec for e in rec.getEntries()] == [
+        'pages:item%d.md' % i for i in range(20)]
+    assert records.getRecord('assets@asset').entry_count == 0
+
+
+def test_records_lazy_entries(tmpdir):
+    path = os.path.join(str(tmpdir), 'test.records')
+    _make_records().save(path)
+
+    records = load_records(path, True)
+    rec = records.getRecord('pages@page')
+    e = rec.getEntry('pages:item12.md')
+    assert e.job_times == {'value': 12}
+    assert rec.getEntry('pages:missing.md') is None
+    assert rec.entry_count == 20
+    assert len(rec._entries) == 1
+
+    # Entries already loaded are kept when everything gets loaded.
+    entries = list(rec.getEntries())
+    assert len(entries) == 20
+    assert entries[12] is e
+
+
+def test_records_resave(tmpdir):
+    path = os.path.join(str(tmpdir), 'test.records')
+    _make_records().save(path)
+
+    records = load_records(path, True)
+    records.getRecord('pages@page').addEntry(
+        _make_entry('pages:new.md', 42))
+    records.save(path)
+
+    records = load_records(path, True)
+    rec = records.getRecord('pages@page')
+    assert rec.entry_count == 21
+    assert rec.getEntry('pages:new.md').job_times == {'value': 42}
+
+
+@pytest.mark.parametrize('contents', [b'', b'garbage', b'\x80\x04N.'])
+def test_records_invalid_format(tmpdir, contents):
+    path = os.path.join(str(tmpdir), 'test.records')
+    with open(path, 'wb') as fp:
+        fp.write(contents)
+
+    records = load_records(path)
+    assert records.invalidated
+    assert records.records == []
+
+
+def test_record_history_incremental_build():
+    prev = Record('pages@page')
+    prev.addEntry(_make_entry('a', 1))
+    prev.addEntry(_make_entry('b', 2))
+    cur = Record('pages@page')
+
+    history = RecordHistory(prev, cur)
+    history.build()
+    assert [(p.item_spec, c) for p, c in history.diffs] == [
+        ('a', None), ('b', None)]
+
+    cur.addEntry(_make_entry('b', 3))
+    cur.addEntry(_make_entry('c', 4))
+    history.build()
+    assert [(p and p.item_spec, c and c.item_spec)
+            for p, c in history.diffs] == [
+        ('a', None), ('b', 'b'), (None, 'c')]
+    assert history.getPreviousEntry('b').job_times == {'value': 2}
+    assert history.getCurrentEntry('b').job_times == {'value': 3}
+    assert history.getPreviousEntry('c') is None
+
+
+def test_multi_record_history_used_paths():
+    histories = MultiRecordHistory(MultiRecord(), MultiRecord())
+    assert histories.getHistory('pages@page') is \
+        histories.getHistory('pages@page')
+    assert histories.getUsedPath('/out/foo.html') is None
+
+    histories.addUsedPath('pages@page', '/out/foo.html', 'foo.md')
+    histories.addUsedPath('theme_pages@page', '/out/foo.html', 'foo.html')
+    assert histories.getUsedPath('/out/foo.html') == (
+        'pages@page', 'foo.md')
@@ -0,0 +1,78 @@
+import sys
+import time
+import pytest
+from piecrust.processing.backends import (
+    DaemonBackend, SubprocessBackend, create_backend)
+
+
+_echo_daemon = '''
+import sys, json
+for line in sys.stdin:
+    args = json.loads(line)
+    sys.stdout.write(json.dumps({
+        'returncode': int(args[0]), 'stderr': ' '.join(args[1:])}) + '\\n')
+    sys.stdout.flush()
+'''
+
+
+def test_daemon_backend():
+    fallback = SubprocessBackend('Test', 'doesnt-exist')
+    backend = DaemonBackend('Test', [sys.executable, '-c', _echo_daemon],
+                            fallback)
+    try:
+        assert backend.run(['0', 'foo'], capture_stderr=True) == (0, 'foo')
+        proc = backend._proc
+        assert backend.run(['2', 'bar'], capture_stderr=True) == (2, 'bar')
+        # The same daemon process is re-used.
+        assert backend._proc is proc
+    finally:
+        backend.close()
+    assert proc.poll() == 0
+
+
+def test_daemon_backend_fallback():
+    fallback = SubprocessBackend('Test', sys.executable)
+    backend = DaemonBackend('Test', ['doesnt-exist'], fallback)
+    retcode, _ = backend.run(['-c', 'import sys; sys.exit(3)'])
+    assert retcode == 3
+    assert backend._failed
+
+
+_hanging_daemon = '''
+import sys, time
+sys.stdin.readline()
+time.sleep(60)
+'''
+
+
+def test_daemon_backend_fallback_on_timeout():
+    fallback = SubprocessBackend('Test', sys.executable)
+    backend = DaemonBackend('Test', [sys.executable, '-c', _hanging_daemon],
+                            fallback, timeout=0.5)
+    proc = backend._ensureStarted()
+    start = time.time()
+    retcode, _ = backend.run(['-c', 'import sys; sys.exit(3)'])
+    assert retcode == 3
+    assert time.time() - start < 10
+    assert backend._failed
+    assert backend._proc is None
+    assert proc.poll() is not None
+
+
+def test_create_backend():
+    conf = {'bin': 'foo'}
+    assert isinstance(create_backend('Test', conf), SubprocessBackend)
+
+    conf = {'bin': 'foo', 'backend': 'daemon', 'daemon_bin': 'foo --daemon'}
+    backend = create_backend('Test', conf)
+    assert isinstance(backend, DaemonBackend)
+    assert backend.command == ['foo', '--daemon']
+    assert backend.timeout == 60
+
+    conf['daemon_timeout'] = 5
+    assert create_backend('Test', conf).timeout == 5
+
+    with pytest.raises(Exception):
+        create_backend('Test', {'bin': 'foo', 'backend': 'daemon'})
+    with pytest.raises(Exception):
+        create_backend('Test', {'bin': 'foo', 'backend': 'whatever'})
@@ -0,0 +1,84 @@
+import os
+import os.path
+from piecrust.processing.sitemap import SitemapWriter
+
+
+def _make_locs(count, lastmod='2017-01-01'):
+    return [{'url': '/page%d.html' % i, 'lastmod': lastmod}
+            for i in range(count)]
+
+
+def _make_writer(tmpdir):
+    out_path = os.path.join(str(tmpdir), 'out', 'sitemap.xml')
+    os.makedirs(os.path.dirname(out_path))
+    manifest_path = os.path.join(str(tmpdir), 'cache', 'sitemap.json')
+    return SitemapWriter(out_path, manifest_path, 'http://example.org/',
+                         urls_per_file=2)
+
+
+def _list_out_dir(tmpdir):
+    return sorted(os.listdir(os.path.join(str(tmpdir), 'out')))
+
+
+def test_sitemap_writer_shards(tmpdir):
+    writer = _make_writer(tmpdir)
+    assert writer.write(_make_locs(5)) == 4
+    assert _list_out_dir(tmpdir) == [
+        'sitemap-1.xml', 'sitemap-2.xml', 'sitemap-3.xml', 'sitemap.xml']
+
+    with open(writer.out_path, 'r') as fp:
+        index = fp.read()
+    assert '<sitemapindex' in index
+    assert '<loc>http://example.org/sitemap-3.xml</loc>' in index
+
+    shard_path = os.path.join(str(tmpdir), 'out', 'sitemap-3.xml')
+    with open(shard_path, 'r') as fp:
+        shard = fp.read()
+    assert '<loc>/page4.html</loc>' in shard
+    assert '/page3.html' not in shard
+
+
+def test_sitemap_writer_only_writes_changed_shards(tmpdir):
+    writer = _make_writer(tmpdir)
+    locs = _make_locs(5)
+    assert writer.write(locs) == 4
+    assert writer.write(locs) == 0
+
+    locs[2]['url'] = '/other.html'
+    assert writer.write(locs) == 1
+
+    locs[4]['lastmod'] = '2017-02-01'
+    assert writer.write(locs) == 2
+
+
+def test_sitemap_writer_removes_stale_shards(tmpdir):
+    writer = _make_writer(tmpdir)
+    writer.write(_make_locs(5))
+    assert writer.write(_make_locs(2)) == 1
+    assert _list_out_dir(tmpdir) == ['sitemap.xml']
+
+    with open(writer.out_path, 'r') as fp:
+        contents = fp.read()
+    assert '<urlset' in contents
+    assert '<loc>/page1.html</loc>' in contents
+
+
+def test_sitemap_skips_drafts_when_only_baking_assets():
+    from piecrust.app import PieCrustFactory
+    from piecrust.baking.baker import Baker
+    from .mockutil import mock_fs, mock_fs_scope
+
+    fs = (mock_fs()
+          .withConfig()
+          .withAsset('assets/sitemap.sitemap', "autogen: [pages]")
+          .withPage('pages/foo.md', {'draft': True}, "This is a draft")
+          .withPage('pages/bar.md', {}, "This is a bar"))
+    with mock_fs_scope(fs):
+        appfactory = PieCrustFactory(fs.path('kitchen'))
+        out_dir = fs.path('kitchen/_counter')
+        Baker(appfactory, appfactory.create(), out_dir,
+              allowed_pipelines=['asset']).bake()
+        with open(os.path.join(out_dir, 'sitemap.xml'), 'r') as fp:
+            contents = fp.read()
+        assert '<loc>/bar.html</loc>' in contents
+        assert '/foo.html' not in contents
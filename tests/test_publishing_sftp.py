@@ -0,0 +1,222 @@
+import os
+import os.path
+import argparse
+import threading
+from piecrust.cache import ExtensibleCache
+from piecrust.publishing.base import PublishingContext
+from piecrust.publishing.sftp import SftpPublisher
+from .mockutil import get_mock_app
+
+
+class _LocalSftpClient:
+    """ A stand-in for a Paramiko SFTP client, working on a local
+        directory.
+    """
+    def __init__(self, root_dir, log):
+        self.root_dir = root_dir
+        self.cwd = root_dir
+        self.log = log
+
+    def _path(self, path):
+        if path.startswith('/'):
+            return os.path.join(self.root_dir, *path[1:].split('/'))
+        return os.path.join(self.cwd, *path.split('/'))
+
+    def chdir(self, path):
+        path = self._path(path)
+        if not os.path.isdir(path):
+            raise FileNotFoundError(path)
+        self.cwd = path
+
+    def mkdir(self, path):
+        self.log.append(('mkdir', path))
+        os.mkdir(self._path(path))
+
+    def listdir_attr(self, path):
+        self.log.append(('listdir', path))
+        full_path = self._path(path)
+        if not os.path.isdir(full_path):
+            raise FileNotFoundError(full_path)
+        res = []
+        for name in os.listdir(full_path):
+            a = os.stat(os.path.join(full_path, name))
+            res.append(argparse.Namespace(
+                filename=name, st_size=a.st_size, st_mtime=int(a.st_mtime)))
+        return res
+
+    def put(self, local_path, remote_path, confirm=True):
+        self.log.append(('put', remote_path, threading.get_ident()))
+        with open(local_path, 'rb') as fp:
+            data = fp.read()
+        with open(self._path(remote_path), 'wb') as fp:
+            fp.write(data)
+
+    def utime(self, path, times):
+        os.utime(self._path(path), times)
+
+    def remove(self, path):
+        self.log.append(('remove', path))
+        os.remove(self._path(path))
+
+
+def _write_file(path, contents):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as fp:
+        fp.write(contents)
+
+
+def _make_site(tmpdir):
+    out_dir = os.path.join(str(tmpdir), '_pub', 'test')
+    _write_file(os.path.join(out_dir, 'index.html'), 'Index')
+    _write_file(os.path.join(out_dir, 'blog', '2017', 'post.html'), 'Post')
+    _write_file(os.path.join(out_dir, 'css', 'site.css'), 'body {}')
+    remote_dir = os.path.join(str(tmpdir), 'remote')
+    os.makedirs(remote_dir)
+    return out_dir, remote_dir
+
+
+class _BakeRecord:
+    """ A stand-in for a bake record, with only what the publisher
+        needs.
+    """
+    def __init__(self, out_paths, deleted_out_paths):
+        self.out_paths = out_paths
+        self.deleted_out_paths = deleted_out_paths
+
+    def getEntries(self):
+        for p in self.out_paths:
+            yield argparse.Namespace(getAllOutputPaths=lambda p=p: [p])
+
+
+def _publish(out_dir, remote_dir, connections=3,
+             baked=None, deleted=None, precompress=False):
+    log = []
+    clients = [_LocalSftpClient(remote_dir, log)
+               for _ in range(connections)]
+    ctx = PublishingContext()
+    ctx.bake_out_dir = out_dir
+    ctx.args = argparse.Namespace(force=True)
+    if baked is not None or deleted is not None:
+        # Only publish what the last bake changed.
+        ctx.was_baked = True
+        ctx.args.force = False
+        ctx.bake_records = argparse.Namespace(records=[_BakeRecord(
+            [os.path.join(out_dir, p) for p in (baked or [])],
+            [os.path.join(out_dir, p) for p in (deleted or [])])])
+    app = get_mock_app()
+    app.cache = ExtensibleCache(os.path.join(
+        os.path.dirname(os.path.dirname(out_dir)), 'cache'))
+    app.config.set('baker/precompress', precompress)
+    pub = SftpPublisher(app, 'test', {})
+    assert pub._upload(clients, ctx, 'www', 'user@host:22/www')
+    return [e[1] for e in log if e[0] == 'put'], log
+
+
+def _get_manifest_path(tmpdir):
+    return os.path.join(str(tmpdir), 'cache', 'publish',
+                        'test.sftp-manifest.json')
+
+
+def _list_remote(remote_dir):
+    res = []
+    for dirpath, _, filenames in os.walk(remote_dir):
+        for f in filenames:
+            res.append(os.path.relpath(os.path.join(dirpath, f), remote_dir))
+    return sorted(p.replace(os.sep, '/') for p in res)
+
+
+def test_sftp_upload_all(tmpdir):
+    out_dir, remote_dir = _make_site(tmpdir)
+    os.makedirs(os.path.join(remote_dir, 'www'))
+    puts, log = _publish(out_dir, remote_dir)
+    assert sorted(puts) == ['blog/2017/post.html', 'css/site.css',
+                            'index.html']
+    assert _list_remote(remote_dir) == [
+        'www/blog/2017/post.html', 'www/css/site.css', 'www/index.html']
+
+    # Directories that were just created aren't listed.
+    assert [e[1] for e in log if e[0] == 'listdir'] == [
+        '.', 'blog', 'css']
+    assert [e[1] for e in log if e[0] == 'mkdir'] == [
+        'blog', 'blog/2017', 'css']
+    assert os.path.isfile(_get_manifest_path(tmpdir))
+    assert not os.path.exists(os.path.join(
+        str(tmpdir), '_pub', 'test.sftp-manifest.json'))
+
+
+def test_sftp_upload_skips_identical_files(tmpdir):
+    out_dir, remote_dir = _make_site(tmpdir)
+    os.makedirs(os.path.join(remote_dir, 'www'))
+    _publish(out_dir, remote_dir)
+
+    puts, _ = _publish(out_dir, remote_dir)
+    assert puts == []
+
+    _write_file(os.path.join(out_dir, 'css', 'site.css'), 'body {...}')
+    puts, _ = _publish(out_dir, remote_dir)
+    assert puts == ['css/site.css']
+
+    # Files whose size changed on the remote are uploaded again.
+    _write_file(os.path.join(remote_dir, 'www', 'index.html'), 'Changed')
+    puts, _ = _publish(out_dir, remote_dir)
+    assert puts == ['index.html']
+
+
+def test_sftp_upload_without_manifest(tmpdir):
+    out_dir, remote_dir = _make_site(tmpdir)
+    _publish(out_dir, remote_dir)
+    os.remove(_get_manifest_path(tmpdir))
+
+    # Remote files with the same size and modification time are skipped.
+    _write_file(os.path.join(out_dir, 'index.html'), 'Index2')
+    puts, _ = _publish(out_dir, remote_dir)
+    assert puts == ['index.html']
+
+
+def test_sftp_upload_removes_stale_precompressed_files(tmpdir):
+    out_dir, remote_dir = _make_site(tmpdir)
+    _write_file(os.path.join(out_dir, 'index.html.gz'), 'Index (gz)')
+    _write_file(os.path.join(out_dir, 'css', 'site.css.gz'), 'body (gz)')
+    _write_file(os.path.join(out_dir, 'css', 'site.css.br'), 'body (br)')
+    _publish(out_dir, remote_dir)
+    assert _list_remote(remote_dir) == [
+        'www/blog/2017/post.html', 'www/css/site.css',
+        'www/css/site.css.br', 'www/css/site.css.gz',
+        'www/index.html', 'www/index.html.gz']
+
+    # The stylesheet was deleted, and the index page got too small to be
+    # precompressed. The bake removed their local precompressed files.
+    os.remove(os.path.join(out_dir, 'css', 'site.css'))
+    os.remove(os.path.join(out_dir, 'css', 'site.css.gz'))
+    os.remove(os.path.join(out_dir, 'css', 'site.css.br'))
+    os.remove(os.path.join(out_dir, 'index.html.gz'))
+    _write_file(os.path.join(out_dir, 'index.html'), 'Idx')
+    puts, log = _publish(out_dir, remote_dir,
+                         baked=['index.html'], deleted=['css/site.css'],
+                         precompress=True)
+    assert puts == ['index.html']
+    # Only the precompressed files that were uploaded are removed.
+    assert sorted([e[1] for e in log if e[0] == 'remove']) == [
+        'css/site.css', 'css/site.css.br', 'css/site.css.gz',
+        'index.html.gz']
+    assert _list_remote(remote_dir) == [
+        'www/blog/2017/post.html', 'www/index.html']
+
+
+def test_sftp_upload_without_precompression_doesnt_remove_anything(tmpdir):
+    out_dir, remote_dir = _make_site(tmpdir)
+    _publish(out_dir, remote_dir)
+
+    _write_file(os.path.join(out_dir, 'index.html'), 'Index2')
+    _write_file(os.path.join(out_dir, 'css', 'site.css'), 'body {...}')
+    puts, log = _publish(out_dir, remote_dir,
+                         baked=['index.html', 'css/site.css'])
+    assert sorted(puts) == ['css/site.css', 'index.html']
+    assert [e for e in log if e[0] == 'remove'] == []
+
+    # Even without a manifest.
+    os.remove(_get_manifest_path(tmpdir))
+    _write_file(os.path.join(out_dir, 'index.html'), 'Index #3')
+    puts, log = _publish(out_dir, remote_dir, baked=['index.html'])
+    assert puts == ['index.html']
+    assert [e for e in log if e[0] == 'remove'] == []
@@ -1,7 +1,7 @@
 import urllib.parse
 import mock
 import pytest
-from piecrust.routing import Route, RouteParameter
+from piecrust.routing import Route, RouteParameter, RouteMatcher
 from piecrust.sources.base import ContentSource
 from .mockutil import get_mock_app
 
@@ -176,6 +176,40 @@ def test_match_uri(site_root, config, params, uri, expected_match):
     assert m == expected_match
 
 
+@pytest.mark.parametrize(
+    'uri, expected',
+    [
+        ('/', [('pages', {'slug': ''})]),
+        ('/foo', [('pages', {'slug': 'foo'})]),
+        ('/blog', [('blog', {'slug': ''}), ('pages', {'slug': 'blog'})]),
+        ('/blog/foo', [('blog', {'slug': 'foo'}),
+                       ('pages', {'slug': 'blog/foo'})]),
+        ('/blog/tag/foo', [('tags', {'tag': 'foo'}),
+                           ('blog', {'slug': 'tag/foo'}),
+                           ('pages', {'slug': 'blog/tag/foo'})]),
+        ('/blog/tag/foo/bar', [('blog', {'slug': 'tag/foo/bar'}),
+                               ('pages', {'slug': 'blog/tag/foo/bar'})]),
+        ('/blog-tag/foo', [('pages', {'slug': 'blog-tag/foo'})])
+    ])
+def test_route_matcher(uri, expected):
+    app = get_mock_app()
+    app.config.set('site/root', '/')
+    app.sources = [
+        _getMockSource('tags', ['tag']),
+        _getMockSource('blog', [('slug', 'path')]),
+        _getMockSource('pages', [('slug', 'path')])]
+
+    routes = [
+        Route(app, {'url': '/blog/tag/%tag%', 'source': 'tags'}),
+        Route(app, {'url': '/blog/%slug%', 'source': 'blog'}),
+        Route(app, {'url': '/%slug%', 'source': 'pages'})]
+    matcher = RouteMatcher(routes)
+    matches = [(r.source_name, p) for r, p in matcher.match(uri)]
+    assert matches == expected
+    assert matches == [(r.source_name, r.matchUri(uri))
+                       for r in routes if r.matchUri(uri) is not None]
+
+
 @pytest.mark.parametrize(
     'site_root',
     [
@@ -0,0 +1,146 @@
+import time
+import argparse
+from werkzeug.test import Client
+from werkzeug.wrappers import BaseResponse
+from piecrust.app import PieCrustFactory
+from piecrust.serving.server import PieCrustServer
+from .mockutil import mock_fs, mock_fs_scope
+
+
+class _FakeProcessingLoop:
+    def __init__(self):
+        self.observers = []
+
+    def addObserver(self, obs):
+        self.observers.append(obs)
+
+    def notify(self, paths, reinit=False):
+        for obs in self.observers:
+            obs.addBuildEvent({'id': 1, 'type': 'site_changed',
+                               'paths': paths, 'reinit': reinit})
+
+
+def test_server_keeps_app_until_site_changes():
+    fs = (mock_fs()
+          .withConfig()
+          .withPage('pages/foo.html', {'layout': 'none', 'format': 'none'},
+                    "FOO"))
+    with mock_fs_scope(fs):
+        appfactory = PieCrustFactory(fs.path('/kitchen'))
+        server = PieCrustServer(appfactory)
+        proc_loop = _FakeProcessingLoop()
+        server.watchChanges(proc_loop)
+
+        client = Client(server, BaseResponse)
+        resp = client.get('/foo.html')
+        assert resp.data.decode('utf8') == 'FOO'
+        app = server.server._apps[False]
+
+        # Nothing changed, the same app is used.
+        fs.withPage('pages/foo.html', {'layout': 'none', 'format': 'none'},
+                    "NEW FOO")
+        resp = client.get('/foo.html')
+        assert resp.data.decode('utf8') == 'FOO'
+        assert server.server._apps[False] is app
+
+        # The page changed.
+        proc_loop.notify([fs.path('/kitchen/pages/foo.html')])
+        resp = client.get('/foo.html')
+        assert resp.data.decode('utf8') == 'NEW FOO'
+        assert server.server._apps[False] is app
+
+        # The configuration changed.
+        proc_loop.notify([fs.path('/kitchen/config.yml')], reinit=True)
+        resp = client.get('/foo.html')
+        assert resp.data.decode('utf8') == 'NEW FOO'
+        assert server.server._apps[False] is not app
+
+
+def test_server_caches_responses_until_dependencies_change():
+    fs = (mock_fs()
+          .withConfig()
+          .withPage('pages/foo.html', {'layout': 'none', 'format': 'none'},
+                    "FOO")
+          .withPage('pages/bar.html', {'layout': 'none', 'format': 'none'},
+                    "BAR")
+          .withPage('posts/2017-01-01_first.html',
+                    {'layout': 'none', 'format': 'none'},
+                    "FIRST"))
+    with mock_fs_scope(fs):
+        appfactory = PieCrustFactory(fs.path('/kitchen'))
+        server = PieCrustServer(appfactory)
+        proc_loop = _FakeProcessingLoop()
+        server.watchChanges(proc_loop)
+        cache = server.server.response_cache
+
+        client = Client(server, BaseResponse)
+        resp = client.get('/foo.html')
+        assert resp.data.decode('utf8') == 'FOO'
+        etag = resp.headers['ETag']
+        resp = client.get('/2017/01/01/first.html')
+        assert resp.data.decode('utf8') == 'FIRST'
+        assert cache.getStats()['misses'] == 2
+
+        resp = client.get('/foo.html')
+        assert resp.data.decode('utf8') == 'FOO'
+        resp = client.get('/foo.html', headers={'If-None-Match': etag})
+        assert resp.status_code == 304
+        assert cache.getStats()['hits'] == 2
+        assert cache.getStats()['not_modified'] == 1
+
+        # Changing a page only affects pages using its source.
+        fs.withPage('pages/bar.html', {'layout': 'none', 'format': 'none'},
+                    "NEW BAR")
+        proc_loop.notify([fs.path('/kitchen/pages/bar.html')])
+        resp = client.get('/2017/01/01/first.html')
+        assert resp.data.decode('utf8') == 'FIRST'
+        assert cache.getStats()['hits'] == 3
+        resp = client.get('/bar.html')
+        assert resp.data.decode('utf8') == 'NEW BAR'
+        assert cache.getStats()['misses'] == 3
+        assert cache.getStats()['invalidations'] == 1
+
+
+class _FakeSource:
+    def __init__(self, name):
+        self.name = name
+
+
+def test_processing_loop_keeps_site_changes_made_during_pipeline_runs():
+    from piecrust.serving.procloop import WatchdogProcessingLoop
+
+    fs = mock_fs().withConfig()
+    with mock_fs_scope(fs):
+        appfactory = PieCrustFactory(fs.path('/kitchen'))
+        proc_loop = WatchdogProcessingLoop(appfactory, fs.path('/counter'))
+        events = []
+        proc_loop.addObserver(argparse.Namespace(addBuildEvent=events.append))
+
+        page_path = fs.path('/kitchen/pages/foo.html')
+        asset_path = fs.path('/kitchen/assets/foo.css')
+
+        def _run_pipelines(only_for_source=None, changed_paths=None):
+            # A page is edited while the assets are being processed, and
+            # the pipeline writes some files.
+            now = time.time()
+            proc_loop._ops += [
+                {'op': 'refresh', 'path': page_path, 'change': 'modified',
+                 'time': now},
+                {'op': 'bake', 'source': only_for_source, 'path': asset_path,
+                 'change': 'modified', 'time': now}]
+
+        proc_loop.runPipelines = _run_pipelines
+
+        source = _FakeSource('assets')
+        proc_loop._processOps([
+            {'op': 'bake', 'source': source, 'path': asset_path,
+             'change': 'modified', 'time': time.time()}])
+        assert events == []
+
+        ops, proc_loop._ops = proc_loop._ops, []
+        proc_loop._processOps(ops)
+        assert [(e['type'], e['paths']) for e in events] == [
+            ('site_changed', [page_path])]
+        # The asset changes made during the pipeline run are ignored, so
+        # the pipelines didn't run again.
+        assert proc_loop._ops == []
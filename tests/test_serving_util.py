@@ -33,3 +33,38 @@ def test_find_routes(uri, route_specs, expected):
         exp_source, exp_md = expected[i]
         assert route.source_name == exp_source
         assert metadata == exp_md
+
+
+def test_make_wrapped_file_response_with_precompressed_file(tmpdir):
+    import os
+    from werkzeug.test import EnvironBuilder
+    from werkzeug.wrappers import Request
+    from piecrust.baking.precompress import OutputPrecompressor
+    from piecrust.serving.util import make_wrapped_file_response
+
+    path = os.path.join(str(tmpdir), 'foo.css')
+    with open(path, 'w') as fp:
+        fp.write('body { color: red; }\n' * 50)
+
+    def _get(accept_encoding):
+        builder = EnvironBuilder(
+            path='/foo.css', headers={'Accept-Encoding': accept_encoding})
+        environ = builder.get_environ()
+        resp = make_wrapped_file_response(environ, Request(environ), path)
+        data = b''.join(resp.response)
+        resp.close()
+        return resp, data
+
+    resp, _ = _get('gzip')
+    assert resp.content_encoding is None
+
+    OutputPrecompressor(['gzip']).precompress([path])
+    resp, data = _get('gzip, deflate')
+    assert resp.content_encoding == 'gzip'
+    assert resp.mimetype == 'text/css'
+    with open(path + '.gz', 'rb') as fp:
+        assert data == fp.read()
+
+    resp, data = _get('identity')
+    assert resp.content_encoding is None
+    assert data.decode('utf8') == 'body { color: red; }\n' * 50
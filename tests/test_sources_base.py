@@ -1,4 +1,5 @@
 import os
+import time
 import pytest
 from .mockutil import mock_fs, mock_fs_scope
 from .pathutil import slashfix
@@ -71,3 +72,132 @@ def test_default_source_find_item(fs_fac, ref_path, expected_path,
         assert os.path.relpath(item.spec, app.root_dir) == \
             slashfix(expected_path)
         assert item.metadata['route_params'] == expected_metadata
+
+
+def _make_dirs_older(root_dir, seconds=10):
+    # Directories modified right before a scan make the scan index
+    # invalid, so pretend that the test files were created a while ago.
+    mtime = time.time() - seconds
+    for dirpath, _, __ in os.walk(root_dir):
+        os.utime(dirpath, (mtime, mtime))
+
+
+def test_default_source_scan_index():
+    fs = (mock_fs()
+          .withConfig({
+              'site': {
+                  'sources': {
+                      'test': {}},
+                  'routes': [
+                      {'url': '/%path%', 'source': 'test'}]
+              }
+          })
+          .withPage('test/foo.md')
+          .withPage('test/sub/bar.md'))
+    with mock_fs_scope(fs):
+        def _get_slugs():
+            app = fs.getApp()
+            s = app.getSource('test')
+            slugs = sorted([i.metadata['route_params']['slug']
+                            for i in s.getAllContents()])
+            return slugs, app.env.stats.counters
+
+        _make_dirs_older(fs.path('kitchen/test'))
+        slugs, counters = _get_slugs()
+        assert slugs == ['foo', 'sub/bar']
+        assert counters['SourceScanIndexMisses'] == 1
+
+        slugs, counters = _get_slugs()
+        assert slugs == ['foo', 'sub/bar']
+        assert counters['SourceScanIndexHits'] == 1
+        assert counters['SourceScanIndexMisses'] == 0
+
+        fs.withPage('test/sub/baz.md')
+        slugs, counters = _get_slugs()
+        assert slugs == ['foo', 'sub/bar', 'sub/baz']
+        assert counters['SourceScanIndexMisses'] == 1
+
+        os.remove(fs.path('kitchen/test/foo.md'))
+        slugs, counters = _get_slugs()
+        assert slugs == ['sub/bar', 'sub/baz']
+        assert counters['SourceScanIndexMisses'] == 1
+
+
+def test_default_source_scan_index_with_coarse_mtimes():
+    fs = (mock_fs()
+          .withConfig({
+              'site': {
+                  'sources': {
+                      'test': {}},
+                  'routes': [
+                      {'url': '/%path%', 'source': 'test'}]
+              }
+          })
+          .withPage('test/foo.md'))
+    with mock_fs_scope(fs):
+        def _get_slugs():
+            app = fs.getApp()
+            s = app.getSource('test')
+            slugs = sorted([i.metadata['route_params']['slug']
+                            for i in s.getAllContents()])
+            return slugs, app.env.stats.counters
+
+        slugs, counters = _get_slugs()
+        assert slugs == ['foo']
+        assert counters['SourceScanIndexMisses'] == 1
+
+        # Add a file right after the scan, on a file-system that only
+        # stores modification times to the second, so the directory's
+        # modification time didn't change.
+        dir_path = fs.path('kitchen/test')
+        st = os.stat(dir_path)
+        fs.withPage('test/bar.md')
+        os.utime(dir_path, ns=(st.st_atime_ns, st.st_mtime_ns))
+        slugs, counters = _get_slugs()
+        assert slugs == ['bar', 'foo']
+        assert counters['SourceScanIndexMisses'] == 1
+
+        # Once the directory is old enough, the index is used.
+        _make_dirs_older(dir_path)
+        slugs, counters = _get_slugs()
+        assert counters['SourceScanIndexMisses'] == 1
+        slugs, counters = _get_slugs()
+        assert slugs == ['bar', 'foo']
+        assert counters['SourceScanIndexHits'] == 1
+        assert counters['SourceScanIndexMisses'] == 0
+
+
+def test_default_source_find_item_when_serving():
+    fs = (mock_fs()
+          .withConfig({
+              'site': {
+                  'sources': {
+                      'test': {}},
+                  'routes': [
+                      {'url': '/%path%', 'source': 'test'}]
+              }
+          })
+          .withPage('test/_index.md')
+          .withPage('test/foo.md')
+          .withPage('test/sub/bar.html'))
+    with mock_fs_scope(fs):
+        app = fs.getApp()
+        app.config.set('server/is_serving', True)
+        s = app.getSource('test')
+
+        def _find(slug):
+            item = s.findContentFromRoute({'slug': slug})
+            if item is None:
+                return None
+            return os.path.relpath(item.spec, app.root_dir)
+
+        assert _find('') == slashfix('test/_index.md')
+        assert _find('foo') == slashfix('test/foo.md')
+        assert _find('foo.md') == slashfix('test/foo.md')
+        assert _find('sub/bar') == slashfix('test/sub/bar.html')
+        assert _find('sub/baz') is None
+
+        fs.withPage('test/sub/baz.md')
+        assert _find('sub/baz') is None
+        s.invalidateCache()
+        assert _find('sub/baz') == slashfix('test/sub/baz.md')
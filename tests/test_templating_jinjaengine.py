@@ -59,3 +59,60 @@ def test_partial():
         output = render_simple_page(page)
         assert output == expected
 
+
+def test_bytecode_cache():
+    from piecrust.app import PieCrustFactory
+    from piecrust.baking.baker import Baker
+
+    fs = (mock_fs()
+          .withConfig(app_config)
+          .withAsset('templates/blah.jinja', "{{content}} for {{foo}}")
+          .withPage('pages/foo', config={'layout': 'blah.jinja',
+                                         'format': 'none'},
+                    contents="Blah"))
+    with mock_fs_scope(fs, open_patches=open_patches):
+        appfactory = PieCrustFactory(fs.path('kitchen'))
+        out_dir = fs.path('kitchen/_counter')
+        records = Baker(appfactory, appfactory.create(), out_dir,
+                        force=True).bake()
+        assert records.stats.counters['JinjaBytecodeCacheMisses'] > 0
+        assert fs.getStructure('kitchen/_counter')['foo.html'] == (
+            'Blah for bar')
+
+        records = Baker(appfactory, appfactory.create(), out_dir,
+                        force=True).bake()
+        assert records.stats.counters['JinjaBytecodeCacheMisses'] == 0
+        assert records.stats.counters['JinjaBytecodeCacheHits'] > 0
+        assert fs.getStructure('kitchen/_counter')['foo.html'] == (
+            'Blah for bar')
+
+
+def test_segment_templates_are_shared():
+    contents = "This is {{foo}}"
+    page_config = {'layout': 'none', 'format': 'none'}
+    fs = (mock_fs()
+          .withConfig(app_config)
+          .withPage('pages/foo', config=page_config, contents=contents)
+          .withPage('pages/bar', config=page_config, contents=contents)
+          .withPage('pages/baz', config=page_config, contents=contents))
+    with mock_fs_scope(fs, open_patches=open_patches):
+        app = fs.getApp()
+        source = app.getSource('pages')
+        pages = [app.getPage(source, source.findContentFromSpec(
+            fs.path('kitchen/pages/%s.md' % n))) for n in ['foo', 'bar']]
+        assert [render_simple_page(p) for p in pages] == [
+            "This is bar", "This is bar"]
+
+        counters = app.env.stats.counters
+        assert counters['JinjaBytecodeCacheMisses'] == 1
+        assert counters['JinjaBytecodeCacheHits'] == 0
+
+        # Another app gets the compiled segment from the cache.
+        app = fs.getApp()
+        source = app.getSource('pages')
+        page = app.getPage(source, source.findContentFromSpec(
+            fs.path('kitchen/pages/baz.md')))
+        assert render_simple_page(page) == "This is bar"
+        counters = app.env.stats.counters
+        assert counters['JinjaBytecodeCacheMisses'] == 0
+        assert counters['JinjaBytecodeCacheHits'] == 1
@@ -0,0 +1,192 @@
+import threading
+import pytest
+from piecrust.environment import ExecutionStats
+from piecrust.workerpool import IWorker, WorkerPool, _WorkStealingScheduler
+
+
+class MockQueue(object):
+    def __init__(self):
+        self.items = []
+
+    def put(self, item):
+        self.items.append(item)
+
+
+def _make_scheduler(worker_count, max_batch_size=None):
+    queues = [MockQueue() for _ in range(worker_count)]
+    stats = ExecutionStats()
+    sched = _WorkStealingScheduler(queues, stats,
+                                   max_batch_size=max_batch_size)
+    return sched, stats
+
+
+def test_first_batches_are_single_jobs():
+    sched, _ = _make_scheduler(2)
+    sched.addJobs(list(range(10)))
+    assignments = sched.assignBatches()
+    assert assignments == [(0, [0]), (0, [2]), (1, [1]), (1, [3])]
+
+
+def test_adaptive_batch_size():
+    sched, _ = _make_scheduler(2, max_batch_size=8)
+    sched.addJobs(list(range(1000)))
+    sched.assignBatches()
+    assert sched.getBatchSize() == 1
+
+    # Jobs take 10ms each, so we should aim for 5 jobs per batch.
+    sched.onBatchDone(0, 1, 0.01)
+    assert sched.getBatchSize() == 5
+
+    # Really cheap jobs are capped by the maximum batch size.
+    sched.onBatchDone(1, 1, 0.00001)
+    sched.onBatchDone(1, 1, 0.00001)
+    sched.onBatchDone(0, 1, 0.00001)
+    sched.onBatchDone(0, 1, 0.00001)
+    sched.onBatchDone(1, 1, 0.00001)
+    sched.onBatchDone(1, 1, 0.00001)
+    sched.onBatchDone(0, 1, 0.00001)
+    sched.onBatchDone(0, 1, 0.00001)
+    assert sched.getBatchSize() == 8
+
+
+def test_steal_from_busiest_worker():
+    sched, stats = _make_scheduler(3)
+    sched.addJobs(list(range(6)))
+    # Worker 2 dies before doing anything, so the other workers will
+    # have to steal its jobs.
+    sched.removeWorker(2)
+    assignments = sched.assignBatches()
+    assert assignments == [(0, [0]), (0, [3]), (1, [1]), (1, [4])]
+
+    sched.onBatchDone(0, 1, 0.001)
+    sched.onBatchDone(0, 1, 0.001)
+    assignments = sched.assignBatches()
+    assert assignments == [(0, [5]), (0, [2])]
+    assert stats.counters['Worker_0_Steals'] == 2
+    assert stats.counters['Worker_1_Steals'] == 0
+    assert stats.counters['Worker_all_Steals'] == 2
+
+
+def test_dead_worker_batches_are_given_back():
+    sched, _ = _make_scheduler(2)
+    sched.addJobs(list(range(6)))
+    assignments = sched.assignBatches()
+    assert assignments == [(0, [0]), (0, [2]), (1, [1]), (1, [3])]
+
+    # Worker 1 dies while processing its first batch. That one is lost,
+    # but the second one goes to the other worker.
+    assert sched.removeWorker(1) == [1]
+    sched.onBatchDone(0, 1, 0.001)
+    sched.onBatchDone(0, 1, 0.001)
+    assignments = sched.assignBatches()
+    assert assignments == [(0, [4]), (0, [5])]
+    sched.onBatchDone(0, 1, 0.001)
+    sched.onBatchDone(0, 1, 0.001)
+    assert sched.assignBatches() == [(0, [3])]
+
+
+def test_idle_worker_is_counted():
+    sched, stats = _make_scheduler(2)
+    sched.addJobs(list(range(4)))
+    sched.assignBatches()
+
+    sched.onBatchDone(0, 1, 0.001)
+    assert sched.assignBatches() == []
+    assert stats.counters['Worker_0_Idle'] == 0
+    sched.onBatchDone(0, 1, 0.001)
+    assert sched.assignBatches() == []
+    assert stats.counters['Worker_0_Idle'] == 1
+    assert stats.counters['Worker_1_Idle'] == 0
+
+    # Asking again doesn't count the same idle period twice.
+    assert sched.assignBatches() == []
+    assert stats.counters['Worker_0_Idle'] == 1
+
+    # The last worker finishing isn't idle, the pass is just done.
+    sched.onBatchDone(1, 1, 0.001)
+    sched.onBatchDone(1, 1, 0.001)
+    assert sched.assignBatches() == []
+    assert stats.counters['Worker_1_Idle'] == 0
+    assert stats.counters['Worker_all_Idle'] == 1
+
+
+class _OffsetWorker(IWorker):
+    def __init__(self):
+        self.offset = 0
+        self.stats = None
+
+    def initialize(self):
+        self.stats = ExecutionStats()
+        self.stats.registerCounter('Jobs')
+
+    def update(self, data):
+        self.offset = data
+        self.stats.clear()
+
+    def process(self, job):
+        self.stats.stepCounter('Jobs')
+        return job + self.offset
+
+    def getStats(self):
+        return self.stats
+
+
+@pytest.mark.parametrize('scheduler', ['queue', 'stealing'])
+def test_reuse_worker_pool(scheduler):
+    results = []
+
+    def _handle(job, res, _):
+        results.append(res)
+
+    pool = WorkerPool(_OffsetWorker, worker_count=2, scheduler=scheduler,
+                      callback=_handle)
+    pool.queueJobs([1, 2, 3])
+    pool.wait()
+    assert sorted(results) == [1, 2, 3]
+
+    reports = pool.getReports()
+    assert sum([r.counters['Jobs'] for r in reports[1:]]) == 3
+    assert pool.is_reusable
+
+    results.clear()
+    pool.updateWorkers(10)
+    pool.queueJobs([1, 2, 3, 4])
+    pool.wait()
+    assert sorted(results) == [11, 12, 13, 14]
+
+    reports = pool.close()
+    assert sum([r.counters['Jobs'] for r in reports[1:]]) == 4
+    assert not pool.is_reusable
+
+
+class _DyingWorker(IWorker):
+    def initialize(self):
+        pass
+
+    def process(self, job):
+        if job == 0:
+            # Results that can't be sent back to the main process kill
+            # the worker.
+            return threading.Lock()
+        return job
+
+
+def test_worker_dying_in_the_middle_of_a_pass():
+    results = []
+    errors = []
+
+    def _handle(job, res, _):
+        results.append(res)
+
+    def _handle_error(job, res, _):
+        errors.append(job)
+
+    pool = WorkerPool(_DyingWorker, worker_count=2, scheduler='stealing',
+                      callback=_handle, error_callback=_handle_error)
+    try:
+        pool.queueJobs(list(range(20)))
+        assert pool.wait(10)
+        assert errors == [0]
+        assert sorted(results) == list(range(1, 20))
+    finally:
+        pool.close()